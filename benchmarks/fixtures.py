@@ -0,0 +1,69 @@
+"""
+Deterministic fixture assets for the benchmarks.
+
+Instead of shipping binary assets, a small set of backgrounds and covers is
+drawn from a fixed seed: textured backgrounds the size of a phone photo and
+box-art-like covers (gradient, panels and a noisy "artwork" block). The same
+seed always produces the same pixels, so timings are comparable across runs
+and machines.
+"""
+
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+BACKGROUND_SIZE = (2048, 1536)
+COVER_SIZE = (360, 500)
+NUM_BACKGROUNDS = 3
+NUM_COVERS = 12  # per cover folder
+
+
+def _background(rng):
+    width, height = BACKGROUND_SIZE
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = rng.uniform(60, 200, 3)
+    slope = rng.uniform(-0.03, 0.03, (2, 3))
+    pixels = base + x[..., None] * slope[0] + y[..., None] * slope[1]
+    # Coarse noise upsampled into blotches, plus fine sensor-like grain
+    blotches = Image.fromarray(rng.integers(0, 255, (height // 64, width // 64, 3), dtype=np.uint8))
+    pixels += np.asarray(blotches.resize((width, height), Image.BICUBIC), np.float32) * 0.3 - 38
+    pixels += rng.normal(0, 4, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def _cover(rng):
+    width, height = COVER_SIZE
+    top, bottom = rng.integers(0, 255, (2, 3))
+    t = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+    pixels = np.broadcast_to(top + (bottom - top) * t, (height, width, 3))
+    img = Image.fromarray(pixels.astype(np.uint8))
+    draw = ImageDraw.Draw(img)
+    # Title banner, artwork and a logo strip, like most box art
+    draw.rectangle([0, 0, width, height // 6], fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+    art = rng.integers(0, 255, (height // 2, width - 40, 3), dtype=np.uint8)
+    img.paste(Image.fromarray(art).resize((width - 40, height // 2), Image.NEAREST), (20, height // 4))
+    for _ in range(6):
+        x0, y0 = int(rng.integers(0, width - 60)), int(rng.integers(0, height - 30))
+        draw.rectangle([x0, y0, x0 + 60, y0 + 12], fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+    return img
+
+
+def make_fixtures(root, seed=0):
+    """
+    Write the fixture folders under root (skipped if already there); returns
+    {"backgrounds": dir, "covers_pos": dir, "covers_neg": dir}.
+    """
+    dirs = {name: os.path.join(root, f"bench_{name}") for name in ("backgrounds", "covers_pos", "covers_neg")}
+    counts = {"backgrounds": NUM_BACKGROUNDS, "covers_pos": NUM_COVERS, "covers_neg": NUM_COVERS}
+    for group, (name, directory) in enumerate(dirs.items()):
+        os.makedirs(directory, exist_ok=True)
+        for i in range(counts[name]):
+            path = os.path.join(directory, f"{name}_{i:02d}.jpg")
+            if os.path.exists(path):
+                continue
+            # One stream per file, so every file is the same whichever ones exist
+            rng = np.random.default_rng([seed, group, i])
+            img = _background(rng) if name == "backgrounds" else _cover(rng)
+            img.save(path, quality=90)
+    return dirs
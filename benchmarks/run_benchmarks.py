@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the synthetic generation and inference hot paths.
+
+Every stage runs on deterministic fixture assets (see fixtures.py) packed
+into a throwaway asset pack and listed through a throwaway image index, with
+the RNGs seeded before each stage, so two runs do the same work and nothing
+is left in training_data/build. Reported per stage: median, p90, mean and min latency.
+Generation throughput is measured at 1..N worker processes, each in a fresh
+subprocess so its peak RSS (main process and largest worker) is its own.
+
+Results go to a JSON file. With a baseline, every stage, throughput and RSS
+figure is compared against it, and the exit status is 1 if any got worse by
+more than --threshold. The suite drives the current generator APIs (asset
+pack, placement grid, colour pass), so it only runs on trees that have
+them: a baseline is measured on the parent commit of a change, not on code
+that predates the suite:
+
+    git stash                                              # or check out the parent commit
+    python3 benchmarks/run_benchmarks.py --save-baseline
+    git stash pop
+    python3 benchmarks/run_benchmarks.py
+
+benchmarks/baseline.json is committed, measured on the tree that added it;
+its "meta" block records the machine. That machine had one CPU, so the
+committed baseline only covers the single-worker throughput point. Timings
+only compare on the same machine, so rerun --save-baseline locally (which
+also records the multi-worker points) before reading the comparison.
+
+The colour pass (augment.enhance) is also timed next to the plain
+ImageEnhance chain at two cover sizes, on the same machine and run, and the
+exit status is 1 if it is slower than the chain by more than --threshold,
+baseline or not.
+
+The inference stage only runs with --model, as it needs ultralytics and weights.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import statistics
+import contextlib
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_ROOT, "training_data"))
+sys.path.insert(0, REPO_ROOT)
+
+import asset_pack  # noqa: E402
+import create_synth  # noqa: E402
+import image_index  # noqa: E402
+from augment import enhance  # noqa: E402
+from composite import composite_cover  # noqa: E402
+from encoders import ENCODERS, encode_image  # noqa: E402
+from fixtures import make_fixtures  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_PATH = os.path.join(BENCH_DIR, "latest.json")
+DEFAULT_THRESHOLD = 0.10
+COLOUR_SIZES = ((100, 140), (300, 420))  # cover sizes the colour pass is compared at
+COLOUR_PARAMS = {"brightness": 1.2, "contrast": 0.9, "saturation": 1.1}
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size so far (of this process, or of its largest finished child)."""
+    if who == resource.RUSAGE_SELF and os.path.exists("/proc/self/status"):
+        # ru_maxrss survives exec, so a subprocess would report its parent's peak
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    kb = resource.getrusage(who).ru_maxrss
+    return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def seed_all(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def time_stage(fn, repeat, warmup=2):
+    """Latency statistics of fn() in milliseconds, after warmup calls."""
+    return time_stages([fn], repeat, warmup)[0]
+
+
+def time_stages(fns, repeat, warmup=2):
+    """Latency statistics of each function, called in turn so load drift hits them alike."""
+    for _ in range(warmup):
+        for fn in fns:
+            fn()
+    times = [[] for _ in fns]
+    for _ in range(repeat):
+        for fn, fn_times in zip(fns, times):
+            start = time.perf_counter()
+            fn()
+            fn_times.append((time.perf_counter() - start) * 1000)
+    return [latency_stats(fn_times) for fn_times in times]
+
+
+def latency_stats(times):
+    """Median, p90, mean and min of a list of millisecond timings."""
+    times = sorted(times)
+    return {
+        "runs": len(times),
+        "median_ms": round(statistics.median(times), 3),
+        "p90_ms": round(times[min(len(times) - 1, int(len(times) * 0.9))], 3),
+        "mean_ms": round(statistics.fmean(times), 3),
+        "min_ms": round(times[0], 3),
+    }
+
+
+def imageenhance_chain(img, brightness, contrast, saturation):
+    """The plain ImageEnhance chain that augment.enhance() must keep up with."""
+    img = ImageEnhance.Brightness(img).enhance(brightness)
+    img = ImageEnhance.Contrast(img).enhance(contrast)
+    return ImageEnhance.Color(img).enhance(saturation)
+
+
+def use_fixtures(fixtures, pack_path):
+    """Point create_synth at the fixture folders, served from their own asset pack and image index."""
+    image_index.use_index(os.path.join(os.path.dirname(pack_path), "image_index.sqlite"))
+    create_synth.BACKGROUND_DIR = fixtures["backgrounds"]
+    create_synth.COVER_DIRS_POS = [fixtures["covers_pos"]]
+    create_synth.COVER_DIRS_NEG = [fixtures["covers_neg"]]
+    if not os.path.exists(pack_path):
+        groups = {fixtures["covers_pos"]: asset_pack.COVER_MAX_SIZE, fixtures["covers_neg"]: asset_pack.COVER_MAX_SIZE,
+                  fixtures["backgrounds"]: asset_pack.BACKGROUND_MAX_SIZE}
+        with contextlib.redirect_stdout(None):
+            asset_pack.build_asset_pack(groups, pack_path, workers=1)
+    asset_pack._open_pack = asset_pack.AssetPack(pack_path)
+
+
+def bench_stages(fixtures, work_dir, seed, repeat, model=None, runtime="torch"):
+    """Latency of each generation stage (and of batched inference with a model)."""
+    bg_files = create_synth.list_images(fixtures["backgrounds"])
+    cover = create_synth.load_image(fixtures["covers_pos"], create_synth.list_images(fixtures["covers_pos"])[0])
+    background = create_synth.load_image(fixtures["backgrounds"], bg_files[0])
+    stages = {}
+
+    def run(name, fn, n=repeat):
+        seed_all(seed)
+        stages[name] = time_stage(fn, n)
+        report(name)
+
+    def report(name):
+        print(f"{name:<40} median {stages[name]['median_ms']:>9.2f} ms   p90 {stages[name]['p90_ms']:>9.2f} ms")
+
+    def augment():
+        matrix, out_size, _ = create_synth.sample_cover_transform(cover.size, 300)
+        return create_synth.augment_cover_image(cover, matrix, out_size)
+
+    run("augment_cover_image", augment)
+
+    # The colour pass and its reference are timed in turn, as compare_colour_pass() sets them side by side
+    for width, height in COLOUR_SIZES:
+        sized = cover.resize((width, height))
+        names = (f"enhance@{width}x{height}", f"ImageEnhance chain@{width}x{height}")
+        timings = time_stages([lambda: enhance(sized, **COLOUR_PARAMS),
+                               lambda: imageenhance_chain(sized, **COLOUR_PARAMS)], repeat * 5)
+        for name, stats in zip(names, timings):
+            stages[name] = stats
+            report(name)
+
+    seed_all(seed)
+    augmented = augment()
+    canvas = background.convert("RGB")
+    run("composite_cover", lambda: composite_cover(canvas, augmented, (400, 300), opacity=0.9))
+    run("composite_cover+shadow", lambda: composite_cover(canvas, augmented, (400, 300), opacity=0.9,
+                                                          shadow=((5, 5), 2.5, 0.35)))
+    run("place_covers_on_background", lambda: create_synth.place_covers_on_background(
+        background, num_covers=4, is_positive=True))
+    run("render_sample", lambda: create_synth.render_sample(bg_files, True), max(3, repeat // 4))
+    run("render_sample@640", lambda: create_synth.render_sample(bg_files, True, 640))
+
+    seed_all(seed)
+    image, _ = create_synth.render_sample(bg_files, True)
+    for encoder in sorted(ENCODERS):
+        try:
+            run(f"encode_image[{encoder}]", lambda: encode_image(image, os.path.join(work_dir, "encoded"), encoder),
+                max(3, repeat // 4))
+        except RuntimeError as e:  # backend not installed
+            print(f"encode_image[{encoder}]: skipped ({e})")
+
+    out_dir = os.path.join(work_dir, "single")
+    os.makedirs(out_dir, exist_ok=True)
+    counter = iter(range(10 ** 6))
+    run("_generate_single_image", lambda: create_synth._generate_single_image(
+        next(counter), 0, bg_files, True, out_dir, seed), max(3, repeat // 4))
+
+    if model:
+        stages.update(bench_inference(model, runtime, bg_files, work_dir, seed, max(3, repeat // 4)))
+    return stages
+
+
+def bench_inference(weights, runtime, bg_files, work_dir, seed, repeat, count=8):
+    """Latency of one inference.py batch (decode, letterbox, predict) over rendered fixture scenes."""
+    from inference import predict_batches
+    from model_store import load_model
+
+    photo_dir = os.path.join(work_dir, "photos")
+    os.makedirs(photo_dir, exist_ok=True)
+    seed_all(seed)
+    paths = []
+    for i in range(count):
+        image, _ = create_synth.render_sample(bg_files, True)
+        paths.append(os.path.join(photo_dir, f"photo_{i}.jpg"))
+        image.save(paths[-1], quality=90)
+
+    model = load_model(weights, runtime, 640)
+    stats = time_stage(lambda: list(predict_batches(model, paths, batch_size=count)), repeat)
+    print(f"{'predict_batches[' + runtime + ']':<40} median {stats['median_ms']:>9.2f} ms   per {count} images")
+    return {f"predict_batches[{runtime}]": stats}
+
+
+def throughput_child(args):
+    """Render --images positives with --workers processes; prints a JSON line with the rate and peak RSS."""
+    use_fixtures(make_fixtures(args.fixtures, args.seed), os.path.join(args.fixtures, "pack.bin"))
+    create_synth.OUTPUT_DIR = tempfile.mkdtemp(dir=args.fixtures)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(None):
+        ok, attempted = create_synth.generate_synthetic_data(num_images=args.images, is_positive=True,
+                                                             seed=args.seed, workers=args.workers[0])
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"images": ok, "attempted": attempted, "seconds": round(elapsed, 3),
+                      "images_per_s": round(ok / elapsed, 2),
+                      "peak_rss_mb": peak_rss_mb(), "worker_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN)}))
+
+
+def bench_throughput(fixture_root, seed, images, worker_counts):
+    """Generation throughput and peak RSS per worker count, each measured in a fresh process."""
+    results = {}
+    for workers in worker_counts:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--throughput-child",
+                              "--fixtures", fixture_root, "--seed", str(seed), "--images", str(images),
+                              "--workers", str(workers)], capture_output=True, text=True, check=True)
+        results[str(workers)] = json.loads(out.stdout.strip().splitlines()[-1])
+        r = results[str(workers)]
+        print(f"generate_synthetic_data x{workers:<3} {r['images_per_s']:>8.2f} images/s   "
+              f"peak RSS {r['peak_rss_mb']} MB (worker {r['worker_peak_rss_mb']} MB)")
+    return results
+
+
+def compare_colour_pass(stages, threshold):
+    """Lines for every size at which enhance() is slower than the ImageEnhance chain by more than threshold."""
+    regressions = []
+    print(f"\nColour pass against the ImageEnhance chain (threshold {threshold:.0%}):")
+    for width, height in COLOUR_SIZES:
+        current = stages[f"enhance@{width}x{height}"]["median_ms"]
+        chain = stages[f"ImageEnhance chain@{width}x{height}"]["median_ms"]
+        change = (current - chain) / chain
+        worse = change > threshold
+        print(f"  {f'enhance@{width}x{height} median ms':<52} {chain:>10.2f} -> {current:>10.2f}  ({change:+.1%})"
+              f"{'  REGRESSION' if worse else ''}")
+        if worse:
+            regressions.append(f"enhance@{width}x{height}: {chain} ms chain -> {current} ms ({change:+.1%})")
+    return regressions
+
+
+def compare(results, baseline, threshold):
+    """Lines describing every figure that regressed by more than threshold versus the baseline."""
+    regressions = []
+
+    def check(name, current, base, higher_is_worse=True):
+        if base is None or not base:
+            return
+        change = (current - base) / base
+        worse = change > threshold if higher_is_worse else change < -threshold
+        print(f"  {name:<52} {base:>10.2f} -> {current:>10.2f}  ({change:+.1%}){'  REGRESSION' if worse else ''}")
+        if worse:
+            regressions.append(f"{name}: {base} -> {current} ({change:+.1%})")
+
+    print(f"\nComparison against baseline (threshold {threshold:.0%}):")
+    base_meta = baseline.get("meta", {})
+    if (base_meta.get("platform"), base_meta.get("cpu_count")) != (results["meta"]["platform"], results["meta"]["cpu_count"]):
+        print(f"  Note: the baseline was measured on another machine ({base_meta.get('platform')}, "
+              f"{base_meta.get('cpu_count')} CPUs); rerun with --save-baseline here for a fair comparison")
+    for name, stage in results["stages"].items():
+        check(f"{name} median ms", stage["median_ms"], baseline.get("stages", {}).get(name, {}).get("median_ms"))
+    for workers, run in results["throughput"].items():
+        base = baseline.get("throughput", {}).get(workers, {})
+        check(f"throughput x{workers} images/s", run["images_per_s"], base.get("images_per_s"), higher_is_worse=False)
+        check(f"throughput x{workers} peak RSS MB", run["peak_rss_mb"], base.get("peak_rss_mb"))
+        check(f"throughput x{workers} worker peak RSS MB", run["worker_peak_rss_mb"], base.get("worker_peak_rss_mb"))
+    check("stages peak RSS MB", results["peak_rss_mb"], baseline.get("peak_rss_mb"))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark synthetic generation and inference')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the fixtures and every stage')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed calls per stage (slow stages use a quarter)')
+    parser.add_argument('--images', type=int, default=32, help='Images rendered per throughput measurement')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='Worker counts for the throughput runs (default: 1, 2, 4 ... up to the CPU count)')
+    parser.add_argument('--model', default=None, help='Also benchmark inference with these weights')
+    parser.add_argument('--runtime', default='torch', help='Runtime for the inference benchmark (see model_store.py)')
+    parser.add_argument('--out', default=RESULTS_PATH, help='Where to write the results JSON')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline JSON to compare against, if it exists')
+    parser.add_argument('--save-baseline', action='store_true', help='Also store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative change counted as a regression (0.10 = 10%%)')
+    parser.add_argument('--fixtures', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--throughput-child', action='store_true', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.throughput_child:
+        throughput_child(args)
+        return
+
+    worker_counts = args.workers
+    if worker_counts is None:
+        cpus = os.cpu_count() or 1
+        worker_counts = sorted({min(2 ** i, cpus) for i in range(cpus.bit_length() + 1)})
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as work_dir:
+        fixtures = make_fixtures(work_dir, args.seed)
+        use_fixtures(fixtures, os.path.join(work_dir, "pack.bin"))
+        stages = bench_stages(fixtures, work_dir, args.seed, args.repeat, args.model, args.runtime)
+        rss = peak_rss_mb()
+        throughput = bench_throughput(work_dir, args.seed, args.images, worker_counts)
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pillow": Image.__version__,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "stages": stages,
+        "throughput": throughput,
+        "peak_rss_mb": rss,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"\nResults written to {args.out}")
+
+    regressions = compare_colour_pass(stages, args.threshold)
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions += compare(results, json.load(f), args.threshold)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Memory-mapped training data for ultralytics.
+
+Serves the arrays written by training_data/compile_dataset.py: every image is
+already letterboxed to imgsz and stored in one uint8 array per split, so a
+sample is a slice of a shared np.load(mmap_mode="r") map instead of a JPEG
+decode and resize. The map is read straight from the page cache, which all
+dataloader workers share; only the one frame handed to the augmentation
+pipeline is copied, as those transforms modify images in place.
+"""
+
+import os
+import json
+
+import numpy as np
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import colorstr
+
+COMPILED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "training_data", "build", "compiled")
+
+
+class CompiledYOLODataset(YOLODataset):
+    """YOLODataset reading letterboxed images and packed labels from a compiled split."""
+
+    def __init__(self, *args, compiled_dir, **kwargs):
+        with open(os.path.join(compiled_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.compiled_dir = compiled_dir
+        self.images = np.load(os.path.join(compiled_dir, "images.npy"), mmap_mode="r")
+        self.packed_labels = np.load(os.path.join(compiled_dir, "labels.npy"))
+        self.offsets = np.load(os.path.join(compiled_dir, "offsets.npy"))
+        super().__init__(*args, **kwargs)
+        if self.meta["imgsz"] != self.imgsz:
+            raise ValueError(f"{compiled_dir} was compiled at imgsz={self.meta['imgsz']}, training uses {self.imgsz}; "
+                             f"rerun compile_dataset.py --imgsz {self.imgsz}")
+
+    def get_img_files(self, img_path):
+        # Original names; they only label plots and logs
+        return [os.path.join(self.compiled_dir, name) for name in self.meta["files"]]
+
+    def get_labels(self):
+        size = self.meta["imgsz"]
+        labels = []
+        for i, im_file in enumerate(self.im_files):
+            rows = self.packed_labels[self.offsets[i]:self.offsets[i + 1]]
+            labels.append({
+                "im_file": im_file,
+                "shape": (size, size),
+                "cls": rows[:, :1].copy(),
+                "bboxes": rows[:, 1:].copy(),
+                "segments": [],
+                "keypoints": None,
+                "normalized": True,
+                "bbox_format": "xywh",
+            })
+        return labels
+
+    def load_image(self, i, rect_mode=True):
+        im = np.array(self.images[i])  # the augmentations write into the image
+        if self.augment:
+            # Mosaic draws its partners from the buffer
+            self.buffer.append(i)
+            if len(self.buffer) > max(self.max_buffer_length, 1):
+                self.buffer.pop(0)
+        return im, im.shape[:2], im.shape[:2]
+
+
+def make_compiled_trainer(compiled_dir=COMPILED_DIR):
+    """Return a DetectionTrainer class that reads train and val from compiled_dir/{train,val}."""
+
+    class CompiledTrainer(DetectionTrainer):
+        def build_dataset(self, img_path, mode="train", batch=None):
+            split = "train" if mode == "train" else "val"
+            stride = max(int(self.model.stride.max() if self.model else 0), 32)
+            return CompiledYOLODataset(
+                compiled_dir=os.path.join(compiled_dir, split),
+                img_path=img_path,
+                imgsz=self.args.imgsz,
+                batch_size=batch,
+                augment=mode == "train",
+                hyp=self.args,
+                rect=self.args.rect or mode == "val",
+                cache=None,
+                single_cls=self.args.single_cls or False,
+                stride=stride,
+                pad=0.0 if mode == "train" else 0.5,
+                prefix=colorstr(f"{mode}: "),
+                task=self.args.task,
+                classes=self.args.classes,
+                data=self.data,
+                fraction=1.0,
+            )
+
+    return CompiledTrainer
@@ -0,0 +1,73 @@
+"""
+Content-addressed cache of detections.
+
+A cached entry is keyed by the SHA-256 of the image bytes, the hash of the
+model weights and the inference parameters, so renaming or moving an image
+keeps its entry, while changing the image, retraining or changing
+conf/imgsz/tiling makes a new one. Entries are appended to a JSONL file as
+they are produced; a later line for the same key wins.
+"""
+
+import os
+import json
+import hashlib
+
+CACHE_PATH = os.path.join("runs", "detection_cache.jsonl")
+
+
+def file_digest(path):
+    """SHA-256 of a file's bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def params_digest(weights_hash, params):
+    """Hash of the weights hash and the inference parameters that change detections."""
+    return hashlib.sha256(json.dumps([weights_hash, params], sort_keys=True).encode()).hexdigest()
+
+
+class DetectionCache:
+    """Detections by (image hash, weights hash, params), backed by an append-only JSONL file."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interrupted run
+                    self.entries[entry["key"]] = entry
+        self.file = None
+
+    def key(self, image_path, params_hash):
+        """Cache key of one image under one weights/params combination."""
+        return f"{file_digest(image_path)}:{params_hash}"
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Cached entry: {"key", "image", "width", "height", "detections"}."""
+        return self.entries[key]
+
+    def put(self, key, image_path, width, height, detections):
+        """Store and persist the detections of one image."""
+        entry = {"key": key, "image": image_path, "width": width, "height": height, "detections": detections}
+        self.entries[key] = entry
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = open(self.path, "a")
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+        return entry
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
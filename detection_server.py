@@ -0,0 +1,260 @@
+"""
+Long-running game cover detection service.
+
+The model is loaded once and kept warm. Clients POST an encoded image to
+/detect over HTTP (TCP or a Unix socket) and get its detections back as JSON.
+Requests that arrive together are gathered into one micro-batch: a batch is
+sent to the model as soon as it is full or the oldest request has waited
+--max-latency-ms, so a lone request is not held back and a burst shares one
+forward pass. The queue in front of the model is bounded; when it is full,
+new requests get 503 immediately instead of piling up.
+
+GET /stats returns request counts and batch-size and latency histograms;
+GET /health returns 200 once the model is warm.
+"""
+
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from inference import result_detections
+from model_store import RUNTIMES, load_model
+
+MAX_BODY_BYTES = 32 * 1024 * 1024
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 503: "Service Unavailable", 500: "Internal Server Error"}
+
+
+class ServerStats:
+    """Counters and histograms reported by /stats."""
+
+    def __init__(self):
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+        self.batch_sizes = Counter()
+        self.latency_ms = Counter()
+
+    def record_batch(self, size):
+        self.batch_sizes[size] += 1
+
+    def record_latency(self, seconds):
+        ms = seconds * 1000
+        bucket = next((f"<={b}" for b in LATENCY_BUCKETS_MS if ms <= b), f">{LATENCY_BUCKETS_MS[-1]}")
+        self.latency_ms[bucket] += 1
+
+    def as_dict(self, queue_depth):
+        batches = sum(self.batch_sizes.values())
+        images = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "queue_depth": queue_depth,
+            "batches": batches,
+            "mean_batch_size": round(images / batches, 2) if batches else 0,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+            "latency_ms_histogram": {
+                bucket: self.latency_ms[bucket]
+                for bucket in [f"<={b}" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+            },
+        }
+
+
+class MicroBatcher:
+    """Bounded request queue drained into model batches by a single worker task."""
+
+    def __init__(self, model, imgsz, conf, max_batch, max_latency, max_queue, stats):
+        self.model = model
+        self.imgsz = imgsz
+        self.conf = conf
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.stats = stats
+        # One thread owns the model; decoding runs on the default executor
+        self.model_executor = ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, image):
+        """Queue a decoded image; returns a future for its detections, or None when full."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((image, future))
+        except asyncio.QueueFull:
+            return None
+        return future
+
+    def _predict(self, images):
+        results = self.model.predict(source=images, imgsz=self.imgsz, conf=self.conf, verbose=False)
+        return [result_detections(r, self.model.names) for r in results]
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.stats.record_batch(len(batch))
+            try:
+                detections = await loop.run_in_executor(self.model_executor, self._predict, [b[0] for b in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), dets in zip(batch, detections):
+                if not future.done():
+                    future.set_result(dets)
+
+
+def _decode(body):
+    """Decode an encoded image to a BGR array, or None."""
+    return cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+
+
+async def _read_request(reader):
+    """Parse one HTTP/1.1 request; returns (method, path, headers, body) or None on EOF."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def _response(status, payload):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+    return head.encode() + body
+
+
+class DetectionServer:
+    """HTTP front end of the micro-batcher."""
+
+    def __init__(self, batcher, stats):
+        self.batcher = batcher
+        self.stats = stats
+
+    async def detect(self, body):
+        start = time.perf_counter()
+        self.stats.requests += 1
+        image = await asyncio.get_running_loop().run_in_executor(None, _decode, body)
+        if image is None:
+            return 400, {"error": "body is not a decodable image"}
+        future = self.batcher.submit(image)
+        if future is None:
+            self.stats.rejected += 1
+            return 503, {"error": "server busy, retry later"}
+        detections = await future
+        elapsed = time.perf_counter() - start
+        self.stats.record_latency(elapsed)
+        return 200, {"width": image.shape[1], "height": image.shape[0], "detections": detections,
+                     "latency_ms": round(elapsed * 1000, 2)}
+
+    async def route(self, method, path, body):
+        if path == "/detect":
+            if method != "POST":
+                return 405, {"error": "POST an encoded image to /detect"}
+            return await self.detect(body)
+        if path == "/stats":
+            return 200, self.stats.as_dict(self.batcher.queue.qsize())
+        if path == "/health":
+            return 200, {"status": "ok"}
+        return 404, {"error": f"unknown path {path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except ValueError as e:
+                    writer.write(_response(413 if "too large" in str(e) else 400, {"error": str(e)}))
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                try:
+                    status, payload = await self.route(method, path.split("?", 1)[0], body)
+                except Exception as e:
+                    self.stats.errors += 1
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                writer.write(_response(status, payload))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    model = load_model(args.model, args.runtime, args.imgsz)
+    # Warm up, so the first client does not pay for lazy initialisation
+    model.predict(source=[np.zeros((args.imgsz, args.imgsz, 3), np.uint8)], imgsz=args.imgsz, verbose=False)
+
+    stats = ServerStats()
+    batcher = MicroBatcher(model, args.imgsz, args.conf, args.max_batch, args.max_latency_ms / 1000,
+                           args.max_queue, stats)
+    server = DetectionServer(batcher, stats)
+    worker = asyncio.create_task(batcher.run())
+
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle, path=args.unix)
+        print(f"Serving detections on unix:{args.unix}")
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port)
+        print(f"Serving detections on http://{args.host}:{args.port}")
+    async with listener:
+        await asyncio.gather(listener.serve_forever(), worker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve game cover detections with dynamic micro-batching')
+    parser.add_argument('--model', default=None, help='Weights to load (default: latest runs/detect/yolov8n_custom*)')
+    parser.add_argument('--runtime', choices=sorted(RUNTIMES), default='torch', help='Inference runtime')
+    parser.add_argument('--imgsz', type=int, default=640, help='Inference resolution')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8008, help='TCP port to listen on')
+    parser.add_argument('--unix', default=None, help='Listen on this Unix socket path instead of TCP')
+    parser.add_argument('--max-batch', type=int, default=8, help='Largest micro-batch sent to the model')
+    parser.add_argument('--max-latency-ms', type=float, default=10.0,
+                        help='Longest a request waits for others to join its batch')
+    parser.add_argument('--max-queue', type=int, default=64, help='Queued requests before new ones get 503')
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
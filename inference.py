@@ -1,52 +1,346 @@
-from ultralytics import YOLO
 import cv2
 import os
 import re
+import sys
+import json
+import time
+import argparse
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+from detection_cache import CACHE_PATH, DetectionCache, params_digest
+from model_store import RUNTIMES, get_latest_custom_model, load_model, published_config, weights_digest
+from tiling import predict_tiled
+from watch_folder import FolderWatcher
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "training_data"))
+import tracing  # noqa: E402
+
+# format -> (file extension, cv2 encoder flag, default level); PNG levels are
+# zlib compression (0-9, lower is faster), JPEG/WebP levels are quality
+OUTPUT_FORMATS = {
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION, 1),
+    "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, 90),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, 90),
+}
 
-def get_latest_custom_model(base_dir="runs/detect"):
-    custom_dirs = [
-        d for d in os.listdir(base_dir)
-        if os.path.isdir(os.path.join(base_dir, d)) and re.match(r"yolov8n_custom\d+", d)
-    ]
-    if not custom_dirs:
-        raise FileNotFoundError("No custom YOLO model directories found.")
 
-    # Extract the number and sort by it
-    latest = max(custom_dirs, key=lambda d: int(re.search(r"\d+", d).group()))
-    return os.path.join(base_dir, latest, "weights", "best.pt")
+DEFAULT_PATTERN = r"PinkGorilla_\d+\.jpg$"
+OUTPUT_SUFFIX = "_boxed"  # rendered images are never picked up as inputs
+DETECTIONS_DIR = os.path.join("runs", "detections")
+
 
 # --- Collect all PinkGorilla images ---
-def get_pink_gorilla_images(img_dir="pink_gorilla_twitter"):
+def get_pink_gorilla_images(img_dir="pink_gorilla_twitter", pattern=DEFAULT_PATTERN):
     return sorted([
         os.path.join(img_dir, f)
         for f in os.listdir(img_dir)
-        if re.match(r"PinkGorilla_\d+\.jpg$", f, re.IGNORECASE)
+        if re.match(pattern, f, re.IGNORECASE) and OUTPUT_SUFFIX + "." not in f
     ])
 
 
-model = YOLO(get_latest_custom_model()) # Replace with your chosen model path
-img_paths = get_pink_gorilla_images()
+def _imread(img_path):
+    with tracing.span("decode"):
+        return cv2.imread(img_path)
+
+
+def decode_ahead(img_paths, lookahead, decode_workers=4):
+    """Yield (path, BGR array or None) in order, decoding up to lookahead images ahead on a thread pool."""
+    with ThreadPoolExecutor(max_workers=decode_workers) as pool:
+        pending = deque()
+        for img_path in img_paths:
+            pending.append((img_path, pool.submit(_imread, img_path)))
+            if len(pending) >= lookahead:
+                img_path, future = pending.popleft()
+                yield img_path, future.result()
+        for img_path, future in pending:
+            yield img_path, future.result()
+
+
+def iter_image_batches(img_paths, batch_size, decode_workers=4):
+    """
+    Decode images once each, yielding (paths, BGR arrays) lists of up to batch_size.
+
+    Decoding runs up to two batches ahead of the consumer, so the next batch
+    is being read while the model works on this one.
+    """
+    paths, images = [], []
+    for img_path, image in decode_ahead(img_paths, 2 * batch_size, decode_workers):
+        if image is None:
+            print(f"Skipping unreadable image: {img_path}")
+            continue
+        paths.append(img_path)
+        images.append(image)
+        if len(images) == batch_size:
+            yield paths, images
+            paths, images = [], []
+    if images:
+        yield paths, images
+
+
+def predict_batches(model, img_paths, batch_size=8, imgsz=640, conf=0.25, decode_workers=4):
+    """
+    Run the model over img_paths in batches; yields (path, image, result) per image.
+
+    Each batch of decoded arrays goes to the model in one call, which
+    letterboxes them to imgsz together. Results stream out as a generator, so
+    only a few batches are held in memory at a time.
+    """
+    for paths, images in iter_image_batches(img_paths, batch_size, decode_workers):
+        results = model.predict(source=images, imgsz=imgsz, conf=conf, stream=True, verbose=False)
+        # Results are produced lazily, so the span covers each step of the stream
+        yield from zip(paths, images, tracing.traced_iter(results, "predict"))
+
+
+def result_detections(result, names):
+    """JSON-friendly list of the result's detections."""
+    boxes = result.boxes
+    return [
+        {"label": names[int(cls)], "class": int(cls), "conf": round(float(conf), 4),
+         "box": [round(float(v), 1) for v in xyxy]}
+        for xyxy, conf, cls in zip(boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy())
+    ]
+
+
+def iter_detections(model, img_paths, batch_size=8, imgsz=640, conf=0.25, decode_workers=4, tiling=None):
+    """
+    Yield (path, image, detections) for every readable image.
+
+    tiling is None for whole-image batches, or a dict of predict_tiled()
+    options, in which case each image's tiles form one batch.
+    """
+    if tiling is None:
+        for img_path, image, result in predict_batches(model, img_paths, batch_size, imgsz, conf, decode_workers):
+            yield img_path, image, result_detections(result, model.names)
+        return
+    for img_path, image in decode_ahead(img_paths, 2, decode_workers):
+        if image is None:
+            print(f"Skipping unreadable image: {img_path}")
+            continue
+        with tracing.span("predict_tiled"):
+            detections = predict_tiled(model, image, imgsz=imgsz, conf=conf, **tiling)
+        yield img_path, image, detections
+
+
+def iter_cached(cache, keys, img_paths, decode=True, decode_workers=4):
+    """Yield (path, image or None, entry) for images whose detections are cached."""
+    if decode:
+        decoded = decode_ahead(img_paths, 8, decode_workers)
+    else:
+        decoded = ((img_path, None) for img_path in img_paths)
+    for img_path, image in decoded:
+        yield img_path, image, cache.get(keys[img_path])
+
+
+def draw_detections(image, detections):
+    """Draw boxes and labels from result_detections() onto the image in place."""
+    for det in detections:
+        x1, y1, x2, y2 = (int(v) for v in det["box"])
+
+        # Draw rectangle and put text on the image
+        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(image, f"{det['label']} {det['conf']:.2f}", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    return image
+
+
+def render_and_save(image, detections, out_path, fmt="png", level=None):
+    """Draw detections and write the image; runs on the output thread pool."""
+    _, flag, default_level = OUTPUT_FORMATS[fmt]
+    with tracing.span("draw"):
+        draw_detections(image, detections)
+    with tracing.span("imwrite", format=fmt):
+        written = cv2.imwrite(out_path, image, [flag, default_level if level is None else level])
+    if not written:
+        raise OSError(f"could not write {out_path}")
+    return out_path
+
+
+class InferenceRun:
+    """Model, cache and outputs shared by every batch of images in one run."""
+
+    def __init__(self, args):
+        self.args = args
+        self.weights = args.model or get_latest_custom_model()
+        self.model = None
+
+        # Unset runtime/imgsz come from quantize_sweep.py --publish, if it measured these weights
+        if args.runtime is None or args.imgsz is None:
+            published = published_config(self.weights)
+            if published:
+                print(f"Using the published configuration: {published['runtime']} at imgsz={published['imgsz']}")
+            if args.runtime is None:
+                args.runtime = published["runtime"] if published else "torch"
+            if args.imgsz is None:
+                args.imgsz = published["imgsz"] if published else 640
+        self.ext = OUTPUT_FORMATS[args.format][0]
+
+        self.tiling = None
+        if args.tile:
+            self.tiling = {"tile": args.tile, "overlap": args.tile_overlap, "merge": args.tile_merge,
+                           "min_texture": args.tile_min_texture}
+
+        self.cache = None
+        if not args.no_cache:
+            self.cache = DetectionCache(args.cache)
+            params = {"runtime": args.runtime, "imgsz": args.imgsz, "conf": args.conf, "tiling": self.tiling}
+            self.params_hash = params_digest(weights_digest(self.weights), params)
+
+        # Appending keeps earlier detections when watching
+        self.detections_file = None
+        if args.detections:
+            os.makedirs(os.path.dirname(args.detections) or ".", exist_ok=True)
+            self.detections_file = open(args.detections, "a" if args.watch else "w")
+        # Decode, inference and draw/encode overlap: decoding runs ahead on its
+        # own pool, the model runs on the caller's thread, and rendering is
+        # handed to this bounded pool
+        self.writers = ThreadPoolExecutor(max_workers=args.io_workers)
+
+    def get_model(self):
+        """Load the model on first use, so fully cached runs never pay for it."""
+        if self.model is None:
+            self.model = load_model(self.weights, self.args.runtime, self.args.imgsz)
+        return self.model
+
+    def items(self, img_paths):
+        """Yield (path, image or None, entry) from the cache first, then from the model."""
+        args = self.args
+        keys = {}
+        todo = img_paths
+        items = iter(())
+        if self.cache is not None:
+            with tracing.span("cache_lookup", images=len(img_paths)):
+                keys = {img_path: self.cache.key(img_path, self.params_hash) for img_path in img_paths}
+            todo = [img_path for img_path in img_paths if keys[img_path] not in self.cache]
+            cached = [img_path for img_path in img_paths if keys[img_path] in self.cache]
+            print(f"{len(cached)} images cached, {len(todo)} to run through the model")
+            if args.from_cache and todo:
+                print(f"Skipping {len(todo)} images without cached detections (--from-cache)")
+                todo = []
+            items = iter_cached(self.cache, keys, cached, not args.no_render, args.io_workers)
+        if not todo:
+            return items
+
+        def fresh():
+            for img_path, image, detections in iter_detections(self.get_model(), todo, args.batch_size, args.imgsz,
+                                                               args.conf, args.io_workers, self.tiling):
+                height, width = image.shape[:2]
+                entry = {"image": img_path, "width": width, "height": height, "detections": detections}
+                if self.cache is not None:
+                    entry = self.cache.put(keys[img_path], img_path, width, height, detections)
+                yield img_path, image, entry
+
+        return itertools.chain(items, fresh())
+
+    def process(self, img_paths):
+        """Detect, emit and render a list of images; returns how many were processed."""
+        args = self.args
+        count = 0
+        pending = deque()
+        for img_path, image, entry in self.items(img_paths):
+            if self.detections_file:
+                self.detections_file.write(json.dumps({"image": img_path, "width": entry["width"],
+                                                       "height": entry["height"],
+                                                       "detections": entry["detections"]}) + "\n")
+            count += 1
+            if args.no_render:
+                continue
+            if image is None:
+                print(f"Skipping unreadable image: {img_path}")
+                continue
+
+            # Save output image with bounding boxes
+            out_path = os.path.splitext(img_path)[0] + OUTPUT_SUFFIX + self.ext
+            pending.append(self.writers.submit(render_and_save, image, entry["detections"], out_path,
+                                               args.format, args.compression))
+            while len(pending) > 2 * args.batch_size:
+                print(f"Saved: {pending.popleft().result()}")
+        for future in pending:
+            print(f"Saved: {future.result()}")
+        if self.detections_file:
+            self.detections_file.flush()
+        return count
+
+    def close(self):
+        self.writers.shutdown()
+        if self.cache is not None:
+            self.cache.close()
+        if self.detections_file:
+            self.detections_file.close()
+            print(f"Detections written to {self.args.detections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detect game covers in the PinkGorilla photos')
+    parser.add_argument('--model', default=None, help='Weights to load (default: latest runs/detect/yolov8n_custom*)')
+    parser.add_argument('--images', default='pink_gorilla_twitter', help='Directory with PinkGorilla_*.jpg photos')
+    parser.add_argument('--batch-size', type=int, default=8, help='Images per model call')
+    parser.add_argument('--imgsz', type=int, default=None,
+                        help='Inference resolution (default: published by quantize_sweep.py, else 640)')
+    parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+    parser.add_argument('--runtime', choices=sorted(RUNTIMES), default=None,
+                        help='torch loads best.pt; onnx/openvino(-int8) use a cached export of it (see model_store.py); '
+                             'default: published by quantize_sweep.py, else torch')
+    parser.add_argument('--format', choices=sorted(OUTPUT_FORMATS), default='png', help='Format of the _boxed images')
+    parser.add_argument('--compression', type=int, default=None,
+                        help='PNG compression level (0-9) or JPEG/WebP quality (default: 1 for PNG, 90 otherwise)')
+    parser.add_argument('--no-render', action='store_true', help='Skip drawing and saving images; only emit detections')
+    parser.add_argument('--detections', default=None,
+                        help='Write one JSON line of detections per image here (default with --no-render: '
+                             'runs/detections/<images folder name>.jsonl)')
+    parser.add_argument('--io-workers', type=int, default=4, help='Threads for decoding and for drawing/encoding')
+    parser.add_argument('--tile', type=int, default=0,
+                        help='Detect on overlapping tiles of this many pixels (0: whole image at --imgsz)')
+    parser.add_argument('--tile-overlap', type=float, default=0.2, help='Overlap between neighbouring tiles')
+    parser.add_argument('--tile-merge', choices=['nms', 'wbf'], default='nms',
+                        help='Merge boxes across tiles by NMS or weighted box fusion')
+    parser.add_argument('--tile-min-texture', type=float, default=0.0,
+                        help='Skip tiles whose grey-level std is below this (e.g. 8 for plain walls)')
+    parser.add_argument('--cache', default=CACHE_PATH, help='Detection cache keyed by image, weights and parameters')
+    parser.add_argument('--no-cache', action='store_true', help='Always run the model and do not store detections')
+    parser.add_argument('--from-cache', action='store_true',
+                        help='Only render/emit images with cached detections; never load the model')
+    parser.add_argument('--pattern', default=DEFAULT_PATTERN, help='Regex for the image file names to process')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and process new or modified images as they appear')
+    parser.add_argument('--debounce', type=float, default=1.0,
+                        help='Seconds a file must stay unchanged before it is processed (--watch)')
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help='Seconds between folder scans when inotify is unavailable (--watch)')
+    parser.add_argument('--trace', default=None,
+                        help='Record per-stage spans here and print a summary (see training_data/tracing.py)')
+    parser.add_argument('--profile', action='store_true', help='With --trace, also sample stacks for a flame graph')
+
+    args = parser.parse_args()
+    if args.trace:
+        tracing.enable(args.trace, profile=args.profile)
+    if args.no_render and not args.detections:
+        args.detections = os.path.join(DETECTIONS_DIR, os.path.basename(os.path.abspath(args.images)) + ".jsonl")
 
-for img_path in img_paths:
-    results = model.predict(source=img_path)
-    # Load the image to draw on
-    image = cv2.imread(img_path)
+    run = InferenceRun(args)
+    start = time.perf_counter()
+    count = 0
+    try:
+        if args.watch:
+            watcher = FolderWatcher(args.images, args.pattern, debounce=args.debounce,
+                                    poll_interval=args.poll_interval, exclude=re.escape(OUTPUT_SUFFIX + "."))
+            print(f"Watching {args.images} for {args.pattern} (Ctrl+C to stop)")
+            for img_paths in watcher.batches(args.batch_size):
+                count += run.process(img_paths)
+                watcher.mark_processed(os.path.basename(p) for p in img_paths)
+        else:
+            count = run.process(get_pink_gorilla_images(args.images, args.pattern))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        run.close()
+        tracing.finish()
 
-    # Iterate through the results and draw bounding boxes
-    for r in results:
-        for box in r.boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            conf = float(box.conf[0])
-            cls = int(box.cls[0])
-            label = model.names[cls]
+    elapsed = time.perf_counter() - start
+    if count:
+        print(f"Processed {count} images in {elapsed:.1f}s ({count / elapsed:.1f} images/s)")
 
-            # Draw rectangle and put text on the image
-            cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(image, f"{label} {conf:.2f}", (x1, y1 - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
-    # Save output image with bounding boxes
-    out_path = os.path.splitext(img_path)[0] + "_boxed.png"
-    cv2.imwrite(out_path, image)
-    print(f"Saved: {out_path}")
+if __name__ == "__main__":
+    main()
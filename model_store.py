@@ -0,0 +1,162 @@
+"""
+Model store: finds trained weights and caches CPU runtime exports of them.
+
+An export to ONNX Runtime or OpenVINO is built once per weights file and kept
+under runs/model_store, keyed by the SHA-256 of the weights, the runtime and
+the export resolution. Later runs load the cached artifact directly, so
+retraining (new weights, new hash) is the only thing that triggers a new
+export. The openvino-int8 runtime is post-training quantized, calibrated on
+the real photos in training_data/real_assets.
+
+quantize_sweep.py can publish a measured runtime/imgsz choice for a weights
+file; inference.py uses it when neither is given on the command line.
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import argparse
+
+STORE_DIR = os.path.join("runs", "model_store")
+PUBLISHED_PATH = os.path.join(STORE_DIR, "published.json")
+CALIBRATION_DIR = os.path.join("training_data", "real_assets")
+
+# runtime -> ultralytics export format (None: load the PyTorch weights as they are)
+RUNTIMES = {
+    "torch": None,
+    "onnx": "onnx",
+    "openvino": "openvino",
+    "openvino-int8": "openvino",
+}
+# runtime -> extra export arguments
+EXPORT_OPTIONS = {
+    "openvino-int8": {"int8": True},
+}
+
+
+def get_latest_custom_model(base_dir="runs/detect"):
+    custom_dirs = [
+        d for d in os.listdir(base_dir)
+        if os.path.isdir(os.path.join(base_dir, d)) and re.match(r"yolov8n_custom\d+", d)
+    ]
+    if not custom_dirs:
+        raise FileNotFoundError("No custom YOLO model directories found.")
+
+    # Extract the number and sort by it
+    latest = max(custom_dirs, key=lambda d: int(re.search(r"\d+", d).group()))
+    return os.path.join(base_dir, latest, "weights", "best.pt")
+
+
+def weights_digest(weights):
+    """SHA-256 of a weights file."""
+    h = hashlib.sha256()
+    with open(weights, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def export_key(weights, runtime, imgsz):
+    """Store key of one export: weights hash, runtime and resolution."""
+    return f"{weights_digest(weights)[:16]}-{runtime}-{imgsz}"
+
+
+def calibration_yaml(store_dir=STORE_DIR, calibration_dir=CALIBRATION_DIR):
+    """Write the dataset YAML that points INT8 calibration at the real photos; returns its path."""
+    with open(os.path.join("training_data", "classes.txt")) as f:
+        class_names = [line.strip() for line in f if line.strip()]
+    os.makedirs(store_dir, exist_ok=True)
+    # A list file, so labelme2yolo's copies under real_assets/YOLODataset are not counted twice
+    list_path = os.path.abspath(os.path.join(store_dir, "calibration.txt"))
+    with open(list_path, "w") as f:
+        for name in sorted(os.listdir(calibration_dir)):
+            if name.lower().endswith((".jpg", ".jpeg", ".png")):
+                f.write(os.path.abspath(os.path.join(calibration_dir, name)) + "\n")
+    path = os.path.join(store_dir, "calibration.yaml")
+    lines = [f"train: '{list_path}'", f"val: '{list_path}'", "names:"]
+    lines += [f"  {i}: '{name}'" for i, name in enumerate(class_names)]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def export_model(weights, runtime, imgsz=640, store_dir=STORE_DIR):
+    """Return the cached export of weights for runtime, building it on the first call."""
+    entry = os.path.join(store_dir, export_key(weights, runtime, imgsz))
+    info_path = os.path.join(entry, "export.json")
+    if os.path.exists(info_path):
+        with open(info_path) as f:
+            return os.path.join(entry, json.load(f)["artifact"])
+
+    from ultralytics import YOLO
+
+    print(f"Exporting {weights} to {runtime} (imgsz={imgsz}); later runs reuse the cached export")
+    options = dict(EXPORT_OPTIONS.get(runtime, {}))
+    if options.get("int8"):
+        options["data"] = calibration_yaml(store_dir)
+    # dynamic axes, so the batched predictor can send any batch size
+    exported = YOLO(weights).export(format=RUNTIMES[runtime], imgsz=imgsz, dynamic=True, **options)
+
+    # ultralytics writes next to the weights; move the artifact into the store
+    # and publish the entry with a rename, so a killed export leaves no entry
+    tmp_entry = entry + ".tmp"
+    shutil.rmtree(tmp_entry, ignore_errors=True)
+    os.makedirs(tmp_entry)
+    artifact = os.path.basename(os.path.normpath(exported))
+    shutil.move(exported, os.path.join(tmp_entry, artifact))
+    with open(os.path.join(tmp_entry, "export.json"), "w") as f:
+        json.dump({"weights": os.path.abspath(weights), "runtime": runtime, "imgsz": imgsz, "artifact": artifact}, f)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmp_entry, entry)
+    return os.path.join(entry, artifact)
+
+
+def load_model(weights=None, runtime="torch", imgsz=640, store_dir=STORE_DIR):
+    """Load weights (default: the latest custom model) through the chosen runtime."""
+    from ultralytics import YOLO
+
+    weights = weights or get_latest_custom_model()
+    if RUNTIMES[runtime] is None:
+        return YOLO(weights)
+    return YOLO(export_model(weights, runtime, imgsz, store_dir), task="detect")
+
+
+def publish_config(weights, runtime, imgsz, metrics=None, path=PUBLISHED_PATH):
+    """Record the runtime and imgsz inference.py should use for these weights."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    config = {"weights": os.path.abspath(weights), "weights_sha256": weights_digest(weights),
+              "runtime": runtime, "imgsz": imgsz, "metrics": metrics or {}}
+    with open(path + ".tmp", "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return config
+
+
+def published_config(weights, path=PUBLISHED_PATH):
+    """The published config for weights, or None if none was published for this exact file."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        config = json.load(f)
+    if config.get("weights_sha256") != weights_digest(weights):
+        return None  # published for other (e.g. older) weights
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export trained weights to a CPU runtime and cache the result')
+    parser.add_argument('--model', default=None, help='Weights to export (default: latest runs/detect/yolov8n_custom*)')
+    parser.add_argument('--runtime', choices=[r for r in RUNTIMES if RUNTIMES[r]], default='onnx', help='Export target')
+    parser.add_argument('--imgsz', type=int, default=640, help='Export resolution')
+    parser.add_argument('--store', default=STORE_DIR, help='Model store directory')
+
+    args = parser.parse_args()
+
+    weights = args.model or get_latest_custom_model()
+    print(f"Cached export: {export_model(weights, args.runtime, args.imgsz, args.store)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Accuracy/latency sweep over runtimes (including INT8) and input sizes.
+
+For every runtime x imgsz configuration, the trained detector is exported
+through the model store (openvino-int8 is post-training quantized with the
+photos in training_data/real_assets as calibration data), validated on the
+val split of games_v8.yaml for mAP, and timed on CPU on the val images:
+single-image latency (p50/p90) and batched throughput. Configurations that no
+other configuration beats on both mAP50-95 and latency form the frontier.
+
+The report goes to runs/quantize_sweep/report.json and is printed as a
+table. --publish records the fastest frontier configuration within
+--max-map-drop of the best mAP (or the one named with --choose) in the model
+store, and inference.py then uses it by default for these weights.
+"""
+
+import os
+import glob
+import json
+import time
+import argparse
+import statistics
+
+import cv2
+import yaml
+
+from model_store import RUNTIMES, get_latest_custom_model, load_model, export_model, publish_config
+
+REPORT_DIR = os.path.join("runs", "quantize_sweep")
+DEFAULT_RUNTIMES = ["torch", "onnx", "openvino", "openvino-int8"]
+DEFAULT_SIZES = [320, 416, 512, 640]
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def val_images(data_yaml, limit=None):
+    """Image paths of the val split named in a dataset YAML."""
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    base = os.path.join(os.path.dirname(os.path.abspath(data_yaml)), data.get("path", "."))
+    val_dir = os.path.join(base, data["val"])
+    if os.path.isdir(os.path.join(val_dir, "images")):
+        val_dir = os.path.join(val_dir, "images")
+    paths = sorted(p for p in glob.glob(os.path.join(val_dir, "**", "*"), recursive=True)
+                   if p.lower().endswith(IMAGE_EXTENSIONS))
+    return paths[:limit] if limit else paths
+
+
+def measure_accuracy(weights, runtime, imgsz, data_yaml, batch):
+    """mAP50-95 and mAP50 of one configuration on the val split."""
+    model = load_model(weights, runtime, imgsz)
+    metrics = model.val(data=data_yaml, imgsz=imgsz, batch=batch if RUNTIMES[runtime] is None else 1,
+                        device="cpu", plots=False, verbose=False)
+    return {"map50_95": round(float(metrics.box.map), 4), "map50": round(float(metrics.box.map50), 4)}
+
+
+def measure_speed(weights, runtime, imgsz, images, batch, warmup=3):
+    """CPU latency per image (p50/p90 ms) and batched throughput (images/s) on decoded images."""
+    model = load_model(weights, runtime, imgsz)
+    for image in images[:warmup]:
+        model.predict(source=[image], imgsz=imgsz, device="cpu", verbose=False)
+
+    latencies = []
+    for image in images:
+        start = time.perf_counter()
+        model.predict(source=[image], imgsz=imgsz, device="cpu", verbose=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    start = time.perf_counter()
+    for i in range(0, len(images), batch):
+        model.predict(source=images[i:i + batch], imgsz=imgsz, device="cpu", verbose=False)
+    elapsed = time.perf_counter() - start
+    return {
+        "latency_ms_p50": round(statistics.median(latencies), 2),
+        "latency_ms_p90": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))], 2),
+        "images_per_s": round(len(images) / elapsed, 2),
+    }
+
+
+def mark_frontier(rows):
+    """Flag the rows no other row beats on both mAP50-95 and p50 latency."""
+    done = [r for r in rows if "error" not in r]
+    for r in done:
+        r["frontier"] = not any(
+            o is not r and o["map50_95"] >= r["map50_95"] and o["latency_ms_p50"] <= r["latency_ms_p50"]
+            and (o["map50_95"] > r["map50_95"] or o["latency_ms_p50"] < r["latency_ms_p50"])
+            for o in done
+        )
+
+
+def pick_config(rows, max_map_drop):
+    """Fastest frontier row whose mAP50-95 is within max_map_drop of the best."""
+    done = [r for r in rows if r.get("frontier")]
+    if not done:
+        return None
+    best = max(r["map50_95"] for r in done)
+    eligible = [r for r in done if r["map50_95"] >= best - max_map_drop]
+    return min(eligible, key=lambda r: r["latency_ms_p50"])
+
+
+def print_table(rows):
+    print(f"\n{'runtime':<15}{'imgsz':>6}{'mAP50-95':>10}{'mAP50':>8}{'p50 ms':>9}{'p90 ms':>9}{'img/s':>8}  frontier")
+    for r in rows:
+        if "error" in r:
+            print(f"{r['runtime']:<15}{r['imgsz']:>6}  failed: {r['error']}")
+            continue
+        print(f"{r['runtime']:<15}{r['imgsz']:>6}{r['map50_95']:>10.4f}{r['map50']:>8.4f}{r['latency_ms_p50']:>9.2f}"
+              f"{r['latency_ms_p90']:>9.2f}{r['images_per_s']:>8.2f}  {'*' if r['frontier'] else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep runtimes (incl. INT8) and input sizes for mAP vs CPU latency')
+    parser.add_argument('--model', default=None, help='Weights to sweep (default: latest runs/detect/yolov8n_custom*)')
+    parser.add_argument('--data', default='games_v8.yaml', help='Dataset YAML whose val split is measured')
+    parser.add_argument('--runtimes', nargs='+', choices=sorted(RUNTIMES), default=DEFAULT_RUNTIMES,
+                        help='Runtimes to sweep')
+    parser.add_argument('--imgsz', type=int, nargs='+', default=DEFAULT_SIZES, help='Input sizes to sweep')
+    parser.add_argument('--batch', type=int, default=8, help='Batch size for validation and throughput')
+    parser.add_argument('--speed-images', type=int, default=50, help='Val images used for the latency measurements')
+    parser.add_argument('--out', default=os.path.join(REPORT_DIR, 'report.json'), help='Report path')
+    parser.add_argument('--publish', action='store_true', help='Publish the chosen configuration for inference.py')
+    parser.add_argument('--max-map-drop', type=float, default=0.01,
+                        help='mAP50-95 the published configuration may give up for speed (absolute)')
+    parser.add_argument('--choose', default=None, help='Publish this runtime:imgsz instead of picking one')
+
+    args = parser.parse_args()
+
+    weights = args.model or get_latest_custom_model()
+    paths = val_images(args.data, args.speed_images)
+    if not paths:
+        parser.error(f"no val images found for {args.data}")
+    images = [im for im in (cv2.imread(p) for p in paths) if im is not None]
+    print(f"Sweeping {weights} over {args.runtimes} x {args.imgsz} ({len(images)} images for timing)")
+
+    rows = []
+    for runtime in args.runtimes:
+        for imgsz in args.imgsz:
+            row = {"runtime": runtime, "imgsz": imgsz}
+            try:
+                if RUNTIMES[runtime] is not None:
+                    row["artifact"] = export_model(weights, runtime, imgsz)
+                row.update(measure_accuracy(weights, runtime, imgsz, args.data, args.batch))
+                row.update(measure_speed(weights, runtime, imgsz, images, args.batch))
+            except Exception as e:
+                row["error"] = f"{type(e).__name__}: {e}"
+            rows.append(row)
+            print(f"{runtime} @ {imgsz}: {row}")
+
+    mark_frontier(rows)
+    print_table(rows)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"weights": os.path.abspath(weights), "data": args.data, "rows": rows}, f, indent=2)
+    print(f"\nReport written to {args.out}")
+
+    if args.publish or args.choose:
+        if args.choose:
+            runtime, _, imgsz = args.choose.partition(":")
+            chosen = next((r for r in rows if r["runtime"] == runtime and str(r["imgsz"]) == imgsz
+                           and "error" not in r), None)
+            if chosen is None:
+                parser.error(f"--choose {args.choose} is not a successful configuration of this sweep")
+        else:
+            chosen = pick_config(rows, args.max_map_drop)
+            if chosen is None:
+                parser.error("no configuration succeeded; nothing to publish")
+        metrics = {k: chosen[k] for k in ("map50_95", "map50", "latency_ms_p50", "latency_ms_p90", "images_per_s")}
+        publish_config(weights, chosen["runtime"], chosen["imgsz"], metrics)
+        print(f"Published {chosen['runtime']} at imgsz={chosen['imgsz']} for inference.py "
+              f"(mAP50-95 {chosen['map50_95']}, p50 {chosen['latency_ms_p50']} ms)")
+
+
+if __name__ == "__main__":
+    main()
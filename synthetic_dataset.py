@@ -0,0 +1,146 @@
+"""
+Streaming synthetic dataset for ultralytics training.
+
+Samples are composited by training_data/create_synth.py inside the dataloader
+workers and handed to the trainer as uint8 arrays with YOLO labels, so every
+epoch sees fresh images and nothing is JPEG-encoded, copied or decoded. The
+validation split keeps coming from the on-disk dataset in games_v8.yaml.
+"""
+
+import os
+import sys
+import math
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import colorstr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "training_data"))
+import create_synth  # noqa: E402
+
+
+def parse_yolo_boxes(bounding_boxes):
+    """Turn create_synth's "cls cx cy w h" strings into an (N, 5) float32 array."""
+    if not bounding_boxes:
+        return np.zeros((0, 5), dtype=np.float32)
+    return np.array([[float(v) for v in box.split()] for box in bounding_boxes], dtype=np.float32)
+
+
+class SyntheticYOLODataset(YOLODataset):
+    """YOLODataset whose samples are rendered on the fly instead of read from disk."""
+
+    def __init__(self, *args, num_samples=1000, positive_fraction=0.5, **kwargs):
+        self.num_samples = num_samples
+        self.positive_fraction = positive_fraction
+        self.bg_files = create_synth.list_images(create_synth.BACKGROUND_DIR)
+        # Recent renders, so mosaic partners drawn from the buffer are reused
+        # instead of composited again
+        self.recent = OrderedDict()
+        super().__init__(*args, **kwargs)
+
+    def get_img_files(self, img_path):
+        # Virtual file names; they only label plots and logs
+        return [f"synthetic_stream_{i:06d}.jpg" for i in range(self.num_samples)]
+
+    def get_labels(self):
+        # Labels are only known once a sample is rendered
+        return [
+            {
+                "im_file": im_file,
+                "shape": (self.imgsz, self.imgsz),
+                "cls": np.zeros((0, 1), dtype=np.float32),
+                "bboxes": np.zeros((0, 4), dtype=np.float32),
+                "segments": [],
+                "keypoints": None,
+                "normalized": True,
+                "bbox_format": "xywh",
+            }
+            for im_file in self.im_files
+        ]
+
+    def render(self, index):
+        """Composite a sample with its long side at imgsz."""
+        is_positive = np.random.random() < self.positive_fraction
+        # Composited straight at the training resolution; the resize below
+        # only catches backgrounds smaller than imgsz
+        image, bounding_boxes = create_synth.render_sample(self.bg_files, is_positive, target_size=self.imgsz)
+
+        # ultralytics works in BGR, as cv2.imread returns
+        im = np.ascontiguousarray(np.asarray(image)[..., ::-1])
+        h0, w0 = im.shape[:2]
+        r = self.imgsz / max(h0, w0)
+        if r != 1:
+            w, h = (min(math.ceil(w0 * r), self.imgsz), min(math.ceil(h0 * r), self.imgsz))
+            im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+        return im, (h0, w0), parse_yolo_boxes(bounding_boxes)
+
+    def get_image_and_label(self, index):
+        if index in self.recent:
+            im, ori_shape, boxes = self.recent[index]
+        else:
+            im, ori_shape, boxes = self.render(index)
+            # buffer mirrors recent, so mosaic partners always hit a render
+            self.recent[index] = (im, ori_shape, boxes)
+            self.buffer.append(index)
+            while len(self.recent) > max(self.max_buffer_length, 1):
+                evicted, _ = self.recent.popitem(last=False)
+                self.buffer.remove(evicted)
+
+        label = {
+            "im_file": self.im_files[index],
+            "cls": boxes[:, :1].copy(),
+            "bboxes": boxes[:, 1:].copy(),
+            "segments": [],
+            "keypoints": None,
+            "normalized": True,
+            "bbox_format": "xywh",
+            "img": im.copy(),
+            "ori_shape": ori_shape,
+            "resized_shape": im.shape[:2],
+        }
+        label["ratio_pad"] = (im.shape[0] / ori_shape[0], im.shape[1] / ori_shape[1])
+        return self.update_labels_info(label)
+
+    def __getitem__(self, index):
+        # The sample itself is always fresh; only mosaic partners come from recent renders
+        if self.recent.pop(index, None) is not None:
+            self.buffer.remove(index)
+        return self.transforms(self.get_image_and_label(index))
+
+
+def make_synthetic_trainer(num_samples, positive_fraction=0.5):
+    """Return a DetectionTrainer class that trains on num_samples fresh synthetic images per epoch."""
+
+    class SyntheticStreamTrainer(DetectionTrainer):
+        def build_dataset(self, img_path, mode="train", batch=None):
+            if mode != "train":
+                return super().build_dataset(img_path, mode, batch)
+            stride = max(int(self.model.stride.max() if self.model else 0), 32)
+            return SyntheticYOLODataset(
+                num_samples=num_samples,
+                positive_fraction=positive_fraction,
+                img_path=img_path,
+                imgsz=self.args.imgsz,
+                batch_size=batch,
+                augment=True,
+                hyp=self.args,
+                rect=False,
+                cache=None,
+                single_cls=self.args.single_cls or False,
+                stride=stride,
+                pad=0.0,
+                prefix=colorstr(f"{mode}: "),
+                task=self.args.task,
+                classes=self.args.classes,
+                data=self.data,
+                fraction=1.0,
+            )
+
+        def plot_training_labels(self):
+            # Streamed labels do not exist before training starts
+            pass
+
+    return SyntheticStreamTrainer
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The data tools import each other as top-level modules, as they do when run from training_data/
+sys.path.insert(0, os.path.join(ROOT, "training_data"))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def synth_assets(tmp_path, monkeypatch):
+    """Point create_synth at a few small generated assets, read from disk through a private index."""
+    import asset_pack
+    import create_synth
+    import image_index
+
+    monkeypatch.setenv(image_index.INDEX_ENV, str(tmp_path / "index.sqlite"))
+    monkeypatch.setattr(image_index, "_index", None)
+    monkeypatch.setattr(create_synth, "get_asset_pack", lambda: None)
+    monkeypatch.setattr(asset_pack, "get_duplicates", lambda directory: set())
+
+    rng = np.random.default_rng(0)
+    dirs = {}
+    for name, count, size in (("backgrounds", 2, (320, 240)), ("pos", 3, (60, 84)), ("neg", 3, (60, 84))):
+        directory = tmp_path / name
+        directory.mkdir()
+        for i in range(count):
+            blocks = rng.integers(0, 256, (6, 4, 3), dtype=np.uint8)
+            Image.fromarray(blocks).resize(size, Image.BILINEAR).save(directory / f"{name}_{i}.png")
+        dirs[name] = str(directory)
+
+    monkeypatch.setattr(create_synth, "BACKGROUND_DIR", dirs["backgrounds"])
+    monkeypatch.setattr(create_synth, "COVER_DIRS_POS", [dirs["pos"]])
+    monkeypatch.setattr(create_synth, "COVER_DIRS_NEG", [dirs["neg"]])
+    monkeypatch.setattr(create_synth, "DENSE_SCENE_PROBABILITY", 0.0)
+    return dirs
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+from PIL import Image
+
+import assemble_dataset
+import image_index
+
+
+def test_split_is_stable_and_proportional():
+    stems = [f"synthetic_{n:03d}" for n in range(1, 4001)]
+    splits = {stem: assemble_dataset.split_for(stem, 0.75) for stem in stems}
+    assert sum(s == "train" for s in splits.values()) / len(stems) == pytest.approx(0.75, abs=0.02)
+
+    # Same answer every time, independent of which other samples exist
+    assert {stem: assemble_dataset.split_for(stem, 0.75) for stem in reversed(stems)} == splits
+    # A larger fraction only moves samples from val to train
+    assert all(assemble_dataset.split_for(stem, 0.9) == "train" for stem in stems if splits[stem] == "train")
+    # The salt reshuffles
+    assert {stem: assemble_dataset.split_for(stem, 0.75, salt="v2") for stem in stems} != splits
+
+
+def test_assemble_keeps_splits_across_rebuilds(tmp_path, monkeypatch):
+    monkeypatch.setenv(image_index.INDEX_ENV, str(tmp_path / "index.sqlite"))
+    monkeypatch.setattr(image_index, "_index", None)
+    synthetic = tmp_path / "output"
+    synthetic.mkdir()
+
+    def add_samples(numbers):
+        for n in numbers:
+            Image.new("RGB", (8, 8)).save(synthetic / f"synthetic_{n:03d}.jpg")
+            (synthetic / f"synthetic_{n:03d}.txt").write_text("0 0.5 0.5 0.1 0.1\n")
+
+    real = tmp_path / "YOLODataset"
+    for split in assemble_dataset.SPLITS:
+        (real / "images" / split).mkdir(parents=True)
+        (real / "labels" / split).mkdir(parents=True)
+        Image.new("RGB", (8, 8)).save(real / "images" / split / f"photo_{split}.png")
+        (real / "labels" / split / f"photo_{split}.txt").write_text("")
+
+    def layout(out):
+        return {split: sorted(os.listdir(out / split / "images")) for split in assemble_dataset.SPLITS}
+
+    add_samples(range(1, 41))
+    out = tmp_path / "dataset"
+    counts = assemble_dataset.assemble(str(synthetic), str(real), str(out), workers=2)
+    first = layout(out)
+    assert counts == {split: len(first[split]) for split in assemble_dataset.SPLITS}
+    assert "photo_train.png" in first["train"] and "photo_val.png" in first["val"]
+    assert sorted(os.listdir(out / "train" / "labels")) == [os.path.splitext(n)[0] + ".txt" for n in first["train"]]
+
+    # Growing the dataset leaves every existing sample in its split
+    image_index.get_image_index().fresh.clear()
+    add_samples(range(41, 81))
+    assemble_dataset.assemble(str(synthetic), str(real), str(out), workers=2)
+    second = layout(out)
+    for split in assemble_dataset.SPLITS:
+        assert set(first[split]) <= set(second[split])
+    assert sum(map(len, second.values())) == 80 + 2
@@ -0,0 +1,74 @@
+import shutil
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import asset_pack
+from image_index import ImageIndex
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    # A private image index and no dedup manifest, so nothing under training_data/build is used
+    index = ImageIndex(str(tmp_path / "index.sqlite"))
+    monkeypatch.setattr(asset_pack, "get_image_index", lambda: index)
+    monkeypatch.setattr(asset_pack, "get_duplicates", lambda directory: set())
+    monkeypatch.setattr(asset_pack, "_open_pack", None)
+
+    covers = tmp_path / "covers"
+    covers.mkdir()
+    rng = np.random.default_rng(0)
+    for name, size in (("a.png", (40, 60)), ("b.jpg", (300, 200)), ("c.png", (64, 64))):
+        pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(covers / name)
+    return tmp_path, covers
+
+
+def build(tmp_path, covers):
+    groups = {str(covers): 100}
+    pack_path = str(tmp_path / "pack.bin")
+    asset_pack.build_asset_pack(groups, pack_path, workers=1)
+    return groups, pack_path
+
+
+def test_pack_round_trip(sources):
+    tmp_path, covers = sources
+    groups, pack_path = build(tmp_path, covers)
+    assert not asset_pack.pack_is_stale(groups, pack_path)
+
+    pack = asset_pack.AssetPack(pack_path)
+    assert pack.has_group(str(covers))
+    assert pack.names(str(covers)) == ["a.png", "b.jpg", "c.png"]
+
+    # Small images are stored as they are, large ones shrunk to the max size
+    stored = pack.get_image(str(covers), "a.png")
+    source = Image.open(covers / "a.png").convert("RGBA")
+    assert np.array_equal(np.asarray(stored), np.asarray(source))
+    assert pack.get_image(str(covers), "b.jpg").size == (100, 67)
+    assert pack.source_size(str(covers), "b.jpg") == (300, 200)
+
+
+def test_changed_sources_fall_back_to_disk(sources):
+    tmp_path, covers = sources
+    groups, pack_path = build(tmp_path, covers)
+    Image.new("RGB", (10, 10)).save(covers / "d.png")
+    asset_pack.get_image_index().fresh.clear()  # as a new process would
+
+    assert asset_pack.pack_is_stale(groups, pack_path)
+    pack = asset_pack.get_asset_pack(pack_path)
+    assert not pack.has_group(str(covers))
+
+
+def test_pack_and_index_from_different_builds_are_not_used(sources):
+    tmp_path, covers = sources
+    groups, pack_path = build(tmp_path, covers)
+    shutil.copy(pack_path, tmp_path / "old.bin")
+    build(tmp_path, covers)
+    # As if the new index was written but the crash came before the pack
+    shutil.copy(tmp_path / "old.bin", pack_path)
+
+    assert asset_pack.pack_is_stale(groups, pack_path)
+    with pytest.raises(ValueError):
+        asset_pack.AssetPack(pack_path)
+    assert asset_pack.get_asset_pack(pack_path) is None
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+
+import augment
+import create_synth
+
+
+def legacy_enhance(img, brightness, contrast, saturation):
+    """The chained ImageEnhance calls augment_cover_image() has always made."""
+    img = ImageEnhance.Brightness(img).enhance(brightness)
+    img = ImageEnhance.Contrast(img).enhance(contrast)
+    return ImageEnhance.Color(img).enhance(saturation)
+
+
+def random_params(rng):
+    return (rng.uniform(*create_synth.BRIGHTNESS_RANGE),
+            rng.uniform(*create_synth.CONTRAST_RANGE),
+            rng.uniform(*create_synth.SATURATION_RANGE))
+
+
+@pytest.mark.parametrize("high", [256, 180])
+def test_enhance_matches_legacy_chain(high):
+    # Full-range images clip at every step, darker ones rarely
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        img = Image.fromarray(rng.integers(0, high, (48, 32, 4), dtype=np.uint8), "RGBA")
+        params = random_params(rng)
+        assert np.array_equal(np.asarray(augment.enhance(img, *params)), np.asarray(legacy_enhance(img, *params)))
+
+
+def test_enhance_clips_between_steps():
+    # Brightening saturates the highlights before contrast pivots on the mean
+    img = Image.new("RGB", (16, 16), (240, 200, 40))
+    expected = np.asarray(legacy_enhance(img, 1.3, 1.2, 1.0))
+    assert np.array_equal(np.asarray(augment.enhance(img, 1.3, 1.2, 1.0)), expected)
+
+
+def test_enhance_skips_unit_factors():
+    img = Image.new("RGBA", (8, 8), (10, 20, 30, 40))
+    out = augment.enhance(img, brightness=1.0, contrast=1.0, saturation=1.0)
+    assert out is not img
+    assert np.array_equal(np.asarray(out), np.asarray(img))
+
+
+def test_noise_and_opacity():
+    np.random.seed(0)
+    arr = np.full((20, 20, 4), 128, dtype=np.uint8)
+    augment.apply_noise_and_opacity(arr, noise=10, opacity=0.5)
+    assert arr[..., :3].min() >= 118 and arr[..., :3].max() <= 138
+    assert arr[..., :3].std() > 1
+    assert arr[..., 3].min() >= 59 and arr[..., 3].max() <= 69
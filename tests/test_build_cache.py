@@ -0,0 +1,56 @@
+import os
+import sys
+
+import build_cache
+
+
+def check(monkeypatch, manifest, *argv):
+    monkeypatch.setattr(sys, "argv", ["build_cache.py", *argv, "--manifest", str(manifest)])
+    return build_cache.main()
+
+
+def test_stage_key_tracks_content_params_and_upstream(tmp_path):
+    manifest = {"stages": {}, "files": {}}
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    (assets / "a.png").write_bytes(b"one")
+    inputs = [str(assets)]
+    key = build_cache.stage_key(manifest, inputs, "seed=0")
+
+    # Touching a file re-hashes it but keeps the key
+    stat = os.stat(assets / "a.png")
+    os.utime(assets / "a.png", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert build_cache.stage_key(manifest, inputs, "seed=0") == key
+
+    assert build_cache.stage_key(manifest, inputs, "seed=1") != key
+    manifest["stages"]["synth"] = {"key": "abc"}
+    assert build_cache.stage_key(manifest, inputs, "seed=0", after=["synth"]) != \
+        build_cache.stage_key(manifest, inputs, "seed=0")
+    (assets / "a.png").write_bytes(b"two")
+    edited = build_cache.stage_key(manifest, inputs, "seed=0")
+    assert edited != key
+    (assets / "b.png").write_bytes(b"one")
+    assert build_cache.stage_key(manifest, inputs, "seed=0") not in (key, edited)
+
+
+def test_check_record_forget(tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    source = tmp_path / "input.txt"
+    source.write_text("v1")
+    stage = ["synth", "--inputs", str(source), "--params", "n=5"]
+
+    assert check(monkeypatch, manifest, "check", *stage) == 1
+    assert check(monkeypatch, manifest, "record", *stage) == 0
+    assert check(monkeypatch, manifest, "check", *stage) == 0
+
+    # A downstream stage goes stale when its upstream key changes
+    split = ["split", "--after", "synth"]
+    check(monkeypatch, manifest, "record", *split)
+    assert check(monkeypatch, manifest, "check", *split) == 0
+    source.write_text("v2")
+    assert check(monkeypatch, manifest, "check", *stage) == 1
+    check(monkeypatch, manifest, "record", *stage)
+    assert check(monkeypatch, manifest, "check", *split) == 1
+
+    check(monkeypatch, manifest, "forget", "synth")
+    assert check(monkeypatch, manifest, "check", *stage) == 1
@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import compile_dataset
+
+
+def test_letterbox_labels_wide_and_tall():
+    labels = np.array([[0, 0.25, 0.5, 0.1, 0.4]], dtype=np.float32)
+    # 200x100 into 100: scaled by 0.5 to 100x50, padded 25 above and below
+    wide = compile_dataset.letterbox_labels(labels, 200, 100, 100)
+    assert wide[0] == pytest.approx([0, 0.25, 0.5, 0.1, 0.2])
+    # 100x200 into 100: 50x100, padded 25 left and right
+    tall = compile_dataset.letterbox_labels(labels, 100, 200, 100)
+    assert tall[0] == pytest.approx([0, (0.25 * 50 + 25) / 100, 0.5, 0.05, 0.4])
+
+
+@pytest.mark.parametrize("size", [(300, 120), (90, 160), (64, 64)])
+def test_compiled_boxes_land_on_the_drawn_cover(tmp_path, size):
+    width, height = size
+    x0, y0, x1, y1 = width // 5, height // 3, width // 2, height * 3 // 4
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[y0:y1, x0:x1] = 255
+    image_path, label_path = tmp_path / "sample.png", tmp_path / "sample.txt"
+    Image.fromarray(image).save(image_path)
+    label_path.write_text(f"0 {(x0 + x1) / 2 / width} {(y0 + y1) / 2 / height} "
+                          f"{(x1 - x0) / width} {(y1 - y0) / height}\n")
+
+    imgsz = 96
+    out_dir = str(tmp_path / "compiled")
+    assert compile_dataset.compile_split([(str(image_path), str(label_path))], out_dir, imgsz, workers=1) == 1
+    images = np.load(f"{out_dir}/images.npy", mmap_mode="r")
+    labels = np.load(f"{out_dir}/labels.npy")
+    assert images.shape == (1, imgsz, imgsz, 3)
+    assert np.load(f"{out_dir}/offsets.npy").tolist() == [0, 1]
+    assert np.load(f"{out_dir}/shapes.npy").tolist() == [[height, width]]
+    with open(f"{out_dir}/meta.json") as f:
+        assert json.load(f)["files"] == ["sample.png"]
+
+    # The label's box in the letterboxed square matches the bright pixels
+    _, cx, cy, w, h = labels[0] * np.array([1, imgsz, imgsz, imgsz, imgsz])
+    ys, xs = np.nonzero(images[0, ..., 0] > 127)
+    assert (xs.min(), xs.max() + 1) == pytest.approx((cx - w / 2, cx + w / 2), abs=1)
+    assert (ys.min(), ys.max() + 1) == pytest.approx((cy - h / 2, cy + h / 2), abs=1)
+    # Padding is ultralytics' grey
+    _, new_w, new_h, left, top = compile_dataset.letterbox_geometry(width, height, imgsz)
+    if top:
+        assert (images[0, :top] == compile_dataset.PAD_VALUE).all()
+    if left:
+        assert (images[0, :, :left] == compile_dataset.PAD_VALUE).all()
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance, ImageFilter
+
+from composite import composite_cover
+
+
+def legacy_shadow(img, offset, blur_radius, opacity):
+    """The drop shadow create_synth.py drew before composite.py (darkened RGBA copy, blurred)."""
+    shadow = ImageEnhance.Brightness(img.copy()).enhance(0.3)
+    shadow_img = Image.new("RGBA", (img.width + abs(offset[0]), img.height + abs(offset[1])), (0, 0, 0, 0))
+    shadow_img.paste(shadow, (max(0, offset[0]), max(0, offset[1])))
+    if blur_radius > 0:
+        shadow_img = shadow_img.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+    r, g, b, a = shadow_img.split()
+    shadow_img = Image.merge("RGBA", (r, g, b, ImageEnhance.Brightness(a).enhance(opacity)))
+    shadow_img.paste(img, (max(0, -offset[0]), max(0, -offset[1])), img)
+    return shadow_img
+
+
+# A uniform cover, so the mean-colour tint equals the legacy per-pixel darkening;
+# black when blurred, as the legacy blur also mixed in the transparent black border
+@pytest.mark.parametrize("colour, blur_radius", [((0, 0, 0), 2.0), ((200, 120, 40), 0)])
+@pytest.mark.parametrize("opacity", [0.2, 0.5])
+def test_shadow_matches_legacy_path(colour, blur_radius, opacity):
+    cover = Image.new("RGBA", (60, 80), colour + (255,))
+    offset, pos = (16, 14), (50, 40)
+
+    legacy = Image.new("RGBA", (200, 200), (255, 255, 255, 255))
+    legacy.alpha_composite(legacy_shadow(cover, offset, blur_radius, opacity), pos)
+    canvas = Image.new("RGB", (200, 200), (255, 255, 255))
+    composite_cover(canvas, cover, pos, shadow=(offset, blur_radius, opacity))
+
+    # The legacy layer ended at the cover plus offset, cutting the blur off at its border;
+    # compare inside that box, short of the cut
+    cut = 3 * int(blur_radius)
+    box = (pos[0], pos[1], pos[0] + cover.width + offset[0] - cut, pos[1] + cover.height + offset[1] - cut)
+    expected = np.asarray(legacy.convert("RGB").crop(box), dtype=np.int16)
+    actual = np.asarray(canvas.crop(box), dtype=np.int16)
+    diff = np.abs(expected - actual)
+    assert diff.mean() < 1.0
+    assert diff.max() <= 3
@@ -0,0 +1,133 @@
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import create_synth
+
+
+def legacy_noisy_resize(img, intensity, size):
+    """Noise at source resolution followed by the resize, as augment_cover_image() and
+    place_covers_on_background() did before the single warp."""
+    arr = np.array(img)
+    noise = np.random.randint(-intensity, intensity + 1, arr.shape, dtype=np.int16)
+    arr = np.clip(arr.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(arr, mode=img.mode).resize(size, Image.BILINEAR)
+
+
+def noise_std(img):
+    # Grey source, so everything but the border is noise
+    return np.asarray(img, dtype=np.float64)[2:-2, 2:-2, :3].std()
+
+
+@pytest.mark.parametrize("target_width", [150, 300, 450, 900])
+@pytest.mark.parametrize("intensity", [10, 30])
+def test_noise_amplitude_matches_legacy_resize(monkeypatch, target_width, intensity):
+    monkeypatch.setattr(create_synth, "BLUR_PROBABILITY", 0.0)
+    monkeypatch.setattr(create_synth, "NOISE_PROBABILITY", 1.0)
+    monkeypatch.setattr(create_synth, "NOISE_INTENSITY", (intensity, intensity))
+    monkeypatch.setattr(create_synth, "sample_cover_color_params", dict)
+    np.random.seed(0)
+
+    cover = Image.new("RGBA", (600, 840), (128, 128, 128, 255))
+    size = (target_width, round(target_width * 1.4))
+    matrix = np.diag([size[0] / cover.width, size[1] / cover.height, 1.0])
+
+    expected = noise_std(legacy_noisy_resize(cover, intensity, size))
+    actual = noise_std(create_synth.augment_cover_image(cover, matrix, size))
+    assert actual == pytest.approx(expected, rel=0.15)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L"])
+def test_add_noise_keeps_mode_and_size(mode):
+    img = Image.new(mode, (33, 17), 128 if mode == "L" else (128,) * len(mode))
+    noisy = create_synth.add_noise(img, 20)
+    assert (noisy.mode, noisy.size) == (mode, img.size)
+    assert noise_std(noisy.convert("RGB")) > 1
+
+
+def test_identity_warp_reproduces_cover():
+    arr = np.zeros((40, 30, 4), dtype=np.uint8)
+    arr[5:35, 5:25] = 255
+    warped = create_synth.warp_cover(Image.fromarray(arr), np.eye(3), (30, 40))
+    assert np.array_equal(np.asarray(warped), arr)
+
+
+@pytest.mark.parametrize("target_size", [60, 150, 420])
+def test_scaled_warp_alpha_matches_returned_box(monkeypatch, target_size):
+    # No perspective and no rotation: a pure scale of an opaque cover
+    monkeypatch.setattr(create_synth.random, "random", lambda: 0.0)
+    cover = Image.new("RGBA", (120, 168), (200, 50, 50, 255))
+    matrix, out_size, corners = create_synth.sample_cover_transform(cover.size, target_size)
+    alpha = np.asarray(create_synth.warp_cover(cover, matrix, out_size))[..., 3]
+
+    ys, xs = np.nonzero(alpha >= 128)
+    box_w, box_h = corners.max(axis=0)
+    assert corners.min(axis=0) == pytest.approx((0, 0))
+    assert max(box_w, box_h) == pytest.approx(target_size)
+    assert (xs.min(), ys.min()) == (0, 0)
+    assert (xs.max() + 1, ys.max() + 1) == (round(box_w), round(box_h))
+
+
+def generate(output_dir, monkeypatch, seed=3, workers=1, shard=(0, 1), resume=False):
+    monkeypatch.setattr(create_synth, "OUTPUT_DIR", str(output_dir))
+    kwargs = dict(seed=seed, workers=workers, shard=shard, resume=resume, encoder="pil")
+    create_synth.generate_synthetic_data(num_images=4, is_positive=True, **kwargs)
+    create_synth.generate_synthetic_data(num_images=2, is_positive=False, offset_index=5, **kwargs)
+
+
+def read_records(output_dir):
+    with open(output_dir / create_synth.MANIFEST_NAME) as f:
+        return {r["number"]: r for r in map(json.loads, f)}
+
+
+def test_incremental_regenerates_only_changed_samples(synth_assets, tmp_path, monkeypatch):
+    out = tmp_path / "out"
+    generate(out, monkeypatch)
+    expected = {1: True, 2: True, 3: True, 4: True, 6: False, 7: False}
+    digest = create_synth.run_digest(3, None, "pil")
+    assert create_synth.invalidate_changed(str(out), expected, digest) == 0
+
+    # Edit a cover that some, but not all, samples used
+    records = read_records(out)
+    users = {}
+    for number, record in records.items():
+        for asset in record["assets"]:
+            users.setdefault(asset, set()).add(number)
+    asset, changed = next((a, n) for a, n in sorted(users.items()) if 0 < len(n) < len(records)
+                          and not a.startswith(synth_assets["backgrounds"]))
+    Image.open(asset).rotate(180).save(asset)
+    before = {p.name: p.stat().st_mtime_ns for p in out.glob("synthetic_*")}
+
+    assert create_synth.invalidate_changed(str(out), expected, digest) == len(changed)
+    generate(out, monkeypatch, resume=True)
+    after = {p.name: p.stat().st_mtime_ns for p in out.glob("synthetic_*")}
+    assert after.keys() == before.keys()
+    rewritten = {int(name[10:13]) for name in after if after[name] != before[name]}
+    assert rewritten == changed
+
+    # Samples that are no longer wanted are dropped
+    del expected[4]
+    assert create_synth.invalidate_changed(str(out), expected, digest) == 1
+    assert not (out / "synthetic_004.jpg").exists() and not (out / "synthetic_004.txt").exists()
+
+
+def output_files(output_dir):
+    return {p.name: p.read_bytes() for p in sorted(output_dir.glob("synthetic_*"))}
+
+
+def test_seeded_output_is_independent_of_workers_and_shards(synth_assets, tmp_path, monkeypatch):
+    generate(tmp_path / "one", monkeypatch, workers=1)
+    generate(tmp_path / "three", monkeypatch, workers=3)
+    for shard in range(3):
+        generate(tmp_path / "sharded", monkeypatch, workers=2, shard=(shard, 3))
+
+    expected = output_files(tmp_path / "one")
+    assert len(expected) == 2 * 6
+    assert output_files(tmp_path / "three") == expected
+    assert output_files(tmp_path / "sharded") == expected
+
+    # Another seed renders other images
+    generate(tmp_path / "other", monkeypatch, seed=4)
+    assert output_files(tmp_path / "other") != expected
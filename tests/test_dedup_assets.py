@@ -0,0 +1,60 @@
+import numpy as np
+from PIL import Image, ImageFilter
+
+import dedup_assets
+
+
+def scene(seed, size=(240, 320)):
+    """A smooth random image with enough structure for the hashes to tell apart."""
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, (8, 6, 3), dtype=np.uint8)
+    img = Image.fromarray(blocks).resize(size, Image.NEAREST)
+    return img.filter(ImageFilter.GaussianBlur(6))
+
+
+def flip_bits(h, bits):
+    for bit in bits:
+        h ^= 1 << bit
+    return h
+
+
+def test_flipped_and_reencoded_copies_are_duplicates(tmp_path):
+    original = scene(0)
+    paths = [str(tmp_path / name) for name in ("cover.png", "cover_flip.png", "cover_small.jpg", "other.png")]
+    original.save(paths[0])
+    original.transpose(Image.FLIP_LEFT_RIGHT).save(paths[1])
+    original.resize((180, 240), Image.BILINEAR).save(paths[2], quality=60)
+    scene(1).save(paths[3])
+
+    hashes = dedup_assets.hash_images(paths, workers=1)
+    assert dedup_assets.find_duplicate_pairs(hashes) == [(0, 1), (0, 2), (1, 2)]
+    # Without mirror hashes the flipped copy is a different image
+    assert dedup_assets.find_duplicate_pairs(hashes, mirrors=False) == [(0, 2)]
+
+
+def test_multi_index_query_matches_brute_force():
+    rng = np.random.default_rng(0)
+    stored = [int(v) for v in rng.integers(0, 2**63, 500, dtype=np.int64)]
+    # Near neighbours of a few stored hashes, at and just past the threshold
+    queries = [flip_bits(stored[i], rng.choice(64, d, replace=False)) for i, d in ((3, 2), (10, 6), (20, 7))]
+    queries += [int(v) for v in rng.integers(0, 2**63, 20, dtype=np.int64)]
+
+    table = dedup_assets.MultiIndexHashTable(stored, threshold=6)
+    for q in queries:
+        expected = [i for i, h in enumerate(stored) if bin(h ^ q).count("1") <= 6]
+        assert table.query(q) == expected
+    assert table.query(queries[0]) == [3]
+    assert table.query(queries[2]) == []
+
+
+def test_hard_negatives_are_close_but_not_duplicates():
+    positive = 0x0123456789ABCDEF
+    hashes = [
+        (positive, 0, 0, 0),
+        (flip_bits(positive, range(10)), 0, 0, 0),  # 10 bits away: a hard negative
+        (flip_bits(positive, range(0, 60, 3)), 0, 0, 0),  # 20 bits away
+        (0, 0, positive, 0),  # mirrors onto the positive
+    ]
+    found = dedup_assets.find_hard_negatives(hashes, negatives=[1, 2, 3], positives=[0], threshold=12)
+    assert found == {1: [0], 3: [0]}
+    assert dedup_assets.find_hard_negatives(hashes, [1, 2, 3], [0], threshold=12, mirrors=False) == {1: [0]}
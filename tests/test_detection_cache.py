@@ -0,0 +1,136 @@
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+import inference  # noqa: E402
+
+
+class Tensor:
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class Boxes:
+    def __init__(self, image):
+        # One box whose size depends on the image, so results differ per image
+        side = float(image.mean()) + 10
+        self.xyxy = Tensor([[5, 5, 5 + side, 5 + side]])
+        self.conf = Tensor([0.9])
+        self.cls = Tensor([0])
+
+
+class Result:
+    def __init__(self, image):
+        self.boxes = Boxes(image)
+
+
+class StubModel:
+    names = {0: "game"}
+
+    def __init__(self):
+        self.images = 0
+
+    def predict(self, source, imgsz, conf, stream, verbose):
+        self.images += len(source)
+        return (Result(image) for image in source)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    for n, value in ((1, 40), (2, 90)):
+        cv2.imwrite(str(photos / f"PinkGorilla_{n}.jpg"), np.full((64, 48, 3), value, dtype=np.uint8))
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"weights v1")
+
+    models = []
+
+    def load_model(weights, runtime, imgsz):
+        models.append(StubModel())
+        return models[-1]
+
+    monkeypatch.setattr(inference, "load_model", load_model)
+    return photos, weights, models
+
+
+def run(photos, weights, **overrides):
+    args = argparse.Namespace(model=str(weights), images=str(photos), batch_size=4, imgsz=640, conf=0.25,
+                              runtime="torch", format="png", compression=None, no_render=False, detections=None,
+                              io_workers=2, tile=0, tile_overlap=0.2, tile_merge="nms", tile_min_texture=0.0,
+                              cache=str(photos.parent / "cache.jsonl"), no_cache=False, from_cache=False,
+                              watch=False)
+    for name, value in overrides.items():
+        setattr(args, name, value)
+    detections = photos.parent / "detections.jsonl"
+    args.detections = str(detections)
+    inference_run = inference.InferenceRun(args)
+    try:
+        inference_run.process(inference.get_pink_gorilla_images(str(photos)))
+    finally:
+        inference_run.close()
+    with open(detections) as f:
+        return [line for line in f]
+
+
+def model_images(models):
+    return sum(model.images for model in models)
+
+
+def test_lookup_is_by_content(workspace):
+    photos, weights, models = workspace
+    first = run(photos, weights)
+    assert model_images(models) == 2
+
+    # A renamed copy is served from the cache, and the model is never loaded
+    shutil.move(photos / "PinkGorilla_2.jpg", photos / "PinkGorilla_7.jpg")
+    models.clear()
+    second = run(photos, weights)
+    assert models == []
+    assert second[0] == first[0]
+    assert second[1] == first[1].replace("PinkGorilla_2.jpg", "PinkGorilla_7.jpg")
+
+
+def test_params_and_weights_invalidate(workspace):
+    photos, weights, models = workspace
+    run(photos, weights)
+    run(photos, weights, conf=0.5)
+    run(photos, weights, imgsz=320)
+    assert model_images(models) == 3 * 2
+
+    models.clear()
+    weights.write_bytes(b"weights v2")
+    run(photos, weights)
+    assert model_images(models) == 2
+
+    # Back to the first weights: every combination is still cached
+    models.clear()
+    weights.write_bytes(b"weights v1")
+    run(photos, weights)
+    run(photos, weights, conf=0.5)
+    assert models == []
+
+
+def test_from_cache_rerenders_without_the_model(workspace):
+    photos, weights, models = workspace
+    run(photos, weights, no_render=True)
+    assert not list(photos.glob("*_boxed.png"))
+    cv2.imwrite(str(photos / "PinkGorilla_3.jpg"), np.full((64, 48, 3), 200, dtype=np.uint8))
+
+    models.clear()
+    lines = run(photos, weights, from_cache=True)
+    assert models == []
+    assert len(lines) == 2  # the uncached image is skipped
+    assert sorted(p.name for p in photos.glob("*_boxed.png")) == ["PinkGorilla_1_boxed.png", "PinkGorilla_2_boxed.png"]
+    assert os.path.getsize(photos / "PinkGorilla_1_boxed.png") > 0
@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+import detection_server  # noqa: E402
+from detection_server import DetectionServer, MicroBatcher, ServerStats  # noqa: E402
+from test_detection_cache import StubModel  # noqa: E402
+
+
+class BatchModel(StubModel):
+    """The detection cache stub, recording the size of every batch it is given."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def predict(self, source, **kwargs):
+        self.batches.append(len(source))
+        return list(super().predict(source, stream=False, **kwargs))
+
+
+class Writer:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def encoded(value):
+    return cv2.imencode(".png", np.full((32, 24, 3), value, dtype=np.uint8))[1].tobytes()
+
+
+def serve(coroutine, max_batch=8, max_latency=0.05, max_queue=16, start_worker=True):
+    """Run coroutine(server, model) against a stub-model server, then stop the batch worker."""
+    async def main():
+        model, stats = BatchModel(), ServerStats()
+        batcher = MicroBatcher(model, 640, 0.25, max_batch, max_latency, max_queue, stats)
+        worker = asyncio.create_task(batcher.run()) if start_worker else None
+        try:
+            return await coroutine(DetectionServer(batcher, stats), model)
+        finally:
+            if worker is not None:
+                worker.cancel()
+            batcher.model_executor.shutdown()
+
+    return asyncio.run(main())
+
+
+def test_burst_shares_one_batch():
+    async def burst(server, model):
+        responses = await asyncio.gather(*(server.detect(encoded(v)) for v in (10, 50, 90)))
+        return responses, model.batches
+
+    responses, batches = serve(burst)
+    assert batches == [3]
+    assert [status for status, _ in responses] == [200, 200, 200]
+    # Each request gets its own image's detections back
+    sides = [payload["detections"][0]["box"][2] - 5 for _, payload in responses]
+    assert sides == pytest.approx([20, 60, 100], abs=0.1)
+
+
+def test_lone_request_is_released_after_max_latency():
+    async def lone(server, model):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        status, _ = await server.detect(encoded(10))
+        return status, loop.time() - start, model.batches
+
+    status, elapsed, batches = serve(lone, max_latency=0.05)
+    assert status == 200
+    assert batches == [1]
+    assert 0.05 <= elapsed < 1.0
+
+
+def test_full_queue_gets_503():
+    async def overflow(server, model):
+        # No worker drains the queue, so the first request holds its only slot
+        queued = asyncio.create_task(server.detect(encoded(10)))
+        await asyncio.sleep(0.05)
+        response = await server.detect(encoded(20))
+        queued.cancel()
+        return response, server.stats.rejected
+
+    (status, payload), rejected = serve(overflow, max_queue=1, start_worker=False)
+    assert status == 503
+    assert "busy" in payload["error"]
+    assert rejected == 1
+
+
+@pytest.mark.parametrize("request_bytes, status", [
+    (b"garbage\r\n\r\n", 400),
+    (b"POST /detect HTTP/1.1\r\nContent-Length: many\r\n\r\n", 400),
+    (b"POST /detect HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (detection_server.MAX_BODY_BYTES + 1), 413),
+    (b"POST /detect HTTP/1.1\r\nContent-Length: 9\r\n\r\nnot a png", 400),
+])
+def test_malformed_request_is_rejected(request_bytes, status):
+    async def send(server, model):
+        reader = asyncio.StreamReader()
+        reader.feed_data(request_bytes)
+        reader.feed_eof()
+        writer = Writer()
+        await server.handle(reader, writer)
+        return writer.data, model.batches
+
+    response, batches = serve(send)
+    head, _, body = response.partition(b"\r\n\r\n")
+    assert head.split(b" ", 2)[1] == str(status).encode()
+    assert "error" in json.loads(body)
+    assert batches == []
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import encoders
+
+
+def sample_image():
+    # Smooth gradients, which JPEG keeps close at quality 92
+    y, x = np.mgrid[0:48, 0:64]
+    return Image.fromarray(np.stack([x * 4, y * 5, (x + y) * 2], axis=-1).astype(np.uint8))
+
+
+@pytest.mark.parametrize("name", sorted(encoders.ENCODERS))
+def test_encoder_round_trip(tmp_path, name):
+    if name == "cv2":
+        pytest.importorskip("cv2")
+    image = sample_image()
+    path = str(tmp_path / ("image" + encoders.encoder_extension(name)))
+    encoders.encode_image(image, path, name)
+
+    if name == "npy":
+        decoded = np.load(path)
+        assert decoded.dtype == np.uint8
+        assert np.array_equal(decoded, np.asarray(image))
+        return
+    with Image.open(path) as f:
+        assert f.format == "JPEG"
+        decoded = np.asarray(f.convert("RGB"), dtype=np.int16)
+    assert decoded.shape == (48, 64, 3)
+    # Channels come back in RGB order, within JPEG's loss
+    assert np.abs(decoded - np.asarray(image, dtype=np.int16)).mean() < 2
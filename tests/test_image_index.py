@@ -0,0 +1,35 @@
+import os
+
+from PIL import Image
+
+import image_index
+from image_index import ImageIndex
+
+
+def test_file_rewritten_in_place_is_reparsed(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    path = images / "a.png"
+    Image.new("RGB", (100, 50)).save(path)
+    assert ImageIndex(str(tmp_path / "index.sqlite")).dimensions(str(path)) == (100, 50)
+
+    # Same name, new content; the directory's mtime stays as it was
+    dir_stat = os.stat(images)
+    Image.new("RGB", (300, 200)).save(path)
+    os.utime(images, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+
+    # A new process (new ImageIndex) sees the new header
+    assert ImageIndex(str(tmp_path / "index.sqlite")).dimensions(str(path)) == (300, 200)
+
+
+def test_use_index_redirects_the_shared_index(tmp_path, monkeypatch):
+    # Recorded by monkeypatch, so the value use_index() writes is undone at teardown
+    monkeypatch.setenv(image_index.INDEX_ENV, str(tmp_path / "shared.sqlite"))
+    monkeypatch.setattr(image_index, "_index", None)
+    Image.new("RGB", (8, 8)).save(tmp_path / "a.png")
+
+    image_index.use_index(str(tmp_path / "private.sqlite"))
+    assert image_index.get_image_index().images(str(tmp_path)) == ["a.png"]
+    assert os.environ[image_index.INDEX_ENV] == str(tmp_path / "private.sqlite")
+    assert (tmp_path / "private.sqlite").exists()
+    monkeypatch.setattr(image_index, "_index", None)
@@ -0,0 +1,62 @@
+import json
+import sys
+
+import pytest
+from PIL import Image
+
+import create_real
+import label_convert
+from image_index import ImageIndex
+
+LABELS = "0 0.500000 0.400000 0.200000 0.300000\n1 0.125000 0.875000 0.250000 0.250000\n"
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    # A private index, so the test never touches training_data/build
+    index = ImageIndex(str(tmp_path / "index.sqlite"))
+    monkeypatch.setattr(label_convert, "get_image_index", lambda: index)
+    yolo = tmp_path / "yolo"
+    yolo.mkdir()
+    Image.new("RGB", (200, 100)).save(yolo / "wide.png")
+    Image.new("RGB", (120, 160)).save(yolo / "tall.jpg")
+    for stem in ("wide", "tall"):
+        (yolo / f"{stem}.txt").write_text(LABELS)
+    classes = tmp_path / "classes.txt"
+    classes.write_text("game\nother\n")
+    return tmp_path, yolo, classes
+
+
+def parse(text):
+    return [float(v) for line in text.splitlines() for v in line.split()]
+
+
+def test_yolo_labelme_round_trip(dataset):
+    tmp_path, yolo, classes = dataset
+    labelme, back = tmp_path / "labelme", tmp_path / "back"
+    assert label_convert.convert_yolo_dir(str(yolo), str(labelme), str(classes), workers=1) == 2
+
+    wide = json.loads((labelme / "wide.json").read_text())
+    assert (wide["imageWidth"], wide["imageHeight"]) == (200, 100)
+    assert wide["shapes"][0]["label"] == "game"
+    assert sum(wide["shapes"][0]["points"], []) == pytest.approx([80, 25, 120, 55])
+
+    assert label_convert.convert_labelme_dir(str(labelme), str(back), str(classes), workers=1) == 2
+    for stem in ("wide", "tall"):
+        assert parse((back / f"{stem}.txt").read_text()) == pytest.approx(parse(LABELS), abs=1e-6)
+    assert not list(back.glob("*.tmp"))
+
+    # Existing labels are only replaced on request
+    with pytest.raises(FileExistsError):
+        label_convert.convert_labelme_dir(str(labelme), str(back), str(classes), workers=1)
+    assert label_convert.convert_labelme_dir(str(labelme), str(back), str(classes), workers=1, overwrite=True) == 2
+
+
+def test_create_real_keeps_its_yolo_to_labelme_interface(dataset, monkeypatch):
+    tmp_path, yolo, classes = dataset
+    labelme = tmp_path / "labelme"
+    monkeypatch.setattr(sys, "argv", ["create_real.py", "--yolo", str(yolo), "--labelme", str(labelme),
+                                      "--classes", str(classes), "--workers", "1"])
+    create_real.main()
+    assert sorted(p.name for p in labelme.glob("*.json")) == ["tall.json", "wide.json"]
+    assert (yolo / "wide.txt").read_text() == LABELS
@@ -0,0 +1,32 @@
+import numpy as np
+
+from placement import PlacementGrid
+
+
+def test_clamped_window_is_checked():
+    # 125 px wide with 10 px cells: the last column is a partial cell, so the
+    # only free window (columns 11-12) is pulled back onto the covered column 10
+    grid = PlacementGrid(125, 100, max_iou=0.0, cell_size=10)
+    grid.place(0, 0, 110, 100)
+    np.random.seed(0)
+    assert grid.find_position(20, 100) is None
+
+
+def test_positions_stay_free_when_free_space_exists():
+    np.random.seed(0)
+    grid = PlacementGrid(1003, 601, max_iou=0.0, cell_size=16)
+    placed = 0
+    for _ in range(200):
+        pos = grid.find_position(97, 131)
+        if pos is None:
+            continue
+        x, y = pos
+        assert 0 <= x <= 1003 - 97 and 0 <= y <= 601 - 131
+        if len(grid.rects):
+            rects = grid.rects
+            overlap_w = np.minimum(x + 97, rects[:, 2]) - np.maximum(x, rects[:, 0])
+            overlap_h = np.minimum(y + 131, rects[:, 3]) - np.maximum(y, rects[:, 1])
+            assert not np.any((overlap_w > 0) & (overlap_h > 0))
+        grid.place(x, y, 97, 131)
+        placed += 1
+    assert placed > 10
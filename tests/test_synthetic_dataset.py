@@ -0,0 +1,47 @@
+import random
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+pytest.importorskip("ultralytics")
+pytest.importorskip("cv2")
+import synthetic_dataset  # noqa: E402
+
+
+def make_dataset(num_samples, max_buffer_length):
+    # Skip YOLODataset.__init__, which wants a trainer config; only the buffer logic is under test
+    dataset = object.__new__(synthetic_dataset.SyntheticYOLODataset)
+    dataset.im_files = [f"synthetic_stream_{i:06d}.jpg" for i in range(num_samples)]
+    dataset.recent = OrderedDict()
+    dataset.buffer = []
+    dataset.max_buffer_length = max_buffer_length
+    dataset.renders = 0
+
+    def render(index):
+        dataset.renders += 1
+        return np.zeros((8, 8, 3), dtype=np.uint8), (8, 8), np.zeros((0, 5), dtype=np.float32)
+
+    def mosaic(label):
+        # Three partners from the buffer, as ultralytics' Mosaic does
+        for partner in random.choices(dataset.buffer, k=3):
+            dataset.get_image_and_label(partner)
+        return label
+
+    dataset.render = render
+    dataset.update_labels_info = lambda label: label
+    dataset.transforms = mosaic
+    return dataset
+
+
+def test_buffer_tracks_recent_renders():
+    random.seed(0)
+    dataset = make_dataset(num_samples=200, max_buffer_length=16)
+    for _ in range(5):
+        for index in random.sample(range(200), 200):
+            dataset[index]
+            assert len(dataset.buffer) <= dataset.max_buffer_length
+            assert sorted(dataset.buffer) == sorted(dataset.recent)
+
+    # Partners come from the buffer, so every one reuses a render
+    assert dataset.renders == 5 * 200
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from tiling import cut_at_seam, merge_boxes, tiles_for
+
+WIDTH, HEIGHT = 1000, 640
+
+
+def merge(detections, method):
+    """Run merge_boxes over (tile, xyxy box, score) detections the way predict_tiled() does."""
+    tiles = tiles_for(WIDTH, HEIGHT, tile=640, overlap=0.4)
+    boxes = np.array([box for _, box, _ in detections], dtype=float)
+    sources = np.array([tile for tile, _, _ in detections])
+    cut = np.array([cut_at_seam(boxes[i:i + 1], tiles[tile], WIDTH, HEIGHT)[0] for i, tile in enumerate(sources)])
+    scores = np.array([score for _, _, score in detections])
+    return merge_boxes(boxes, scores, np.zeros(len(boxes), dtype=int), method, 0.5, sources, cut)[0]
+
+
+def test_tiles():
+    assert tiles_for(WIDTH, HEIGHT, tile=640, overlap=0.4) == [(0, 0, 640, 640), (360, 0, 1000, 640)]
+
+
+@pytest.mark.parametrize("method", ["nms", "wbf"])
+def test_cover_cut_at_seam_is_merged(method):
+    # Tile 0 sees the left part of a cover that crosses its right edge (x=640); tile 1 sees all of it
+    merged = merge([(0, (560, 100, 640, 300), 0.9), (1, (560, 100, 760, 300), 0.8)], method)
+    assert len(merged) == 1
+    np.testing.assert_allclose(merged[0], (560, 100, 760, 300))
+
+
+def test_cut_cover_keeps_best_score():
+    tiles = tiles_for(WIDTH, HEIGHT, tile=640, overlap=0.4)
+    boxes = np.array([(560, 100, 640, 300), (560, 100, 760, 300)], dtype=float)
+    cut = np.concatenate([cut_at_seam(boxes[:1], tiles[0], WIDTH, HEIGHT),
+                          cut_at_seam(boxes[1:], tiles[1], WIDTH, HEIGHT)])
+    _, scores, _ = merge_boxes(boxes, np.array([0.9, 0.8]), np.zeros(2, dtype=int), "nms", 0.5, np.array([0, 1]), cut)
+    np.testing.assert_allclose(scores, [0.9])
+
+
+@pytest.mark.parametrize("method", ["nms", "wbf"])
+def test_nested_and_adjacent_covers_stay_separate(method):
+    detections = [
+        (0, (100, 100, 400, 500), 0.9),   # large cover
+        (0, (120, 120, 200, 220), 0.8),   # small cover inside it, same tile
+        (1, (420, 100, 560, 300), 0.85),  # neighbour touching the next one
+        (0, (550, 100, 630, 300), 0.7),   # adjacent cover, whole in tile 0
+    ]
+    merged = merge(detections, method)
+    assert len(merged) == 4
+    np.testing.assert_allclose(sorted(map(tuple, merged)), sorted(box for _, box, _ in detections))
+
+
+def test_small_cover_inside_cut_fragment_stays_separate():
+    # A large cover cut at tile 0's seam, and a small whole cover inside it seen by tile 1
+    merged = merge([(0, (500, 100, 640, 500), 0.9), (1, (560, 150, 620, 250), 0.8)], "nms")
+    assert len(merged) == 2
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+import watch_folder
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Polling only, so the tests behave the same with or without inotify_simple
+    monkeypatch.setattr(watch_folder, "INotify", None)
+    return Clock()
+
+
+def make_watcher(directory, checkpoint, clock):
+    return watch_folder.FolderWatcher(str(directory), r"PinkGorilla_\d+\.jpg$", checkpoint_path=str(checkpoint),
+                                      debounce=1.0, exclude=r"_boxed\.", clock=clock)
+
+
+def test_files_wait_for_the_debounce(tmp_path, clock):
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    watcher = make_watcher(photos, tmp_path / "checkpoint.json", clock)
+    (photos / "PinkGorilla_1.jpg").write_bytes(b"part")
+    (photos / "PinkGorilla_1_boxed.jpg").write_bytes(b"output")
+    (photos / "notes.txt").write_bytes(b"ignored")
+    assert watcher.ready() == []
+
+    # Still being written: the new size restarts the debounce
+    clock.now += 0.8
+    (photos / "PinkGorilla_1.jpg").write_bytes(b"partial upload")
+    clock.now += 0.8
+    assert watcher.ready() == []
+
+    clock.now += 1.0
+    assert watcher.ready() == ["PinkGorilla_1.jpg"]
+
+
+def test_restart_resumes_from_checkpoint(tmp_path, clock):
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    checkpoint = tmp_path / "state" / "checkpoint.json"
+    for n in (1, 2):
+        (photos / f"PinkGorilla_{n}.jpg").write_bytes(b"x" * n)
+
+    watcher = make_watcher(photos, checkpoint, clock)
+    watcher.ready()
+    clock.now += 2
+    assert watcher.ready() == ["PinkGorilla_1.jpg", "PinkGorilla_2.jpg"]
+    watcher.mark_processed(["PinkGorilla_1.jpg"])
+    assert not any(name.endswith(".json") for name in os.listdir(photos))
+
+    # A new watcher skips what was processed and picks up modified files again
+    (photos / "PinkGorilla_3.jpg").write_bytes(b"new")
+    restarted = make_watcher(photos, checkpoint, clock)
+    restarted.ready()
+    clock.now += 2
+    assert restarted.ready() == ["PinkGorilla_2.jpg", "PinkGorilla_3.jpg"]
+
+    (photos / "PinkGorilla_1.jpg").write_bytes(b"edited")
+    restarted.ready()
+    clock.now += 2
+    assert restarted.ready() == ["PinkGorilla_1.jpg", "PinkGorilla_2.jpg", "PinkGorilla_3.jpg"]
+
+
+def test_default_checkpoint_is_outside_the_folder(tmp_path):
+    path = watch_folder.default_checkpoint_path(str(tmp_path / "photos"))
+    assert path.startswith(watch_folder.CHECKPOINT_DIR + os.sep)
+    assert path != watch_folder.default_checkpoint_path(str(tmp_path / "other" / "photos"))
@@ -0,0 +1,155 @@
+"""
+Sliced inference for high-resolution photos.
+
+An image is cut into overlapping square tiles, and all of its tiles (plus a
+downscaled view of the whole image, for covers larger than a tile) go to the
+model as one batch. Tile boxes are shifted back into image coordinates and
+merged across tile borders. The cost per image is bounded by the tile grid:
+tiles_for() gives the count up front. Tiles with almost no texture (plain
+walls, sky, floor) can be skipped before inference.
+
+Two merge modes:
+- "nms" keeps the most confident box of each cluster.
+- "wbf" (weighted box fusion) averages each cluster's coordinates by
+  confidence.
+In both modes, boxes cut at a seam are left out of the merged coordinates
+when the cluster also holds a whole view of the cover.
+
+Boxes are clustered by IoU. A pair from different tiles whose smaller box
+ends at a seam of its tile (a tile edge inside the image) is clustered by
+intersection over the smaller box instead, so a cover cut in half at a tile
+edge is matched with the whole cover seen by the next tile, while a small
+cover nested in or next to a larger one stays separate.
+"""
+
+import os
+import sys
+import math
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "training_data"))
+from placement import box_ios, box_iou  # noqa: E402
+
+SEAM_MARGIN = 2  # px; a box side this close to an inner tile edge counts as cut there
+
+
+def tiles_for(width, height, tile=640, overlap=0.2):
+    """(x0, y0, x1, y1) tiles covering the image; edge tiles are shifted inwards to stay tile-sized."""
+    def starts(length):
+        if length <= tile:
+            return [0]
+        stride = max(1, int(tile * (1 - overlap)))
+        count = math.ceil((length - tile) / stride) + 1
+        return [min(i * stride, length - tile) for i in range(count)]
+
+    return [(x, y, min(x + tile, width), min(y + tile, height)) for y in starts(height) for x in starts(width)]
+
+
+def tile_texture(image, tile):
+    """Standard deviation of the tile's grey levels, computed on a cheap subsample."""
+    import cv2
+
+    x0, y0, x1, y1 = tile
+    crop = image[y0:y1:4, x0:x1:4]
+    return float(cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY).std())
+
+
+def cut_at_seam(boxes, tile, width, height, margin=SEAM_MARGIN):
+    """Which image-coordinate boxes of one tile end at an edge of the tile that lies inside the image."""
+    x0, y0, x1, y1 = tile
+    return (((boxes[:, 0] <= x0 + margin) & (x0 > 0))
+            | ((boxes[:, 1] <= y0 + margin) & (y0 > 0))
+            | ((boxes[:, 2] >= x1 - margin) & (x1 < width))
+            | ((boxes[:, 3] >= y1 - margin) & (y1 < height)))
+
+
+def merge_boxes(boxes, scores, classes, method="nms", threshold=0.5, sources=None, cut=None):
+    """
+    Merge overlapping same-class boxes; returns (boxes, scores, classes) arrays.
+
+    Boxes are visited by descending score and clustered with every remaining
+    box whose overlap with the cluster's best box exceeds threshold. The
+    overlap is IoU, except IoS for a pair from different sources (tiles)
+    whose smaller box is cut at a seam; sources and cut are per-box arrays,
+    and without them every pair uses IoU. A cluster joined through a seam
+    pair takes its box from the members that are not cut (the best one, or
+    their weighted average) and keeps the cluster's highest score.
+    """
+    if sources is None or cut is None:
+        sources, cut = np.zeros(len(boxes), dtype=int), np.zeros(len(boxes), dtype=bool)
+    order = np.argsort(-scores)
+    boxes, scores, classes = boxes[order], scores[order], classes[order]
+    sources, cut = sources[order], cut[order]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    alive = np.ones(len(boxes), dtype=bool)
+    out_boxes, out_scores, out_classes = [], [], []
+    for i in range(len(boxes)):
+        if not alive[i]:
+            continue
+        members = alive & (classes == classes[i])
+        others = np.flatnonzero(members)
+        smaller_cut = np.where(areas[others] < areas[i], cut[others], cut[i])
+        seam_pair = (sources[others] != sources[i]) & smaller_cut
+        overlap = np.where(seam_pair, box_ios(boxes[i], boxes[others]), box_iou(boxes[i], boxes[others]))
+        matched = overlap > threshold
+        members[others] = matched
+        members[i] = True
+        alive &= ~members
+        # A fragment cut at a seam must not shape the merged box when a whole view of the cover exists
+        keep = members
+        if seam_pair[matched].any() and (members & ~cut).any():
+            keep = members & ~cut
+        if method == "wbf":
+            weights = scores[keep]
+            out_boxes.append((boxes[keep] * weights[:, None]).sum(axis=0) / weights.sum())
+        else:
+            out_boxes.append(boxes[np.flatnonzero(keep)[0]])
+        out_scores.append(scores[i])
+        out_classes.append(classes[i])
+    if not out_boxes:
+        return np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int)
+    return np.array(out_boxes), np.array(out_scores), np.array(out_classes, dtype=int)
+
+
+def predict_tiled(model, image, tile=640, overlap=0.2, imgsz=640, conf=0.25,
+                  merge="nms", merge_threshold=0.5, min_texture=0.0, full_image=True):
+    """
+    Detect on overlapping tiles of a BGR image in one batch; returns result_detections()-style dicts.
+
+    Tiles whose texture is below min_texture are skipped. With full_image, the
+    whole image is added to the batch so covers larger than a tile are found.
+    """
+    height, width = image.shape[:2]
+    tiles = [t for t in tiles_for(width, height, tile, overlap)
+             if min_texture <= 0 or tile_texture(image, t) >= min_texture]
+    if full_image and (width > tile or height > tile):
+        tiles.append((0, 0, width, height))
+    if not tiles:
+        return []
+
+    crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+    results = model.predict(source=crops, imgsz=imgsz, conf=conf, verbose=False)
+
+    boxes, scores, classes, sources, cut = [], [], [], [], []
+    for index, (tile_box, result) in enumerate(zip(tiles, results)):
+        b = result.boxes
+        if len(b) == 0:
+            continue
+        x0, y0 = tile_box[:2]
+        tile_boxes = b.xyxy.cpu().numpy() + [x0, y0, x0, y0]
+        boxes.append(tile_boxes)
+        scores.append(b.conf.cpu().numpy())
+        classes.append(b.cls.cpu().numpy().astype(int))
+        sources.append(np.full(len(tile_boxes), index))
+        cut.append(cut_at_seam(tile_boxes, tile_box, width, height))
+    if not boxes:
+        return []
+
+    boxes, scores, classes = merge_boxes(np.concatenate(boxes), np.concatenate(scores), np.concatenate(classes),
+                                         merge, merge_threshold, np.concatenate(sources), np.concatenate(cut))
+    return [
+        {"label": model.names[int(cls)], "class": int(cls), "conf": round(float(score), 4),
+         "box": [round(float(v), 1) for v in box]}
+        for box, score, cls in zip(boxes, scores, classes)
+    ]
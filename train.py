@@ -1,8 +1,29 @@
+import argparse
+
 from ultralytics import YOLO
- 
+
+parser = argparse.ArgumentParser(description='Train the game cover detector')
+parser.add_argument('--stream-samples', type=int, default=0,
+                    help='Render this many fresh synthetic training images per epoch instead of reading the on-disk train split')
+parser.add_argument('--stream-positive-fraction', type=float, default=0.5,
+                    help='Share of streamed images that contain game covers')
+parser.add_argument('--compiled', nargs='?', const='training_data/build/compiled', default=None,
+                    help='Read train/val from the letterboxed arrays written by training_data/compile_dataset.py')
+args = parser.parse_args()
+if args.compiled and args.stream_samples:
+    parser.error('--compiled and --stream-samples both replace the training data; pick one')
+
 # Load the model.
 model = YOLO('yolov8n.pt')
- 
+
+trainer = None
+if args.stream_samples:
+    from synthetic_dataset import make_synthetic_trainer
+    trainer = make_synthetic_trainer(args.stream_samples, args.stream_positive_fraction)
+elif args.compiled:
+    from compiled_dataset import make_compiled_trainer
+    trainer = make_compiled_trainer(args.compiled)
+
 # Training.
 results = model.train(
    data='games_v8.yaml',
@@ -11,5 +32,6 @@ results = model.train(
    batch=8,
    name='yolov8n_custom',
    device="cuda",
-   patience=50
-   )
\ No newline at end of file
+   patience=50,
+   trainer=trainer
+   )
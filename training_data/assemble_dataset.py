@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Assemble the YOLO train/val dataset used by train.py.
+
+Synthetic samples are split by a hash of their file stem, so each sample
+keeps its split when the dataset grows or is rebuilt. The real_assets
+YOLODataset produced by labelme2yolo keeps its own train/val split. Files are
+hardlinked (or reflinked, or copied as a last resort) from a thread pool, and
+the dataset YAML pointing at the result is written at the end.
+"""
+
+import os
+import errno
+import fcntl
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from image_index import get_image_index
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+FICLONE = 0x40049409  # Linux ioctl: share extents with another file (btrfs, xfs, ...)
+SPLITS = ("train", "val")
+
+
+def split_for(stem, train_fraction, salt=""):
+    """Deterministically assign a sample to "train" or "val" from its name."""
+    digest = hashlib.blake2b(f"{salt}{stem}".encode(), digest_size=8).digest()
+    return "train" if int.from_bytes(digest, "big") / 2**64 < train_fraction else "val"
+
+
+def link_or_copy(src, dst):
+    """Hardlink src to dst, falling back to a reflink and then a plain copy."""
+    try:
+        os.link(src, dst)
+        return
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+    try:
+        with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+            fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+        return
+    except OSError:
+        pass
+    shutil.copy2(src, dst)
+
+
+def synthetic_pairs(synthetic_dir):
+    """(image, label) paths for every generated image that has a label."""
+    return [
+        (image, label)
+        for image, label in get_image_index().pairs(synthetic_dir)
+        if label is not None and image.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def real_pairs(real_dir, split):
+    """(image, label) paths of one labelme2yolo split; the label may be missing."""
+    image_dir = os.path.join(real_dir, "images", split)
+    label_dir = os.path.join(real_dir, "labels", split)
+    if not os.path.isdir(image_dir):
+        return []
+    pairs = []
+    for name in sorted(os.listdir(image_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() in IMAGE_EXTENSIONS:
+            pairs.append((os.path.join(image_dir, name), os.path.join(label_dir, stem + ".txt")))
+    return pairs
+
+
+def write_dataset_yaml(yaml_path, out_dir, class_names):
+    """Write the ultralytics dataset YAML for the assembled split."""
+    base = os.path.dirname(os.path.abspath(yaml_path))
+    lines = ["path: ./"]
+    for split in SPLITS:
+        lines.append(f"{split}: '{os.path.relpath(os.path.join(out_dir, split), base)}'")
+    lines += ["", "# class names", "names: "]
+    lines += [f"  {i}: '{name}'" for i, name in enumerate(class_names)]
+    with open(yaml_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def assemble(synthetic_dir, real_dir, out_dir, train_fraction=0.75, salt="", workers=None):
+    """Build out_dir/{train,val}/{images,labels}; returns per-split sample counts."""
+    shutil.rmtree(out_dir, ignore_errors=True)
+    for split in SPLITS:
+        for kind in ("images", "labels"):
+            os.makedirs(os.path.join(out_dir, split, kind), exist_ok=True)
+
+    jobs = []
+    counts = {split: 0 for split in SPLITS}
+
+    def add(pair, split):
+        image, label = pair
+        jobs.append((image, os.path.join(out_dir, split, "images", os.path.basename(image))))
+        if os.path.exists(label):
+            jobs.append((label, os.path.join(out_dir, split, "labels", os.path.basename(label))))
+        counts[split] += 1
+
+    if synthetic_dir and os.path.isdir(synthetic_dir):
+        for pair in synthetic_pairs(synthetic_dir):
+            add(pair, split_for(os.path.splitext(os.path.basename(pair[0]))[0], train_fraction, salt))
+    if real_dir:
+        for split in SPLITS:
+            for pair in real_pairs(real_dir, split):
+                add(pair, split)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # list() re-raises the first failure
+        list(executor.map(lambda job: link_or_copy(*job), jobs))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assemble the YOLO train/val dataset')
+    parser.add_argument('--synthetic', default='build/output', help='Directory with generated images and labels')
+    parser.add_argument('--real', default='real_assets/YOLODataset', help='labelme2yolo output for the real photos')
+    parser.add_argument('--out', default='build/yolo_val_output', help='Output dataset directory')
+    parser.add_argument('--train-fraction', type=float, default=0.75, help='Share of synthetic samples used for training')
+    parser.add_argument('--salt', default='', help='Changes the synthetic split without renaming files')
+    parser.add_argument('--classes', default='classes.txt', help='Path to classes file')
+    parser.add_argument('--yaml', default='../games_v8.yaml', help='Dataset YAML to write')
+    parser.add_argument('--workers', type=int, default=None, help='Link/copy threads')
+
+    args = parser.parse_args()
+
+    counts = assemble(args.synthetic, args.real, args.out, args.train_fraction, args.salt, args.workers)
+    with open(args.classes) as f:
+        class_names = [line.strip() for line in f if line.strip()]
+    write_dataset_yaml(args.yaml, args.out, class_names)
+
+    print(f"Train: {counts['train']} images, Val: {counts['val']} images")
+    print(f"Dataset YAML written to {args.yaml}")
+
+
+if __name__ == "__main__":
+    main()
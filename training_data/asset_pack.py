@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Asset pack builder and reader for the synthetic generator.
+
+Every cover and background is decoded once, shrunk to a maximum working size
+and stored as raw RGBA pixels in a single file. A JSON sidecar holds the
+offset index and each file's original size. Generator workers memory-map the
+pack, so picking a cover is a slice of shared pages instead of a directory
+scan plus a full JPEG decode.
+
+The pack ends with a random build token that the index repeats, so a pack
+and an index from different builds are never used together. Each group is
+checked against its source folder on first use; a folder that changed since
+the build is read from disk until the pack is rebuilt.
+"""
+
+import os
+import json
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from dedup_assets import get_duplicates
+from image_index import get_image_index
+
+ASSET_PACK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "asset_pack.bin")
+PACK_VERSION = 3
+TOKEN_BYTES = 16
+COVER_MAX_SIZE = 512
+BACKGROUND_MAX_SIZE = 2048
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def index_path_for(pack_path):
+    """Return the path of the JSON index that sits next to a pack file."""
+    return pack_path + ".json"
+
+
+def group_name(directory):
+    """Key used for a source directory inside the pack."""
+    return os.path.basename(os.path.normpath(directory))
+
+
+def list_source_files(directory):
+    """Sorted image file names in a source directory, minus duplicates marked by dedup_assets.py."""
+    duplicates = get_duplicates(directory)
+    return [name for name in get_image_index().images(directory, IMAGE_EXTENSIONS) if name not in duplicates]
+
+
+def source_fingerprint(directory):
+    """Name, size and mtime of every source image, used to detect a stale pack."""
+    fingerprint = []
+    for name in list_source_files(directory):
+        st = os.stat(os.path.join(directory, name))
+        fingerprint.append([name, st.st_size, st.st_mtime_ns])
+    return fingerprint
+
+
+def _load_resized(args):
+    """Decode one source image and shrink it to fit within max_size; returns its original size too."""
+    path, max_size = args
+    try:
+        with Image.open(path) as img:
+            source_size = img.size
+            # Let the JPEG decoder drop resolution while decoding (DCT scaling)
+            img.draft("RGB", (max_size, max_size))
+            img = img.convert("RGBA")
+        if max(img.size) > max_size:
+            img.thumbnail((max_size, max_size), Image.BILINEAR)
+        return img.width, img.height, source_size, img.tobytes()
+    except Exception as e:
+        print(f"Warning: skipping {path}: {e}")
+        return None
+
+
+def build_asset_pack(groups, pack_path=ASSET_PACK_PATH, workers=None):
+    """
+    Build a pack from a mapping of source directory -> max working size.
+
+    The pixel data is written to pack_path and the index to pack_path + ".json".
+    """
+    os.makedirs(os.path.dirname(pack_path) or ".", exist_ok=True)
+    index = {"version": PACK_VERSION, "groups": {}}
+
+    tmp_path = pack_path + ".tmp"
+    token = os.urandom(TOKEN_BYTES // 2).hex()
+    offset = 0
+    with open(tmp_path, "wb") as f, ProcessPoolExecutor(max_workers=workers) as executor:
+        for directory, max_size in groups.items():
+            names = list_source_files(directory)
+            jobs = [(os.path.join(directory, n), max_size) for n in names]
+            entries = []
+            # map() keeps source order, so the pack layout is deterministic
+            for name, decoded in zip(names, executor.map(_load_resized, jobs, chunksize=16)):
+                if decoded is None:
+                    continue
+                width, height, (source_width, source_height), data = decoded
+                f.write(data)
+                entries.append({"name": name, "offset": offset, "width": width, "height": height,
+                                "source_width": source_width, "source_height": source_height})
+                offset += len(data)
+
+            index["groups"][group_name(directory)] = {
+                "max_size": max_size,
+                "sources": source_fingerprint(directory),
+                "entries": entries,
+            }
+            print(f"Packed {len(entries)} images from {directory} (max {max_size}px)")
+        f.write(token.encode("ascii"))
+    index["token"] = token
+
+    # Index first, then pack: after a crash in between, the old pack's token
+    # no longer matches and the pair is treated as stale
+    index_path = index_path_for(pack_path)
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(tmp_path, pack_path)
+
+    print(f"Asset pack written to {pack_path} ({offset / 1e6:.1f} MB)")
+    return index
+
+
+def read_token(pack_path):
+    """Build token stored at the end of a pack file."""
+    with open(pack_path, "rb") as f:
+        f.seek(-min(TOKEN_BYTES, os.path.getsize(pack_path)), os.SEEK_END)
+        return f.read().decode("ascii", "replace")
+
+
+def pack_is_stale(groups, pack_path=ASSET_PACK_PATH):
+    """True if the pack is missing, not from the index's build, or any source directory changed since."""
+    index_path = index_path_for(pack_path)
+    if not (os.path.exists(pack_path) and os.path.exists(index_path)):
+        return True
+
+    with open(index_path) as f:
+        index = json.load(f)
+    if index.get("version") != PACK_VERSION or index.get("token") != read_token(pack_path):
+        return True
+
+    for directory, max_size in groups.items():
+        group = index["groups"].get(group_name(directory))
+        if group is None or group["max_size"] != max_size:
+            return True
+        if group["sources"] != source_fingerprint(directory):
+            return True
+    return False
+
+
+class AssetPack:
+    """Read-only, memory-mapped view of an asset pack."""
+
+    def __init__(self, pack_path=ASSET_PACK_PATH):
+        with open(index_path_for(pack_path)) as f:
+            index = json.load(f)
+        if index.get("version") != PACK_VERSION:
+            raise ValueError(f"{pack_path} was built by another version of asset_pack.py; rebuild it")
+        if index["token"] != read_token(pack_path):
+            raise ValueError(f"{pack_path} and its index are from different builds; rebuild it")
+        self.groups = index["groups"]
+        self.data = np.memmap(pack_path, dtype=np.uint8, mode="r")
+        self._by_name = {
+            group: {e["name"]: e for e in info["entries"]}
+            for group, info in self.groups.items()
+        }
+        self._fresh = {}
+
+    def has_group(self, directory):
+        """True if the directory is stored and its source files are unchanged since the build."""
+        group = group_name(directory)
+        if group not in self.groups:
+            return False
+        if group not in self._fresh:
+            self._fresh[group] = self.groups[group]["sources"] == source_fingerprint(directory)
+            if not self._fresh[group]:
+                print(f"Warning: {directory} changed since the asset pack was built; "
+                      f"reading it from disk until asset_pack.py is rerun")
+        return self._fresh[group]
+
+    def names(self, directory):
+        """Image names stored for a source directory, in source order."""
+        return [e["name"] for e in self.groups[group_name(directory)]["entries"]]
+
+    def _image_for(self, entry):
+        size = entry["width"] * entry["height"] * 4
+        buf = self.data[entry["offset"]:entry["offset"] + size]
+        # frombuffer shares memory with the map; PIL copies only on first write
+        return Image.frombuffer("RGBA", (entry["width"], entry["height"]), buf, "raw", "RGBA", 0, 1)
+
+    def get_image(self, directory, name):
+        """Return a stored image as an RGBA PIL image."""
+        return self._image_for(self._by_name[group_name(directory)][name])
+
+    def source_size(self, directory, name):
+        """(width, height) of the source file a stored image was decoded from."""
+        entry = self._by_name[group_name(directory)][name]
+        return entry["source_width"], entry["source_height"]
+
+    def random_image(self, directory):
+        """Pick a random image from a stored directory, or None if it is empty."""
+        entries = self.groups[group_name(directory)]["entries"]
+        if not entries:
+            return None
+        return self._image_for(random.choice(entries))
+
+
+_open_pack = None
+
+
+def get_asset_pack(pack_path=ASSET_PACK_PATH):
+    """Open the pack once per process; returns None when no usable pack has been built."""
+    global _open_pack
+    if _open_pack is None:
+        _open_pack = False
+        if os.path.exists(pack_path) and os.path.exists(index_path_for(pack_path)):
+            try:
+                _open_pack = AssetPack(pack_path)
+            except ValueError as e:
+                print(f"Warning: not using the asset pack: {e}")
+    return _open_pack or None
+
+
+def default_groups(cover_max_size=COVER_MAX_SIZE, background_max_size=BACKGROUND_MAX_SIZE):
+    """Source directories used by create_synth.py and their max working sizes."""
+    from create_synth import BACKGROUND_DIR, COVER_DIRS_NEG, COVER_DIRS_POS
+
+    groups = {d: cover_max_size for d in COVER_DIRS_NEG + COVER_DIRS_POS}
+    groups[BACKGROUND_DIR] = background_max_size
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the pre-decoded asset pack used by create_synth.py')
+    parser.add_argument('--out', default=ASSET_PACK_PATH, help='Path of the pack file to write')
+    parser.add_argument('--cover-max-size', type=int, default=COVER_MAX_SIZE, help='Longest side of stored covers')
+    parser.add_argument('--background-max-size', type=int, default=BACKGROUND_MAX_SIZE, help='Longest side of stored backgrounds')
+    parser.add_argument('--workers', type=int, default=None, help='Decode processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if the pack is up to date')
+
+    args = parser.parse_args()
+
+    groups = default_groups(args.cover_max_size, args.background_max_size)
+    if not args.force and not pack_is_stale(groups, args.out):
+        print(f"Asset pack {args.out} is up to date")
+        return
+
+    build_asset_pack(groups, args.out, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
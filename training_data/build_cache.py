@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Content-addressed stage cache for the data pipeline.
+
+Each pipeline stage is keyed by a hash of its input files, its parameters and
+the keys of the stages it depends on. convert_synth.sh --incremental asks
+"check" before running a stage and "record"s the key once the stage
+succeeds, so a stage only reruns when something it reads has changed.
+
+File hashes are cached by (size, mtime), so repeated checks over large asset
+folders only stat the files.
+"""
+
+import os
+import sys
+import glob
+import json
+import hashlib
+import argparse
+
+MANIFEST_PATH = "build/.build_manifest.json"
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Load the manifest, or an empty one if none has been written yet."""
+    if not os.path.exists(path):
+        return {"stages": {}, "files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Write the manifest atomically."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def expand_inputs(inputs):
+    """Expand globs and directories into a sorted list of files."""
+    files = set()
+    for pattern in inputs:
+        for match in glob.glob(pattern) or [pattern]:
+            if os.path.isdir(match):
+                for root, _, names in os.walk(match):
+                    files.update(os.path.join(root, n) for n in names)
+            elif os.path.exists(match):
+                files.add(match)
+    return sorted(files)
+
+
+def file_digest(path, file_cache):
+    """SHA-256 of a file, reused from file_cache while its size and mtime match."""
+    st = os.stat(path)
+    cached = file_cache.get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    file_cache[path] = [st.st_size, st.st_mtime_ns, digest]
+    return digest
+
+
+def stage_key(manifest, inputs, params="", after=()):
+    """Hash of a stage's input files, parameters and upstream stage keys."""
+    h = hashlib.sha256()
+    h.update(params.encode())
+    for stage in after:
+        h.update(f"\0after:{stage}:{manifest['stages'].get(stage, {}).get('key', '')}".encode())
+    for path in expand_inputs(inputs):
+        h.update(f"\0{path}:{file_digest(path, manifest['files'])}".encode())
+    return h.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental build cache for the data pipeline')
+    parser.add_argument('action', choices=['check', 'record', 'forget'],
+                        help='check: exit 0 if the stage is up to date, 1 if it must run; '
+                             'record: store the stage key after a successful run; '
+                             'forget: mark the stage as stale')
+    parser.add_argument('stage', help='Stage name')
+    parser.add_argument('--inputs', nargs='*', default=[], help='Input files, directories or globs')
+    parser.add_argument('--params', default='', help='Parameters that change the stage output')
+    parser.add_argument('--after', nargs='*', default=[], help='Upstream stages whose output this stage reads')
+    parser.add_argument('--manifest', default=MANIFEST_PATH, help='Path to the build manifest')
+
+    args = parser.parse_args()
+    manifest = load_manifest(args.manifest)
+
+    if args.action == 'forget':
+        manifest["stages"].pop(args.stage, None)
+        save_manifest(manifest, args.manifest)
+        return 0
+
+    key = stage_key(manifest, args.inputs, args.params, args.after)
+
+    if args.action == 'record':
+        manifest["stages"][args.stage] = {"key": key}
+        save_manifest(manifest, args.manifest)
+        return 0
+
+    # Persist freshly hashed files so the next check only needs stat()
+    save_manifest(manifest, args.manifest)
+    if manifest["stages"].get(args.stage, {}).get("key") == key:
+        print(f"Stage '{args.stage}' is up to date")
+        return 0
+    print(f"Stage '{args.stage}' is out of date")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
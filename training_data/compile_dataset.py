@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Compile the assembled YOLO dataset into memory-mappable arrays for training.
+
+Every train and val image is decoded once, letterboxed to imgsz x imgsz
+(scaled to fit, centred on grey 114 padding, as ultralytics does) and written
+into one uint8 .npy array per split. Labels are rewritten into the
+letterboxed image's normalized coordinates and packed into one float32
+(M, 5) array, with an offsets array giving each image's slice of it:
+
+    out/<split>/images.npy   (N, imgsz, imgsz, 3) uint8, BGR
+    out/<split>/labels.npy   (M, 5) float32, class cx cy w h
+    out/<split>/offsets.npy  (N + 1,) int64, labels of image i are offsets[i]:offsets[i + 1]
+    out/<split>/shapes.npy   (N, 2) int32, original (height, width)
+    out/<split>/meta.json    imgsz, file names and a source fingerprint
+
+compiled_dataset.py (repo root) serves these to train.py --compiled through
+np.load(mmap_mode="r"), so dataloader workers share the page cache instead of
+decoding and resizing JPEGs every epoch. Workers write straight into the
+output map, so nothing but labels travels back to this process.
+"""
+
+import os
+import json
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from image_index import get_image_index
+
+COMPILED_VERSION = 1
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+SPLITS = ("train", "val")
+PAD_VALUE = 114
+
+
+def letterbox_geometry(width, height, imgsz):
+    """(scale, new width, new height, left pad, top pad) fitting an image into imgsz x imgsz."""
+    r = imgsz / max(width, height)
+    new_w, new_h = min(imgsz, max(1, round(width * r))), min(imgsz, max(1, round(height * r)))
+    return r, new_w, new_h, (imgsz - new_w) // 2, (imgsz - new_h) // 2
+
+
+def letterbox_labels(labels, width, height, imgsz):
+    """Map (n, 5) normalized labels of a width x height image into the letterboxed square."""
+    _, new_w, new_h, left, top = letterbox_geometry(width, height, imgsz)
+    out = labels.copy()
+    out[:, 1] = (labels[:, 1] * new_w + left) / imgsz
+    out[:, 2] = (labels[:, 2] * new_h + top) / imgsz
+    out[:, 3] = labels[:, 3] * new_w / imgsz
+    out[:, 4] = labels[:, 4] * new_h / imgsz
+    return out
+
+
+def read_labels(label_path):
+    """(n, 5) float32 YOLO labels; empty when the file is missing or has no boxes."""
+    if not os.path.exists(label_path):
+        return np.zeros((0, 5), dtype=np.float32)
+    with open(label_path) as f:
+        rows = [line.split()[:5] for line in f if len(line.split()) >= 5]
+    return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+
+def split_samples(dataset_dir, split):
+    """(image path, label path) of every image in one split of an assembled dataset."""
+    image_dir = os.path.join(dataset_dir, split, "images")
+    label_dir = os.path.join(dataset_dir, split, "labels")
+    if not os.path.isdir(image_dir):
+        return []
+    return [
+        (os.path.join(image_dir, name), os.path.join(label_dir, os.path.splitext(name)[0] + ".txt"))
+        for name in get_image_index().images(image_dir, IMAGE_EXTENSIONS)
+    ]
+
+
+def source_fingerprint(samples):
+    """Name, size and mtime of every image and label, used to detect a stale compile."""
+    fingerprint = []
+    for image_path, label_path in samples:
+        for path in (image_path, label_path):
+            if os.path.exists(path):
+                st = os.stat(path)
+                fingerprint.append([os.path.basename(path), st.st_size, st.st_mtime_ns])
+    return fingerprint
+
+
+# Output map opened once per worker by _init_worker()
+_worker_state = {}
+
+
+def _init_worker(images_path):
+    _worker_state["images"] = np.load(images_path, mmap_mode="r+")
+
+
+def _compile_one(job):
+    """Letterbox one image into its slot of the map; returns (index, (h, w), labels) or an error string."""
+    index, image_path, label_path = job
+    images = _worker_state["images"]
+    imgsz = images.shape[1]
+    try:
+        with Image.open(image_path) as img:
+            width, height = img.size
+            # Let the JPEG decoder drop resolution while decoding (DCT scaling)
+            img.draft("RGB", (imgsz, imgsz))
+            img = img.convert("RGB")
+        labels = read_labels(label_path)
+        _, new_w, new_h, left, top = letterbox_geometry(width, height, imgsz)
+        resized = np.asarray(img.resize((new_w, new_h), Image.BILINEAR, reducing_gap=2.0))
+        slot = images[index]
+        slot[:] = PAD_VALUE
+        slot[top:top + new_h, left:left + new_w] = resized[..., ::-1]  # ultralytics works in BGR
+        return index, (height, width), letterbox_labels(labels, width, height, imgsz)
+    except Exception as e:
+        return index, None, f"{image_path}: {type(e).__name__}: {e}"
+
+
+def compile_split(samples, out_dir, imgsz, workers=None):
+    """Write one split's arrays to out_dir; returns the number of images compiled."""
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    images_path = os.path.join(tmp_dir, "images.npy")
+    images = np.lib.format.open_memmap(images_path, mode="w+", dtype=np.uint8,
+                                       shape=(len(samples), imgsz, imgsz, 3))
+    del images  # workers reopen it; the header is already written
+
+    labels = [None] * len(samples)
+    shapes = np.zeros((len(samples), 2), dtype=np.int32)
+    jobs = [(i, image_path, label_path) for i, (image_path, label_path) in enumerate(samples)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(images_path,)) as executor:
+        for index, shape, result in executor.map(_compile_one, jobs, chunksize=16):
+            if shape is None:
+                raise RuntimeError(f"could not compile {result}")
+            shapes[index] = shape
+            labels[index] = result
+
+    counts = [len(l) for l in labels]
+    offsets = np.zeros(len(samples) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    packed = np.concatenate(labels) if labels else np.zeros((0, 5), dtype=np.float32)
+    np.save(os.path.join(tmp_dir, "labels.npy"), packed.astype(np.float32))
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_dir, "shapes.npy"), shapes)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({"version": COMPILED_VERSION, "imgsz": imgsz,
+                   "files": [os.path.basename(image_path) for image_path, _ in samples],
+                   "sources": source_fingerprint(samples)}, f)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return len(samples)
+
+
+def split_is_stale(samples, out_dir, imgsz):
+    """True if the compiled split is missing, was built at another size or its sources changed."""
+    meta_path = os.path.join(out_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return True
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return (meta.get("version") != COMPILED_VERSION or meta.get("imgsz") != imgsz
+            or meta.get("sources") != source_fingerprint(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile the YOLO dataset into letterboxed memory-mapped arrays')
+    parser.add_argument('--dataset', default='build/yolo_val_output', help='Assembled dataset (train/ and val/)')
+    parser.add_argument('--out', default='build/compiled', help='Output directory')
+    parser.add_argument('--imgsz', type=int, default=640, help='Training image size to letterbox to')
+    parser.add_argument('--workers', type=int, default=None, help='Decode processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Recompile even if the output is up to date')
+
+    args = parser.parse_args()
+
+    for split in SPLITS:
+        samples = split_samples(args.dataset, split)
+        out_dir = os.path.join(args.out, split)
+        if not args.force and not split_is_stale(samples, out_dir, args.imgsz):
+            print(f"{out_dir} is up to date")
+            continue
+        count = compile_split(samples, out_dir, args.imgsz, args.workers)
+        size = os.path.getsize(os.path.join(out_dir, "images.npy"))
+        print(f"Compiled {count} {split} images into {out_dir} ({size / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
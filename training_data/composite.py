@@ -0,0 +1,65 @@
+"""
+Cover compositing for the synthetic generator.
+
+A drop shadow is built from the cover's alpha channel alone: the alpha is
+blurred as a single L channel and filled with a darkened mean cover colour,
+instead of blurring a darkened RGBA copy of the cover. Cover, shadow and
+overall opacity are folded into one RGBA layer, which is blended once into
+the RGB background with a masked paste, all in PIL's C code. The paste clips
+the layer to the background, so a cover near the edge keeps its position and
+its label stays aligned.
+"""
+
+import math
+
+from PIL import Image, ImageFilter
+
+SHADOW_DARKNESS = 0.3  # shadow colour relative to the cover
+
+
+def _scale_lut(factor):
+    """Lookup table multiplying an 8-bit channel by factor."""
+    return [min(255, int(v * factor + 0.5)) for v in range(256)]
+
+
+def shadow_tint(cover):
+    """Darkened, alpha-weighted mean colour of an RGBA cover."""
+    # RGBA resampling weights colours by alpha, so a 1x1 box resize is the weighted mean
+    r, g, b, _ = cover.resize((1, 1), Image.BOX).getpixel((0, 0))
+    return tuple(int(c * SHADOW_DARKNESS + 0.5) for c in (r, g, b))
+
+
+def composite_cover(canvas, cover, pos, opacity=1.0, shadow=None):
+    """
+    Blend an RGBA cover into an RGB canvas image in place, with its top-left at pos.
+
+    shadow is None or (offset, blur_radius, shadow_opacity); the shadow is
+    drawn at pos + offset underneath the cover.
+    """
+    x, y = pos
+    if shadow is None:
+        layer, origin = cover, pos
+    else:
+        (dx, dy), blur_radius, shadow_opacity = shadow
+        margin = int(math.ceil(3 * blur_radius))
+        origin = (x + min(0, dx) - margin, y + min(0, dy) - margin)
+        size = (cover.width + abs(dx) + 2 * margin, cover.height + abs(dy) + 2 * margin)
+        cover_pos = (x - origin[0], y - origin[1])
+
+        # Blur only the alpha channel, shifted by the shadow offset
+        mask = Image.new("L", size, 0)
+        mask.paste(cover.getchannel("A"), (cover_pos[0] + dx, cover_pos[1] + dy))
+        if blur_radius > 0:
+            mask = mask.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+        mask = mask.point(_scale_lut(shadow_opacity))
+
+        layer = Image.new("RGB", size, shadow_tint(cover))
+        layer.putalpha(mask)
+        layer.alpha_composite(cover, cover_pos)
+
+    if opacity < 1.0:
+        if layer is cover:
+            layer = cover.copy()
+        layer.putalpha(layer.getchannel("A").point(_scale_lut(opacity)))
+
+    canvas.paste(layer, origin, layer)
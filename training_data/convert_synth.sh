@@ -6,122 +6,195 @@ BLUE='\033[0;34m'
 YELLOW='\033[1;33m'
 NC='\033[0m' # No Color
 
+# Usage: ./convert_synth.sh [--incremental]
+#   --incremental  keep build/ and rerun only the stages whose inputs changed
+#                  (asset files, generator code, parameters, seed, LabelMe JSONs);
+#                  inside the synth stage only the samples whose own inputs
+#                  changed are regenerated (see create_synth.py --incremental)
+# Set PIPELINE_TRACE=<dir> to record per-stage spans of every script and worker
+# (plus PIPELINE_PROFILE=1 for flame graph samples); a summary is printed at the end
+INCREMENTAL=0
+if [ "$1" == "--incremental" ]; then
+    INCREMENTAL=1
+fi
+
+# Generator parameters; an incremental build needs a fixed seed to be reproducible
+NUM_POSITIVE=${NUM_POSITIVE:-50}
+NUM_NEGATIVE=${NUM_NEGATIVE:-50}
+if [ -z "$SEED" ] && [ $INCREMENTAL -eq 1 ]; then
+    SEED=0
+fi
+SYNTH_ARGS=""
+if [ -n "$SEED" ]; then
+    SYNTH_ARGS="--seed $SEED"
+fi
+# TARGET_SIZE=640 composites at the training resolution instead of native;
+# ENCODER picks the JPEG backend (pil-optimize, pil or cv2)
+ENCODER=${ENCODER:-pil-optimize}
+if [ "$ENCODER" == "npy" ]; then
+    # labelme2yolo, labelme and ultralytics only read image files, so the split would come out empty
+    echo -e "${RED}Error: ENCODER=npy output cannot go through this pipeline; use pil-optimize, pil or cv2${NC}"
+    exit 1
+fi
+if [ -n "$TARGET_SIZE" ]; then
+    SYNTH_ARGS="$SYNTH_ARGS --target-size $TARGET_SIZE"
+fi
+SYNTH_PARAMS="positive=$NUM_POSITIVE negative=$NUM_NEGATIVE seed=$SEED target=$TARGET_SIZE encoder=$ENCODER"
+SYNTH_INPUTS="synthetic_assets create_synth.py augment.py placement.py composite.py encoders.py asset_pack.py image_index.py build/asset_dedup.json"
+
+# Returns success when a stage has to run: always in a full build, and in an
+# incremental build only when build_cache.py reports its inputs changed
+stage_needed() {
+    if [ $INCREMENTAL -eq 0 ]; then
+        # A full build overwrites outputs a later incremental build may trust
+        python3 build_cache.py forget "$1"
+        return 0
+    fi
+    ! python3 build_cache.py check "$@"
+}
+
+# Stores the stage key after it ran successfully (incremental builds only)
+stage_done() {
+    if [ $INCREMENTAL -eq 1 ]; then
+        python3 build_cache.py record "$@"
+    fi
+}
+
 
 ## PHASE 1: SYNTHETIC DATA GENERATION
 
 echo -e "${BLUE}Starting synthetic data generation pipeline...${NC}"
-# Clean output folders before running
-echo -e "${YELLOW}Cleaning output directories...${NC}"
-rm -rf build/output/*
-rm -rf build/labelme_output/*
-rm -rf build/yolo_output
-rm -rf build/yolo_val_output
-
-# Ensure directories exist
-mkdir -p build/output
-mkdir -p build/labelme_output
-mkdir -p build/yolo_output/images
-mkdir -p build/yolo_output/labels
-
-echo -e "${GREEN}Output directories cleaned and prepared${NC}"
-
-# Generate synthetic data
-echo -e "${BLUE}Generating synthetic training data...${NC}"
-python3 create_synth.py
-
-# Check if generation was successful
+
+# Mark near-duplicate assets so the pack and the generator sample each cover once
+echo -e "${BLUE}Deduplicating assets...${NC}"
+python3 dedup_assets.py
+
 if [ $? -ne 0 ]; then
-    echo -e "${RED}Error: Synthetic data generation failed!${NC}"
+    echo -e "${RED}Error: Asset deduplication failed!${NC}"
     exit 1
 fi
 
-# Count generated files
-image_count=$(find build/output -name "*.jpg" -o -name "*.jpeg" -o -name "*.png" | wc -l)
-label_count=$(find build/output -name "*.txt" | wc -l)
+# Build (or refresh) the pre-decoded asset pack shared by the generator workers
+echo -e "${BLUE}Checking asset pack...${NC}"
+python3 asset_pack.py
 
-echo -e "${GREEN}Generated $image_count images and $label_count annotation files${NC}"
+if [ $? -ne 0 ]; then
+    echo -e "${RED}Error: Asset pack build failed!${NC}"
+    exit 1
+fi
 
-# Copy Images to labelme to look at
-echo -e "${BLUE}Copying files to labelme output...${NC}"
-cp build/output/*.jpg build/labelme_output/ 2>/dev/null
-cp build/output/*.jpeg build/labelme_output/ 2>/dev/null
-cp build/output/*.png build/labelme_output/ 2>/dev/null
+if stage_needed synth --inputs $SYNTH_INPUTS --params "$SYNTH_PARAMS"; then
+    # Clean output folders before running; an incremental build keeps the
+    # generated samples and lets create_synth.py drop only the stale ones
+    echo -e "${YELLOW}Cleaning output directories...${NC}"
+    if [ $INCREMENTAL -eq 1 ]; then
+        SYNTH_ARGS="$SYNTH_ARGS --incremental"
+    else
+        rm -rf build/output/*
+    fi
+    rm -rf build/labelme_output/*
+    rm -rf build/yolo_output
 
-# Convert YOLO annotations to LabelMe format
-echo -e "${BLUE}Converting YOLO annotations to LabelMe format...${NC}"
-python3 auto_yolo_to_labelme.py --yolo build/output --labelme build/labelme_output --classes classes.txt
+    # Ensure directories exist
+    mkdir -p build/output
+    mkdir -p build/labelme_output
+    mkdir -p build/yolo_output/images
+    mkdir -p build/yolo_output/labels
 
-if [ $? -ne 0 ]; then
-    echo -e "${RED}Warning: YOLO to LabelMe conversion had issues${NC}"
+    echo -e "${GREEN}Output directories cleaned and prepared${NC}"
+
+    # Generate synthetic data
+    echo -e "${BLUE}Generating synthetic training data...${NC}"
+    python3 create_synth.py --num-positive $NUM_POSITIVE --num-negative $NUM_NEGATIVE $SYNTH_ARGS --encoder $ENCODER
+
+    # Check if generation was successful
+    if [ $? -ne 0 ]; then
+        echo -e "${RED}Error: Synthetic data generation failed!${NC}"
+        exit 1
+    fi
+
+    # Count generated files
+    image_count=$(find build/output -name "*.jpg" -o -name "*.jpeg" -o -name "*.png" | wc -l)
+    label_count=$(find build/output -name "*.txt" | wc -l)
+
+    echo -e "${GREEN}Generated $image_count images and $label_count annotation files${NC}"
+
+    # Copy files to YOLO output structure
+    echo -e "${BLUE}Setting up YOLO output structure...${NC}"
+    cp build/output/*.jpg build/yolo_output/images/ 2>/dev/null
+    cp build/output/*.jpeg build/yolo_output/images/ 2>/dev/null
+    cp build/output/*.png build/yolo_output/images/ 2>/dev/null
+    cp build/output/*.txt build/yolo_output/labels/ 2>/dev/null
+
+    stage_done synth --inputs $SYNTH_INPUTS --params "$SYNTH_PARAMS"
 fi
 
-# Copy files to YOLO output structure
-echo -e "${BLUE}Setting up YOLO output structure...${NC}"
-cp build/output/*.jpg build/yolo_output/images/ 2>/dev/null
-cp build/output/*.jpeg build/yolo_output/images/ 2>/dev/null
-cp build/output/*.png build/yolo_output/images/ 2>/dev/null
-cp build/output/*.txt build/yolo_output/labels/ 2>/dev/null
-
-## PHASE 2: Train/Validation Split of YOLO Data
-
-# Create train/validation split (75%/25%)
-echo -e "${BLUE}Creating train/validation split (75%/25%)...${NC}"
-rm -rf build/yolo_val_output
-mkdir -p build/yolo_val_output/train/images
-mkdir -p build/yolo_val_output/train/labels
-mkdir -p build/yolo_val_output/val/images
-mkdir -p build/yolo_val_output/val/labels
-
-# Get list of all image files (without extensions) for consistent splitting
-image_files=($(find build/yolo_output/images -name "*.jpg" -o -name "*.jpeg" -o -name "*.png" | xargs -n1 basename | sed 's/\.[^.]*$//' | sort | uniq))
-total_files=${#image_files[@]}
-train_count=$((total_files * 75 / 100))
-
-echo -e "${YELLOW}Total files: $total_files, Train: $train_count, Val: $((total_files - train_count))${NC}"
-
-# Shuffle the array for random split
-shuffled_files=($(printf '%s\n' "${image_files[@]}" | shuf))
-
-# Split files
-for i in "${!shuffled_files[@]}"; do
-    base_name="${shuffled_files[$i]}"
-    
-    if [ $i -lt $train_count ]; then
-        # Training set
-        dest_dir="build/yolo_val_output/train"
+if stage_needed labelme --inputs auto_yolo_to_labelme.py label_convert.py classes.txt --after synth; then
+    # Copy Images to labelme to look at
+    echo -e "${BLUE}Copying files to labelme output...${NC}"
+    mkdir -p build/labelme_output
+    cp build/output/*.jpg build/labelme_output/ 2>/dev/null
+    cp build/output/*.jpeg build/labelme_output/ 2>/dev/null
+    cp build/output/*.png build/labelme_output/ 2>/dev/null
+
+    # Convert YOLO annotations to LabelMe format
+    echo -e "${BLUE}Converting YOLO annotations to LabelMe format...${NC}"
+    python3 auto_yolo_to_labelme.py --yolo build/output --labelme build/labelme_output --classes classes.txt
+
+    if [ $? -ne 0 ]; then
+        echo -e "${RED}Warning: YOLO to LabelMe conversion had issues${NC}"
     else
-        # Validation set
-        dest_dir="build/yolo_val_output/val"
+        stage_done labelme --inputs auto_yolo_to_labelme.py label_convert.py classes.txt --after synth
     fi
-    
-    # Copy image files (handle multiple extensions)
-    cp build/yolo_output/images/${base_name}.jpg "$dest_dir/images/" 2>/dev/null
-    cp build/yolo_output/images/${base_name}.jpeg "$dest_dir/images/" 2>/dev/null
-    cp build/yolo_output/images/${base_name}.png "$dest_dir/images/" 2>/dev/null
-
-    # Copy corresponding label file
-    cp build/yolo_output/labels/${base_name}.txt "$dest_dir/labels/" 2>/dev/null
-done
+fi
 
 
 # PHASE 2: Real Data mixin using labelme2yolo
 
-echo -e "Using labelme2yolo to create files"
+if stage_needed real --inputs 'real_assets/*.json' 'real_assets/*.png' 'real_assets/*.jpg' 'real_assets/*.jpeg'; then
+    echo -e "Using labelme2yolo to create files"
+
+    # Generate YOLO Data Dir
+    rm -rf real_assets/YOLODataset
+    labelme2yolo --json_dir real_assets/ --val_size 0.25
+
+    if [ $? -ne 0 ]; then
+        echo -e "${RED}Warning: labelme2yolo had issues${NC}"
+    else
+        stage_done real --inputs 'real_assets/*.json' 'real_assets/*.png' 'real_assets/*.jpg' 'real_assets/*.jpeg'
+    fi
+fi
 
-# Generate YOLO Data Dir
-labelme2yolo --json_dir real_assets/ --val_size 0.25
 
-# Training set
-cp real_assets/YOLODataset/images/train/*.jpg  "build/yolo_val_output/train/images/"
-cp real_assets/YOLODataset/images/train/*.jpeg "build/yolo_val_output/train/images/" 
-cp real_assets/YOLODataset/images/train/*.png  "build/yolo_val_output/train/images/"
-cp real_assets/YOLODataset/labels/train/*.txt  "build/yolo_val_output/train/labels/" 
+## PHASE 3: Train/Validation Split of YOLO Data
 
-# Validation set
-cp real_assets/YOLODataset/images/train/*.jpg  "build/yolo_val_output/val/images/" 
-cp real_assets/YOLODataset/images/train/*.jpeg "build/yolo_val_output/val/images/" 
-cp real_assets/YOLODataset/images/train/*.png  "build/yolo_val_output/val/images/" 
-cp real_assets/YOLODataset/labels/val/*.txt  "build/yolo_val_output/val/labels/"
+if stage_needed split --inputs real_assets/YOLODataset assemble_dataset.py --after synth real; then
+    # Synthetic samples are split 75%/25% by a hash of their name, so each one
+    # keeps its split across rebuilds; real photos keep labelme2yolo's split
+    echo -e "${BLUE}Assembling train/validation split (75%/25%)...${NC}"
+    python3 assemble_dataset.py --synthetic build/output --real real_assets/YOLODataset \
+        --out build/yolo_val_output --train-fraction 0.75 --yaml ../games_v8.yaml
+
+    if [ $? -ne 0 ]; then
+        echo -e "${RED}Error: Dataset assembly failed!${NC}"
+        exit 1
+    fi
+
+    stage_done split --inputs real_assets/YOLODataset assemble_dataset.py --after synth real
+fi
+
+# Letterbox train and val into memory-mapped arrays for train.py --compiled
+if stage_needed compile --inputs compile_dataset.py --params "imgsz=${IMGSZ:-640}" --after split; then
+    echo -e "${BLUE}Compiling dataset arrays...${NC}"
+    python3 compile_dataset.py --dataset build/yolo_val_output --out build/compiled --imgsz ${IMGSZ:-640}
+
+    if [ $? -ne 0 ]; then
+        echo -e "${RED}Error: Dataset compile failed!${NC}"
+        exit 1
+    fi
+
+    stage_done compile --inputs compile_dataset.py --params "imgsz=${IMGSZ:-640}" --after split
+fi
 
 # Final count verification
 yolo_images=$(find build/yolo_output/images -name "*.jpg" -o -name "*.jpeg" -o -name "*.png" | wc -l)
@@ -138,4 +211,8 @@ echo -e "${GREEN}YOLO format: $yolo_images images, $yolo_labels labels${NC}"
 echo -e "${GREEN}LabelMe format: $labelme_files files${NC}"
 echo -e "${GREEN}Training set: $train_images images, $train_labels labels${NC}"
 echo -e "${GREEN}Validation set: $val_images images, $val_labels labels${NC}"
-echo -e "${BLUE}Files are ready for training and review${NC}"
\ No newline at end of file
+echo -e "${BLUE}Files are ready for training and review${NC}"
+
+if [ -n "$PIPELINE_TRACE" ]; then
+    python3 tracing.py "$PIPELINE_TRACE"
+fi
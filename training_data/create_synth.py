@@ -1,13 +1,20 @@
 import os
 import random
 import math
-from PIL import Image, ImageFilter, ImageEnhance, ImageOps
+from PIL import Image, ImageFilter
 import numpy as np
+from asset_pack import get_asset_pack, list_source_files
+from augment import enhance
+from composite import composite_cover
+from encoders import DEFAULT_ENCODER, ENCODERS, encoder_extension, encode_image
+from placement import PlacementGrid
+from tracing import span
 
-# Input directories
-BACKGROUND_DIR = "synthetic_assets/backgrounds"
-COVER_DIRS_NEG = ["synthetic_assets/game_covers_NES_neg", "synthetic_assets/game_covers_SNES_neg"]
-COVER_DIRS_POS = ["synthetic_assets/game_covers_MISC_pos", "synthetic_assets/game_covers_EBAY_pos"]
+# Input directories (anchored here so training can import this module from the repo root)
+ASSET_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "synthetic_assets")
+BACKGROUND_DIR = os.path.join(ASSET_ROOT, "backgrounds")
+COVER_DIRS_NEG = [os.path.join(ASSET_ROOT, "game_covers_NES_neg"), os.path.join(ASSET_ROOT, "game_covers_SNES_neg")]
+COVER_DIRS_POS = [os.path.join(ASSET_ROOT, "game_covers_MISC_pos"), os.path.join(ASSET_ROOT, "game_covers_EBAY_pos")]
 OUTPUT_DIR = "build/output"
 DIVISION_SIZE = 5
 
@@ -24,143 +31,221 @@ NOISE_INTENSITY = (10, 30)
 SHADOW_PROBABILITY = 0.4
 OVERLAY_OPACITY_RANGE = (0.7, 1.0)
 
-# Ensure output directory exists
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Placement parameters
+PLACEMENT_MAX_IOU = 0.3
+PLACEMENT_MIN_VISIBILITY = 0.6
+DENSE_SCENE_PROBABILITY = 0.1  # share of positive images rendered as crowded shelves
+DENSE_COVER_RANGE = (20, 36)
+
+def list_images(path):
+    """List image names in an asset folder, served from the asset pack when one is built."""
+    pack = get_asset_pack()
+    if pack is not None and pack.has_group(path):
+        return pack.names(path)
+    return list_source_files(path)
+
+# Asset files read while a sample renders, when _generate_single_image() is recording them
+_used_assets = None
+
+def load_image(path, name):
+    """Load a named image from an asset folder as RGBA."""
+    if _used_assets is not None:
+        _used_assets.add(os.path.join(path, name))
+    with span("load_image"):
+        pack = get_asset_pack()
+        if pack is not None and pack.has_group(path):
+            return pack.get_image(path, name)
+        return Image.open(os.path.join(path, name)).convert("RGBA")
+
+def source_size(path, name, img):
+    """Size of the named asset file; the pack may store img shrunk."""
+    pack = get_asset_pack()
+    if pack is not None and pack.has_group(path):
+        return pack.source_size(path, name)
+    return img.size
 
 def get_random_image(path):
     """Pick a random JPEG image from a folder."""
-    files = [f for f in os.listdir(path) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
-    if not files:
-        return None
-    img_path = os.path.join(path, random.choice(files))
-    return Image.open(img_path).convert("RGBA")
+    with span("get_random_image"):
+        # The same single choice over the same names, from the pack or from disk
+        files = list_images(path)
+        if not files:
+            return None
+        return load_image(path, random.choice(files))
 
 def add_noise(img, intensity):
     """Add random noise to an image."""
-    img_array = np.array(img)
-    noise = np.random.randint(-intensity, intensity + 1, img_array.shape, dtype=np.int16)
-    noisy_array = np.clip(img_array.astype(np.int16) + noise, 0, 255).astype(np.uint8)
-    return Image.fromarray(noisy_array, mode=img.mode)
-
-def create_shadow(img, offset=(5, 5), blur_radius=3, opacity=0.3):
-    """Create a drop shadow effect."""
-    # Create shadow by duplicating image and making it darker
-    shadow = img.copy()
-    shadow = ImageEnhance.Brightness(shadow).enhance(0.3)  # Make darker
-    
-    # Create a new image with extra space for shadow
-    shadow_img = Image.new('RGBA', 
-                          (img.width + abs(offset[0]), img.height + abs(offset[1])), 
-                          (0, 0, 0, 0))
-    
-    # Paste shadow with offset
-    shadow_pos = (max(0, offset[0]), max(0, offset[1]))
-    shadow_img.paste(shadow, shadow_pos)
-    
-    # Blur the shadow
-    if blur_radius > 0:
-        shadow_img = shadow_img.filter(ImageFilter.GaussianBlur(radius=blur_radius))
-    
-    # Adjust shadow opacity
-    if shadow_img.mode == 'RGBA':
-        r, g, b, a = shadow_img.split()
-        a = ImageEnhance.Brightness(a).enhance(opacity)
-        shadow_img = Image.merge('RGBA', (r, g, b, a))
-    
-    # Paste original image on top
-    img_pos = (max(0, -offset[0]), max(0, -offset[1]))
-    shadow_img.paste(img, img_pos, img if img.mode == 'RGBA' else None)
-    
-    return shadow_img
+    return enhance(img, noise=intensity)
 
-def apply_perspective_transform(img, intensity=0.1):
-    """Apply a subtle perspective transformation."""
-    width, height = img.size
-    
+def perspective_matrix(width, height, intensity=0.1):
+    """Random subtle keystone homography (source -> output) for a width x height image."""
     # Generate random perspective distortion
     distortion = random.uniform(-intensity, intensity)
     
-    # Define perspective transformation coefficients
-    # This creates a subtle keystone effect
-    coeffs = [
-        1 + distortion * random.uniform(-0.5, 0.5), distortion * random.uniform(-0.5, 0.5), 0,
-        distortion * random.uniform(-0.5, 0.5), 1 + distortion * random.uniform(-0.5, 0.5), 0,
-        distortion * random.uniform(-1, 1) / width, distortion * random.uniform(-1, 1) / height
-    ]
-    
-    return img.transform(img.size, Image.PERSPECTIVE, coeffs, Image.BILINEAR)
+    # The coefficients map output to source pixels, as PIL's PERSPECTIVE
+    # transform expects; the forward homography is their inverse
+    coeffs = np.array([
+        [1 + distortion * random.uniform(-0.5, 0.5), distortion * random.uniform(-0.5, 0.5), 0],
+        [distortion * random.uniform(-0.5, 0.5), 1 + distortion * random.uniform(-0.5, 0.5), 0],
+        [distortion * random.uniform(-1, 1) / width, distortion * random.uniform(-1, 1) / height, 1],
+    ])
+    return np.linalg.inv(coeffs)
 
-def augment_cover_image(cover_img):
-    """Apply random augmentations to a cover image."""
-    # Start with the original
-    augmented = cover_img.copy()
-    
-    # Random rotation
-    if random.random() > 0.3:  # 70% chance of rotation
-        angle = random.uniform(*ROTATION_RANGE)
-        augmented = augmented.rotate(angle, expand=True, fillcolor=(0, 0, 0, 0))
+def project_points(matrix, points):
+    """Apply a 3x3 homography to an (N, 2) array of points."""
+    homogeneous = np.hstack([points, np.ones((len(points), 1))]) @ matrix.T
+    return homogeneous[:, :2] / homogeneous[:, 2:]
+
+def sample_cover_transform(cover_size, target_size):
+    """
+    Draw the geometric augmentation for a cover as one homography.
+
+    Rotation and perspective are composed about the cover, then a scale and
+    translation fit the projected corners into a target_size box at the
+    origin. Returns the matrix, the output size and the projected corners.
+    """
+    c_w, c_h = cover_size
+    matrix = np.eye(3)
     
     # Perspective transformation
     if random.random() > 0.6:  # 40% chance of perspective
-        augmented = apply_perspective_transform(augmented, intensity=0.05)
+        matrix = perspective_matrix(c_w, c_h, intensity=0.05) @ matrix
     
-    # Color adjustments
-    if random.random() > 0.2:  # 80% chance of brightness adjustment
-        brightness_factor = random.uniform(*BRIGHTNESS_RANGE)
-        augmented = ImageEnhance.Brightness(augmented).enhance(brightness_factor)
+    # Random rotation about the cover centre
+    if random.random() > 0.3:  # 70% chance of rotation
+        angle = math.radians(random.uniform(*ROTATION_RANGE))
+        cos, sin = math.cos(angle), math.sin(angle)
+        centre_x, centre_y = c_w / 2, c_h / 2
+        rotation = np.array([
+            [cos, sin, centre_x - cos * centre_x - sin * centre_y],
+            [-sin, cos, centre_y + sin * centre_x - cos * centre_y],
+            [0, 0, 1],
+        ])
+        matrix = rotation @ matrix
     
-    if random.random() > 0.3:  # 70% chance of contrast adjustment
-        contrast_factor = random.uniform(*CONTRAST_RANGE)
-        augmented = ImageEnhance.Contrast(augmented).enhance(contrast_factor)
+    corners = project_points(matrix, np.array([[0, 0], [c_w, 0], [c_w, c_h], [0, c_h]], dtype=np.float64))
+    low = corners.min(axis=0)
+    extent = corners.max(axis=0) - low
+    
+    # Scale proportionally so the longer side of the warped cover is target_size
+    scale = target_size / max(extent)
+    fit = np.array([[scale, 0, -low[0] * scale], [0, scale, -low[1] * scale], [0, 0, 1]])
+    matrix = fit @ matrix
+    corners = (corners - low) * scale
+    out_size = (max(1, math.ceil(extent[0] * scale)), max(1, math.ceil(extent[1] * scale)))
+    return matrix, out_size, corners
+
+def warp_cover(cover_img, matrix, out_size):
+    """Resample a cover through a homography straight into its final size."""
+    # Bilinear sampling aliases on strong minification, so first drop whole
+    # factors with a cheap box reduce and fold that into the matrix
+    linear_scale = math.sqrt(abs(np.linalg.det(matrix[:2, :2])))
+    factor = max(1, int(1 / linear_scale)) if linear_scale > 0 else 1
+    if factor > 1:
+        cover_img = cover_img.reduce(factor)
+        matrix = matrix @ np.diag([factor, factor, 1.0])
     
+    # PIL wants output -> source coefficients; it already samples at output
+    # pixel centres, so the inverse goes in unchanged
+    inverse = np.linalg.inv(matrix)
+    inverse /= inverse[2, 2]
+    return cover_img.transform(out_size, Image.PERSPECTIVE, tuple(inverse.ravel()[:8]),
+                               Image.BILINEAR, fillcolor=(0, 0, 0, 0))
+
+def resampled_noise_intensity(intensity, linear_scale):
+    """
+    Noise intensity to add after a resample by linear_scale that matches
+    adding intensity before it.
+
+    A bilinear resample averages independent noise: whether it shrinks
+    (triangle filter over 1/scale pixels) or enlarges (interpolation between
+    neighbours), each axis keeps about 2/3 of the variance per source pixel
+    under the filter, so the standard deviation falls by 2/3 * min(1, scale)
+    in 2D. Uniform integer noise of intensity n has variance n * (n + 1) / 3,
+    which gives the intensity with the reduced variance.
+    """
+    gain = 2 / 3 * min(1.0, linear_scale)
+    return (math.sqrt(1 + 4 * gain ** 2 * intensity * (intensity + 1)) - 1) / 2
+
+def sample_cover_color_params():
+    """Draw the colour augmentation parameters for one cover."""
+    params = {}
+    if random.random() > 0.2:  # 80% chance of brightness adjustment
+        params["brightness"] = random.uniform(*BRIGHTNESS_RANGE)
+    if random.random() > 0.3:  # 70% chance of contrast adjustment
+        params["contrast"] = random.uniform(*CONTRAST_RANGE)
     if random.random() > 0.4:  # 60% chance of saturation adjustment
-        saturation_factor = random.uniform(*SATURATION_RANGE)
-        augmented = ImageEnhance.Color(augmented).enhance(saturation_factor)
+        params["saturation"] = random.uniform(*SATURATION_RANGE)
+    return params
+
+def augment_cover_image(cover_img, matrix, out_size):
+    """
+    Apply random augmentations to a cover image.
+
+    The geometry from sample_cover_transform() is applied in a single warp,
+    so colour work runs on the small, final-size cover.
+    """
+    augmented = warp_cover(cover_img, matrix, out_size)
+    
+    # Color adjustments
+    params = sample_cover_color_params()
     
-    # Blur
+    # Blur commutes with the per-pixel colour maps, so it runs first and the
+    # colour steps and noise go through one enhance() call. The radius is
+    # drawn in source pixels, as it was when blur ran before the resize.
+    linear_scale = math.sqrt(abs(np.linalg.det(matrix[:2, :2])))
     if random.random() < BLUR_PROBABILITY:
-        blur_radius = random.uniform(*BLUR_RADIUS)
+        blur_radius = random.uniform(*BLUR_RADIUS) * linear_scale
         augmented = augmented.filter(ImageFilter.GaussianBlur(radius=blur_radius))
     
-    # Noise
+    # Noise, drawn at source resolution like the blur: the old resize after
+    # add_noise() averaged most of it away on shrunken covers
     if random.random() < NOISE_PROBABILITY:
-        noise_intensity = random.randint(*NOISE_INTENSITY)
-        augmented = add_noise(augmented, noise_intensity)
+        params["noise"] = resampled_noise_intensity(random.randint(*NOISE_INTENSITY), linear_scale)
     
-    return augmented
+    return enhance(augmented, **params)
 
-def augment_background(bg_img):
+def augment_background(bg_img, pixel_scale=1.0):
     """Apply subtle augmentations to background image."""
-    augmented = bg_img.copy()
+    augmented = bg_img
+    params = {}
     
     # Subtle brightness/contrast adjustments
     if random.random() > 0.4:
-        brightness_factor = random.uniform(0.85, 1.15)
-        augmented = ImageEnhance.Brightness(augmented).enhance(brightness_factor)
+        params["brightness"] = random.uniform(0.85, 1.15)
     
     if random.random() > 0.5:
-        contrast_factor = random.uniform(0.9, 1.1)
-        augmented = ImageEnhance.Contrast(augmented).enhance(contrast_factor)
+        params["contrast"] = random.uniform(0.9, 1.1)
     
     # Subtle blur occasionally
     if random.random() < 0.1:  # 10% chance
-        augmented = augmented.filter(ImageFilter.GaussianBlur(radius=0.5))
+        augmented = augmented.filter(ImageFilter.GaussianBlur(radius=0.5 * pixel_scale))
     
-    return augmented
+    return enhance(augmented, **params)
+
+def place_covers_on_background(bg_img, num_covers=4, is_positive=False,
+                               max_iou=PLACEMENT_MAX_IOU, min_visibility=PLACEMENT_MIN_VISIBILITY,
+                               pixel_scale=1.0):
+    """
+    Overlay random covers on a background image with augmentations and return bounding boxes.
 
-def place_covers_on_background(bg_img, num_covers=4, is_positive=False):
-    """Overlay random covers on a background image with augmentations and return bounding boxes."""
+    A cover is skipped when no position keeps its IoU with every placed cover
+    at or below max_iou and every placed cover at least min_visibility visible.
+    pixel_scale is the size of bg_img relative to the background asset; effects
+    specified in pixels (shadow offset and blur) are scaled by it.
+    """
     bg_w, bg_h = bg_img.size
     min_dim = min(bg_w, bg_h)
     base_target_size = min_dim // DIVISION_SIZE
     
     # Apply background augmentation
-    bg_img = augment_background(bg_img)
-    composed = bg_img.convert("RGBA")
+    with span("augment_background"):
+        bg_img = augment_background(bg_img, pixel_scale)
+    canvas = bg_img.convert("RGB")
     bounding_boxes = []
     
     # Track placed covers to avoid too much overlap
-    placed_rects = []
+    grid = PlacementGrid(bg_w, bg_h, max_iou=max_iou, min_visibility=min_visibility)
     
     covers_placed = 0
     attempts = 0
@@ -175,107 +260,54 @@ def place_covers_on_background(bg_img, num_covers=4, is_positive=False):
         if cover is None:
             continue
         
-        # Apply augmentations to cover
-        cover = augment_cover_image(cover)
-        
         # Random scale variation
         scale_factor = random.uniform(*SCALE_VARIATION)
         target_size = int(base_target_size * scale_factor)
         
-        # Scale proportionally
-        c_w, c_h = cover.size
-        scale = target_size / max(c_w, c_h)
-        new_size = (int(c_w * scale), int(c_h * scale))
-        cover = cover.resize(new_size, Image.BILINEAR)
-        
-        # Try to find a position with minimal overlap
-        best_pos = None
-        best_overlap = float('inf')
-        
-        for _ in range(20):  # Try 20 random positions
-            max_x = max(0, bg_w - new_size[0])
-            max_y = max(0, bg_h - new_size[1])
-            pos_x = random.randint(0, max_x)
-            pos_y = random.randint(0, max_y)
-            
-            # Calculate overlap with existing covers
-            current_rect = (pos_x, pos_y, pos_x + new_size[0], pos_y + new_size[1])
-            total_overlap = 0
-            
-            for existing_rect in placed_rects:
-                overlap = calculate_overlap(current_rect, existing_rect)
-                total_overlap += overlap
-            
-            if total_overlap < best_overlap:
-                best_overlap = total_overlap
-                best_pos = (pos_x, pos_y)
-                
-                # If we found a position with no overlap, use it immediately
-                if total_overlap == 0:
-                    break
+        # Geometry first: the final footprint is known before any pixel work
+        matrix, new_size, corners = sample_cover_transform(cover.size, target_size)
         
+        # Find a free (or least occupied) window that keeps the constraints
+        best_pos = grid.find_position(*new_size)
         if best_pos is None:
             continue
         
+        # Apply augmentations to cover
+        with span("augment_cover_image"):
+            cover = augment_cover_image(cover, matrix, new_size)
+        
         pos_x, pos_y = best_pos
         
         # Add shadow effect
+        shadow = None
         if random.random() < SHADOW_PROBABILITY:
-            shadow_offset = (random.randint(2, 8), random.randint(2, 8))
-            cover_with_shadow = create_shadow(cover, shadow_offset, 
-                                            blur_radius=random.uniform(1, 4), 
-                                            opacity=random.uniform(0.2, 0.5))
-            
-            # Adjust position to account for shadow
-            shadow_pos_x = max(0, min(pos_x - max(0, -shadow_offset[0]), bg_w - cover_with_shadow.width))
-            shadow_pos_y = max(0, min(pos_y - max(0, -shadow_offset[1]), bg_h - cover_with_shadow.height))
-            
-            # Random opacity for the entire cover+shadow
-            opacity = random.uniform(*OVERLAY_OPACITY_RANGE)
-            if opacity < 1.0:
-                r, g, b, a = cover_with_shadow.split()
-                a = ImageEnhance.Brightness(a).enhance(opacity)
-                cover_with_shadow = Image.merge('RGBA', (r, g, b, a))
-            
-            composed.alpha_composite(cover_with_shadow, (shadow_pos_x, shadow_pos_y))
-        else:
-            # Random opacity for the cover
-            opacity = random.uniform(*OVERLAY_OPACITY_RANGE)
-            if opacity < 1.0:
-                r, g, b, a = cover.split()
-                a = ImageEnhance.Brightness(a).enhance(opacity)
-                cover = Image.merge('RGBA', (r, g, b, a))
-            
-            composed.alpha_composite(cover, (pos_x, pos_y))
+            shadow_offset = (max(1, round(random.randint(2, 8) * pixel_scale)),
+                             max(1, round(random.randint(2, 8) * pixel_scale)))
+            shadow = (shadow_offset, random.uniform(1, 4) * pixel_scale, random.uniform(0.2, 0.5))
+        
+        # Random opacity for the cover (and its shadow)
+        opacity = random.uniform(*OVERLAY_OPACITY_RANGE)
+        with span("composite_cover", shadow=shadow is not None):
+            composite_cover(canvas, cover, (pos_x, pos_y), opacity=opacity, shadow=shadow)
         
         # Track placed cover
-        placed_rects.append((pos_x, pos_y, pos_x + new_size[0], pos_y + new_size[1]))
+        grid.place(pos_x, pos_y, *new_size)
         
         # Calculate YOLO format bounding box (normalized coordinates)
+        # The box is the extent of the projected cover corners, not the canvas
         if is_positive:
-            center_x = (pos_x + new_size[0] / 2) / bg_w
-            center_y = (pos_y + new_size[1] / 2) / bg_h
-            width = new_size[0] / bg_w
-            height = new_size[1] / bg_h
+            box_w, box_h = corners.max(axis=0)
+            center_x = (pos_x + box_w / 2) / bg_w
+            center_y = (pos_y + box_h / 2) / bg_h
+            width = box_w / bg_w
+            height = box_h / bg_h
             
             # Class ID 0 for game covers
             bounding_boxes.append(f"0 {center_x:.6f} {center_y:.6f} {width:.6f} {height:.6f}")
         
         covers_placed += 1
     
-    return composed.convert("RGB"), bounding_boxes
-
-def calculate_overlap(rect1, rect2):
-    """Calculate overlap area between two rectangles."""
-    x1_max = max(rect1[0], rect2[0])
-    y1_max = max(rect1[1], rect2[1])
-    x2_min = min(rect1[2], rect2[2])
-    y2_min = min(rect1[3], rect2[3])
-    
-    if x2_min <= x1_max or y2_min <= y1_max:
-        return 0  # No overlap
-    
-    return (x2_min - x1_max) * (y2_min - y1_max)
+    return canvas, bounding_boxes
 
 def save_yolo_annotation(annotation_path, bounding_boxes):
     """Save YOLO format annotations to file."""
@@ -283,72 +315,384 @@ def save_yolo_annotation(annotation_path, bounding_boxes):
         for box in bounding_boxes:
             f.write(box + '\n')
 import os
+import json
+import time
 import random
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import argparse
+import secrets
+from dataclasses import dataclass, asdict, field
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from PIL import Image
+import tracing
 
-def _generate_single_image(i, offset_index, bg_files, is_positive, output_dir):
-    """Helper function to generate a single synthetic image."""
+# Scheduler parameters
+CHUNK_SIZE = 8  # images per task sent to a worker
+IN_FLIGHT_PER_WORKER = 2  # submitted chunks allowed per worker at any time
+MANIFEST_NAME = "manifest.jsonl"
+# Code that decides what a sample looks like; a change to any of it invalidates every sample
+GENERATOR_SOURCES = ("create_synth.py", "augment.py", "placement.py", "composite.py", "encoders.py", "asset_pack.py")
+
+def image_seed(seed, number):
+    """Derive the RNG seed of one image from the run seed and its global number."""
+    return int(np.random.SeedSequence([seed, number]).generate_state(1)[0])
+
+def seed_image_rngs(seed, number):
+    """Reseed the global random and np.random state for one image."""
+    derived = image_seed(seed, number)
+    random.seed(derived)
+    np.random.seed(derived)
+
+def image_stem(number):
+    """File name stem shared by an image and its annotation."""
+    return f"synthetic_{number:03d}"
+
+def is_generated(output_dir, number, ext=".jpg"):
+    """True if both files of an image exist; the annotation is written last."""
+    stem = os.path.join(output_dir, image_stem(number))
+    return os.path.exists(stem + ext) and os.path.exists(stem + ".txt")
+
+def run_digest(seed, target_size=None, encoder=DEFAULT_ENCODER):
+    """
+    Hash of everything every sample depends on: seed, parameters, generator
+    code and the asset listings its random choices index into.
+    """
+    h = hashlib.sha256(json.dumps([seed, target_size, encoder]).encode())
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in GENERATOR_SOURCES:
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(f.read())
+    for directory in [BACKGROUND_DIR] + COVER_DIRS_POS + COVER_DIRS_NEG:
+        h.update(json.dumps([directory, list_images(directory)]).encode())
+    return h.hexdigest()
+
+def sample_key(digest, number, is_positive, assets):
+    """Key of one sample: the run digest, its number and kind, and the asset files it read."""
+    h = hashlib.sha256(json.dumps([digest, number, is_positive]).encode())
+    for path in sorted(assets):
+        try:
+            st = os.stat(path)
+            h.update(f"\0{path}:{st.st_size}:{st.st_mtime_ns}".encode())
+        except OSError:
+            h.update(f"\0{path}:missing".encode())
+    return h.hexdigest()
+
+def invalidate_changed(output_dir, expected, digest, ext=".jpg", manifest_path=None, shard=(0, 1)):
+    """
+    Delete generated samples of this shard whose key no longer matches, or
+    that are not in expected ({number: is_positive}); returns how many were
+    deleted.
+
+    Keys are recomputed from the assets each sample recorded in the manifest,
+    so editing one cover only invalidates the samples that used it. Adding or
+    removing an asset changes the listings in the digest, which reshuffles
+    every random choice and so invalidates every sample.
+    """
+    manifest_path = manifest_path or os.path.join(output_dir, MANIFEST_NAME)
+    records = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by an interrupted run
+                if record.get("error") is None and record.get("key"):
+                    records[record["number"]] = record
+
+    deleted = 0
+    for name in os.listdir(output_dir):
+        stem, file_ext = os.path.splitext(name)
+        if file_ext not in (ext, ".txt") or not stem.startswith("synthetic_"):
+            continue
+        try:
+            number = int(stem[len("synthetic_"):])
+        except ValueError:
+            continue
+        if number % shard[1] != shard[0]:
+            continue  # another shard's sample
+        record = records.get(number)
+        if number in expected and record is not None and record["is_positive"] == expected[number] and \
+                record["key"] == sample_key(digest, number, expected[number], record.get("assets", [])):
+            continue
+        os.remove(os.path.join(output_dir, name))
+        deleted += file_ext == ext
+    return deleted
+
+def parse_shard(value):
+    """Parse an "i/N" shard spec into (i, N)."""
     try:
-        bg_path = os.path.join(BACKGROUND_DIR, random.choice(bg_files))
-        bg_img = Image.open(bg_path).convert("RGBA")
+        index, count = (int(v) for v in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like i/N, got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, {count}), got {value!r}")
+    return index, count
 
-        # Vary number of covers per image
+def render_sample(bg_files, is_positive, target_size=None):
+    """
+    Composite one synthetic image from the current RNG state; returns (RGB image, YOLO boxes).
+
+    With target_size, a larger background is first scaled so its long side is
+    target_size and the scene is composited at that resolution.
+    """
+    bg_name = random.choice(bg_files)
+    bg_img = load_image(BACKGROUND_DIR, bg_name)
+    # Effects are specified in pixels of the asset file, which the pack may store shrunk
+    source_long_side = max(source_size(BACKGROUND_DIR, bg_name, bg_img))
+    if target_size and max(bg_img.size) > target_size:
+        scale = target_size / max(bg_img.size)
+        size = (max(1, round(bg_img.width * scale)), max(1, round(bg_img.height * scale)))
+        # The background is opaque, so resample it without the alpha channel
+        bg_img = bg_img.convert("RGB").resize(size, Image.BILINEAR, reducing_gap=2.0)
+    pixel_scale = max(bg_img.size) / source_long_side
+
+    # Vary number of covers per image
+    if is_positive and random.random() < DENSE_SCENE_PROBABILITY:
+        num_covers = random.randint(*DENSE_COVER_RANGE)
+    else:
         num_covers = random.randint(1, 6) if is_positive else random.randint(2, 8)
 
-        result, bounding_boxes = place_covers_on_background(bg_img, num_covers=num_covers, is_positive=is_positive)
+    return place_covers_on_background(bg_img, num_covers=num_covers, is_positive=is_positive,
+                                      pixel_scale=pixel_scale)
 
-        # Save image
-        img_filename = f"synthetic_{i+1+offset_index:03d}.jpg"
-        out_path = os.path.join(output_dir, img_filename)
-        result.save(out_path, "JPEG", quality=92, optimize=True)
+@dataclass
+class GenerationResult:
+    """Outcome of one generated image, as streamed to the manifest."""
+    number: int
+    filename: str
+    is_positive: bool
+    box_count: int = 0
+    render_seconds: float = 0.0
+    encode_seconds: float = 0.0
+    error: Optional[str] = None
+    key: Optional[str] = None
+    assets: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def message(self):
+        if not self.ok:
+            return f"✗ Error generating {self.filename}: {self.error}"
+        if self.is_positive and self.box_count:
+            return f"✓ Generated: {self.filename} with {self.box_count} covers"
+        return f"✓ Generated: {self.filename} (negative sample)"
+
+
+def _generate_single_image(i, offset_index, bg_files, is_positive, output_dir, seed=None,
+                           target_size=None, encoder=DEFAULT_ENCODER, digest=None):
+    """Helper function to generate a single synthetic image."""
+    global _used_assets
+    number = i + 1 + offset_index
+    img_filename = f"{image_stem(number)}{encoder_extension(encoder)}"
+    record = GenerationResult(number=number, filename=img_filename, is_positive=is_positive)
+    try:
+        # Every image draws from its own stream, so output does not depend on
+        # which worker (or machine) renders it
+        if seed is not None:
+            seed_image_rngs(seed, number)
 
-        # Save annotations
-        annotation_filename = f"synthetic_{i+1+offset_index:03d}.txt"
-        annotation_path = os.path.join(output_dir, annotation_filename)
+        start = time.perf_counter()
+        _used_assets = set()
+        try:
+            with span("render_sample", number=number):
+                result, bounding_boxes = render_sample(bg_files, is_positive, target_size)
+            record.assets = sorted(_used_assets)
+        finally:
+            _used_assets = None
+        record.render_seconds = time.perf_counter() - start
+        if digest is not None:
+            record.key = sample_key(digest, number, is_positive, record.assets)
 
-        if is_positive and bounding_boxes:
-            save_yolo_annotation(annotation_path, bounding_boxes)
-            return f"✓ Generated: {img_filename} with {len(bounding_boxes)} covers"
-        else:
-            save_yolo_annotation(annotation_path, [])
-            return f"✓ Generated: {img_filename} (negative sample)"
+        # Save image, then the annotation; each is renamed into place so an
+        # interrupted run never leaves a half-written pair behind
+        start = time.perf_counter()
+        out_path = os.path.join(output_dir, img_filename)
+        with span("encode_image", encoder=encoder):
+            encode_image(result, out_path + ".tmp", encoder)
+            os.replace(out_path + ".tmp", out_path)
+
+        # Save annotations (negative samples get an empty file)
+        if not is_positive:
+            bounding_boxes = []
+        annotation_path = os.path.join(output_dir, f"{image_stem(number)}.txt")
+        save_yolo_annotation(annotation_path + ".tmp", bounding_boxes)
+        os.replace(annotation_path + ".tmp", annotation_path)
+        record.encode_seconds = time.perf_counter() - start
+        record.box_count = len(bounding_boxes)
 
     except Exception as e:
-        return f"✗ Error generating image {i+1} (offset + {offset_index}): {str(e)}"
+        record.error = str(e)
+    return record
+
+
+# State loaded once per worker process by _init_worker(), so tasks only carry indices
+_worker_state = {}
+
+
+def _init_worker(bg_files, output_dir, seed, target_size, encoder, digest):
+    """ProcessPoolExecutor initializer: keep shared inputs resident in the worker."""
+    _worker_state.update(bg_files=bg_files, output_dir=output_dir, seed=seed,
+                         target_size=target_size, encoder=encoder, digest=digest)
+    get_asset_pack()  # map the pack once, before the first task
+
+
+def _generate_batch(indices, offset_index, is_positive):
+    """Render a chunk of images inside a worker."""
+    state = _worker_state
+    return [
+        _generate_single_image(i, offset_index, state["bg_files"], is_positive, state["output_dir"], state["seed"],
+                               state["target_size"], state["encoder"], state["digest"])
+        for i in indices
+    ]
+
+
+def _chunks(iterable, size):
+    """Yield lists of up to size items."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 
+def generate_synthetic_data(num_images=10, is_positive=False, offset_index=0,
+                            seed=None, shard=(0, 1), resume=False, workers=None,
+                            chunk_size=CHUNK_SIZE, manifest_path=None,
+                            target_size=None, encoder=DEFAULT_ENCODER):
+    """
+    Generate synthetic training data with augmentations in parallel.
 
-def generate_synthetic_data(num_images=10, is_positive=False, offset_index=0):
-    """Generate synthetic training data with augmentations in parallel."""
-    bg_files = [f for f in os.listdir(BACKGROUND_DIR) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+    With a seed, image k of the logical dataset is always rendered from
+    seed_image_rngs(seed, k), so results are byte-identical for any worker
+    count. shard=(i, N) renders only the images whose number is i mod N, and
+    resume skips images that are already complete in OUTPUT_DIR.
+
+    Work is submitted in chunks with a bounded number in flight, and every
+    result is appended to a JSONL manifest as it arrives, so memory stays flat
+    for any num_images. target_size composites at that long-side resolution
+    instead of the background's native one, and encoder picks the output
+    format (see encoders.py). Seeded records carry a sample_key() for
+    invalidate_changed(). Returns (successful, attempted) counts.
+    """
+    bg_files = list_images(BACKGROUND_DIR)
 
     if not bg_files:
         print("Error: No background images found!")
-        return
+        return 0, 0
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(OUTPUT_DIR, MANIFEST_NAME)
+
+    shard_index, shard_count = shard
+    indices = (i for i in range(num_images) if (i + 1 + offset_index) % shard_count == shard_index)
+    if resume:
+        ext = encoder_extension(encoder)
+        indices = (i for i in indices if not is_generated(OUTPUT_DIR, i + 1 + offset_index, ext))
+    pending = _chunks(indices, chunk_size)
 
-    results = []
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
     successful_generations = 0
+    attempted = 0
 
-    with ProcessPoolExecutor() as executor:
-        futures = [
-            executor.submit(_generate_single_image, i, offset_index, bg_files, is_positive, OUTPUT_DIR)
-            for i in range(num_images)
-        ]
+    digest = run_digest(seed, target_size, encoder) if seed is not None else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(bg_files, OUTPUT_DIR, seed, target_size, encoder, digest)) as executor, \
+            open(manifest_path, "a") as manifest:
+        in_flight = set()
+        while True:
+            # Keep the window full, but never queue the whole run up front
+            for chunk in pending:
+                in_flight.add(executor.submit(_generate_batch, chunk, offset_index, is_positive))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
 
-        for future in as_completed(futures):
-            msg = future.result()
-            print(msg)
-            if msg.startswith("✓"):
-                successful_generations += 1
-            results.append(msg)
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                for record in future.result():
+                    print(record.message())
+                    manifest.write(json.dumps(dict(asdict(record), seed=seed)) + "\n")
+                    attempted += 1
+                    if record.ok:
+                        successful_generations += 1
+            manifest.flush()
 
-    print(f"\nCompleted: {successful_generations}/{num_images} images generated successfully")
-    return results
+    if resume and attempted == 0:
+        print("Resuming: every image in this range is already generated")
+    print(f"\nCompleted: {successful_generations}/{attempted} images generated successfully")
+    return successful_generations, attempted
 
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic game cover training data')
+    parser.add_argument('--num-positive', type=int, default=50, help='Number of images with game covers')
+    parser.add_argument('--num-negative', type=int, default=50, help='Number of images without game covers')
+    parser.add_argument('--negative-offset', type=int, default=None,
+                        help='Index offset for negative image numbering (default: --num-positive + 1; '
+                             'must be at least --num-positive so negatives do not overwrite positives)')
+    parser.add_argument('--seed', type=int, default=None, help='Run seed (default: random, printed for reruns)')
+    parser.add_argument('--shard', type=parse_shard, default=(0, 1), help='Render only shard i of N, as i/N')
+    parser.add_argument('--resume', action='store_true', help='Skip images that are already generated')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Keep generated images whose seed, parameters, generator code and assets are unchanged, '
+                             'delete the rest and regenerate them (needs --seed)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--target-size', type=int, default=None,
+                        help='Composite at this long-side resolution (e.g. the training imgsz) instead of native')
+    parser.add_argument('--encoder', choices=sorted(ENCODERS), default=DEFAULT_ENCODER,
+                        help='Output encoder: pil-optimize (default), pil, cv2 (OpenCV libjpeg-turbo) or npy (raw arrays)')
+    parser.add_argument('--trace', default=None,
+                        help='Record per-stage spans of every worker here and print a summary (see tracing.py)')
+    parser.add_argument('--profile', action='store_true', help='With --trace, also sample stacks for a flame graph')
+
+    args = parser.parse_args()
+    # Positives are numbered 1..num_positive and negatives from offset + 1
+    if args.negative_offset is None:
+        args.negative_offset = args.num_positive + 1
+    elif args.negative_offset < args.num_positive:
+        parser.error(f"--negative-offset {args.negative_offset} would number negatives from {args.negative_offset + 1}, "
+                     f"inside the positives 1..{args.num_positive}; use at least {args.num_positive}")
+    if args.incremental and args.seed is None:
+        parser.error("--incremental needs a fixed --seed")
+    if args.trace:
+        tracing.enable(args.trace, profile=args.profile)
+
+    # Forked workers would otherwise share one RNG state; a drawn seed keeps
+    # unseeded runs independent per image and still reproducible
+    seed = args.seed if args.seed is not None else secrets.randbits(32)
+    print(f"Using seed {seed} (shard {args.shard[0]}/{args.shard[1]})")
+
+    if args.incremental:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        positives = range(1, args.num_positive + 1)
+        negatives = range(args.negative_offset + 1, args.negative_offset + args.num_negative + 1)
+        expected = {n: kind for numbers, kind in ((positives, True), (negatives, False))
+                    for n in numbers if n % args.shard[1] == args.shard[0]}
+        deleted = invalidate_changed(OUTPUT_DIR, expected, run_digest(seed, args.target_size, args.encoder),
+                                     encoder_extension(args.encoder), shard=args.shard)
+        print(f"Incremental: {deleted} stale images removed; unchanged images are kept")
+        args.resume = True
+
     print("Starting enhanced synthetic data generation...")
     print("Positive samples (with game covers):")
-    generate_synthetic_data(num_images=50, is_positive=True)
+    generate_synthetic_data(num_images=args.num_positive, is_positive=True,
+                            seed=seed, shard=args.shard, resume=args.resume, workers=args.workers,
+                            target_size=args.target_size, encoder=args.encoder)
     print("\nNegative samples (without game covers):")
-    generate_synthetic_data(num_images=50, is_positive=False, offset_index=51)
\ No newline at end of file
+    generate_synthetic_data(num_images=args.num_negative, is_positive=False, offset_index=args.negative_offset,
+                            seed=seed, shard=args.shard, resume=args.resume, workers=args.workers,
+                            target_size=args.target_size, encoder=args.encoder)
+    tracing.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection for the asset folders used by create_synth.py.
+
+Every image gets two 64-bit perceptual hashes: a pHash (sign of the low DCT
+frequencies of a 32x32 grey thumbnail, against their median) and a dHash
+(sign of horizontal gradients of a 9x8 thumbnail). Thumbnails are decoded in
+parallel; both hashes are then computed for all images at once with NumPy.
+
+Near-duplicates are found with a multi-index hash table instead of comparing
+every pair: the pHash is cut into threshold + 1 chunks, and two hashes within
+threshold bits of each other must agree exactly on at least one chunk, so only
+images that share a chunk bucket are compared. A pair is a duplicate when both
+its pHash and dHash distances are within the threshold; mirrored copies are
+caught by also indexing the hashes of the flipped thumbnails.
+
+Each cluster of duplicates keeps one image: the one from the earliest listed
+folder (positives come first by default, so a negative that copies a positive
+cover is dropped), then the largest. The rest are written to a manifest that
+asset_pack.list_source_files() excludes, so the asset pack and the generator
+sample every distinct cover once. Hashes are stored in the manifest by size
+and mtime, so reruns only hash new or modified images.
+
+By default the real photos and the pink_gorilla_twitter frames are scanned
+too; their duplicates (e.g. PinkGorilla_1_flip.jpg) are reported in the
+manifest. The manifest also holds a hard-negative index: every negative cover
+whose pHash is within HARD_NEGATIVE_THRESHOLD bits of a positive cover
+without being a duplicate of it, with the positives it resembles.
+"""
+
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from image_index import IMAGE_EXTENSIONS, get_image_index
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEDUP_MANIFEST_PATH = os.path.join(HERE, "build", "asset_dedup.json")
+REAL_ASSET_DIR = os.path.join(HERE, "real_assets")
+TWITTER_DIR = os.path.join(os.path.dirname(HERE), "pink_gorilla_twitter")
+MANIFEST_VERSION = 1
+PHASH_SIZE = 32
+DEFAULT_THRESHOLD = 6
+HARD_NEGATIVE_THRESHOLD = 12
+
+# Bits set in every byte value, for popcounts on uint64 hashes viewed as bytes
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def group_name(directory):
+    """Key of a folder in the manifest (matches the asset pack's group names)."""
+    return os.path.basename(os.path.normpath(directory))
+
+
+def _thumbnails(path):
+    """Grey 32x32 (pHash) and 9x8 (dHash) thumbnails of one image as bytes, or None."""
+    try:
+        with Image.open(path) as img:
+            img.draft("L", (PHASH_SIZE * 2, PHASH_SIZE * 2))
+            if img.mode == "P":
+                img = img.convert("RGBA")  # palette transparency has to go through RGBA
+            img = img.convert("L")
+        return (img.resize((PHASH_SIZE, PHASH_SIZE), Image.BILINEAR).tobytes(),
+                img.resize((9, 8), Image.BILINEAR).tobytes())
+    except Exception as e:
+        print(f"Warning: skipping {path}: {e}")
+        return None
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II matrix, so a 2D DCT is D @ X @ D.T."""
+    k = np.arange(n)[:, None]
+    d = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    d[0] /= np.sqrt(2)
+    return d.astype(np.float32)
+
+
+def _pack_bits(bits):
+    """(N, 64) booleans -> (N,) uint64, first bit most significant."""
+    return np.packbits(bits, axis=1).view(">u8")[:, 0].astype(np.uint64)
+
+
+def phash(thumbs):
+    """pHashes of an (N, 32, 32) uint8 stack of grey thumbnails."""
+    d = _dct_matrix(PHASH_SIZE)
+    low = (d @ thumbs.astype(np.float32) @ d.T)[:, :8, :8].reshape(len(thumbs), 64)
+    return _pack_bits(low > np.median(low, axis=1, keepdims=True))
+
+
+def dhash(thumbs):
+    """dHashes of an (N, 8, 9) uint8 stack of grey thumbnails."""
+    return _pack_bits((thumbs[:, :, 1:] > thumbs[:, :, :-1]).reshape(len(thumbs), 64))
+
+
+def hamming(a, b):
+    """Bitwise distance between two equal-length uint64 arrays."""
+    return POPCOUNT[(a ^ b).view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def hash_images(paths, workers=None):
+    """
+    Hash images; returns a list of (phash, dhash, mirrored phash, mirrored dhash)
+    int tuples, with None for unreadable images.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        thumbs = list(executor.map(_thumbnails, paths, chunksize=32))
+    ok = [i for i, t in enumerate(thumbs) if t is not None]
+    hashes = [None] * len(paths)
+    if not ok:
+        return hashes
+
+    p = np.stack([np.frombuffer(thumbs[i][0], np.uint8).reshape(PHASH_SIZE, PHASH_SIZE) for i in ok])
+    d = np.stack([np.frombuffer(thumbs[i][1], np.uint8).reshape(8, 9) for i in ok])
+    columns = [phash(p), dhash(d), phash(p[:, :, ::-1]), dhash(d[:, :, ::-1])]
+    for row, i in enumerate(ok):
+        hashes[i] = tuple(int(c[row]) for c in columns)
+    return hashes
+
+
+class MultiIndexHashTable:
+    """
+    Hash table over chunks of 64-bit hashes for Hamming-radius lookups.
+
+    With threshold + 1 chunks, any hash within threshold bits of a stored one
+    matches it exactly in at least one chunk (pigeonhole), so a lookup only
+    has to verify the entries that share a chunk bucket with the query.
+    """
+
+    def __init__(self, hashes, threshold=DEFAULT_THRESHOLD):
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self.threshold = threshold
+        chunks = threshold + 1
+        bounds = np.linspace(0, 64, chunks + 1).astype(int)
+        self.chunks = [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        self.tables = []
+        for values in self._chunk_values(self.hashes):
+            table = {}
+            for i, value in enumerate(values.tolist()):
+                table.setdefault(value, []).append(i)
+            self.tables.append(table)
+
+    def _chunk_values(self, hashes):
+        for lo, hi in self.chunks:
+            yield (hashes >> np.uint64(64 - hi)) & np.uint64((1 << (hi - lo)) - 1)
+
+    def candidates(self, h):
+        """Indices that share at least one chunk with hash h."""
+        found = set()
+        for table, values in zip(self.tables, self._chunk_values(np.array([h], dtype=np.uint64))):
+            found.update(table.get(int(values[0]), ()))
+        return sorted(found)
+
+    def query(self, h):
+        """Indices of stored hashes within threshold bits of h."""
+        idx = np.array(self.candidates(h), dtype=np.int64)
+        if not len(idx):
+            return []
+        dist = hamming(self.hashes[idx], np.full(len(idx), h, dtype=np.uint64))
+        return idx[dist <= self.threshold].tolist()
+
+    def candidate_pairs(self):
+        """(i, j) index arrays, i < j, of every pair sharing a chunk bucket."""
+        pairs = set()
+        for table in self.tables:
+            for bucket in table.values():
+                if len(bucket) > 1:
+                    pairs.update((a, b) for n, a in enumerate(bucket) for b in bucket[n + 1:])
+        if not pairs:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        i, j = np.array(sorted(pairs), dtype=np.int64).T
+        return i, j
+
+
+def find_duplicate_pairs(hashes, threshold=DEFAULT_THRESHOLD, mirrors=True):
+    """(i, j) pairs of near-duplicate images given hash_images() tuples (None entries skipped)."""
+    valid = [i for i, h in enumerate(hashes) if h is not None]
+    if not valid:
+        return []
+    h = np.array([hashes[i] for i in valid], dtype=np.uint64)
+    n = len(valid)
+    # Rows n.. are the mirrored images, indexed next to the originals
+    p = np.concatenate([h[:, 0], h[:, 2]]) if mirrors else h[:, 0]
+    d = np.concatenate([h[:, 1], h[:, 3]]) if mirrors else h[:, 1]
+
+    i, j = MultiIndexHashTable(p, threshold).candidate_pairs()
+    keep = (i < n) & (i != j - n)  # a mirror vs a mirror repeats an original pair
+    i, j = i[keep], j[keep]
+    close = (hamming(p[i], p[j]) <= threshold) & (hamming(d[i], d[j]) <= threshold)
+    # A mirror can match an earlier image, so order each pair
+    return sorted({(valid[min(a, b % n)], valid[max(a, b % n)])
+                   for a, b in zip(i[close].tolist(), j[close].tolist())})
+
+
+def find_hard_negatives(hashes, negatives, positives, threshold=HARD_NEGATIVE_THRESHOLD, mirrors=True):
+    """
+    {negative: [positives]} for negatives whose pHash (or mirrored pHash) is
+    within threshold bits of a positive's, given hash_images() tuples and
+    index lists into them.
+    """
+    positives = [i for i in positives if hashes[i] is not None]
+    if not positives:
+        return {}
+    table = MultiIndexHashTable([hashes[i][0] for i in positives], threshold)
+    found = {}
+    for n in negatives:
+        if hashes[n] is None:
+            continue
+        matches = set(table.query(hashes[n][0]))
+        if mirrors:
+            matches.update(table.query(hashes[n][2]))
+        if matches:
+            found[n] = sorted(positives[m] for m in matches)
+    return found
+
+
+def cluster(count, pairs):
+    """Union-find over pairs; returns lists of indices with more than one member."""
+    parent = list(range(count))
+
+    def root(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        ra, rb = root(a), root(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups = {}
+    for x in range(count):
+        groups.setdefault(root(x), []).append(x)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def load_manifest(path=DEDUP_MANIFEST_PATH):
+    """Load the dedup manifest, or None when it is missing or from another version."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def dedup_assets(directories, manifest_path=DEDUP_MANIFEST_PATH, threshold=DEFAULT_THRESHOLD,
+                 mirrors=True, workers=None, positive_dirs=(), negative_dirs=(),
+                 hard_negative_threshold=HARD_NEGATIVE_THRESHOLD):
+    """
+    Hash every image in directories, cluster near-duplicates and write the
+    manifest, with hard negatives from negative_dirs against positive_dirs.
+    """
+    index = get_image_index()
+    old = load_manifest(manifest_path) or {"groups": {}}
+
+    files = []  # (directory, name, size, mtime_ns)
+    for directory in directories:
+        for name in index.images(directory, IMAGE_EXTENSIONS):
+            st = os.stat(os.path.join(directory, name))
+            files.append((directory, name, st.st_size, st.st_mtime_ns))
+
+    # Reuse hashes of files whose size and mtime are unchanged
+    hashes = [None] * len(files)
+    todo = []
+    for n, (directory, name, size, mtime_ns) in enumerate(files):
+        cached = old["groups"].get(group_name(directory), {}).get("hashes", {}).get(name)
+        if cached and cached[0] == size and cached[1] == mtime_ns:
+            hashes[n] = tuple(int(v, 16) for v in cached[2:])
+        else:
+            todo.append(n)
+    print(f"Hashing {len(todo)} of {len(files)} images ({len(files) - len(todo)} cached)")
+    for n, h in zip(todo, hash_images([os.path.join(f[0], f[1]) for f in (files[n] for n in todo)], workers)):
+        hashes[n] = h
+
+    order = {directory: rank for rank, directory in enumerate(directories)}
+
+    def preference(n):
+        directory, name = files[n][:2]
+        width, height = index.dimensions(os.path.join(directory, name))
+        return order[directory], -(width or 0) * (height or 0), name
+
+    manifest = {"version": MANIFEST_VERSION, "threshold": threshold, "mirrors": mirrors,
+                "groups": {group_name(d): {"hashes": {}, "duplicates": {}} for d in directories}}
+    for n, (directory, name, size, mtime_ns) in enumerate(files):
+        if hashes[n] is not None:
+            manifest["groups"][group_name(directory)]["hashes"][name] = \
+                [size, mtime_ns] + [f"{v:016x}" for v in hashes[n]]
+
+    clusters = cluster(len(files), find_duplicate_pairs(hashes, threshold, mirrors))
+    dropped = 0
+    for members in clusters:
+        keep, *rest = sorted(members, key=preference)
+        kept = f"{group_name(files[keep][0])}/{files[keep][1]}"
+        for n in rest:
+            manifest["groups"][group_name(files[n][0])]["duplicates"][files[n][1]] = kept
+            dropped += 1
+
+    def key(n):
+        return f"{group_name(files[n][0])}/{files[n][1]}"
+
+    def candidates(dirs):
+        return [n for n, f in enumerate(files)
+                if f[0] in dirs and f[1] not in manifest["groups"][group_name(f[0])]["duplicates"]]
+
+    hard = find_hard_negatives(hashes, candidates(negative_dirs), candidates(positive_dirs),
+                               hard_negative_threshold, mirrors)
+    manifest["hard_negative_threshold"] = hard_negative_threshold
+    manifest["hard_negatives"] = {key(n): [key(m) for m in matches] for n, matches in sorted(hard.items())}
+
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    for directory in directories:
+        group = manifest["groups"][group_name(directory)]
+        print(f"{directory}: {len(group['hashes'])} images, {len(group['duplicates'])} duplicates")
+    print(f"{len(clusters)} duplicate clusters, {dropped} images excluded, "
+          f"{len(hard)} hard negatives; manifest written to {manifest_path}")
+    return manifest
+
+
+_duplicates = None
+
+
+def get_duplicates(directory, manifest_path=DEDUP_MANIFEST_PATH):
+    """Names in directory marked as duplicates by the manifest (empty when none has been written)."""
+    global _duplicates
+    if _duplicates is None:
+        manifest = load_manifest(manifest_path)
+        _duplicates = {} if manifest is None else {
+            group: set(info["duplicates"]) for group, info in manifest["groups"].items()
+        }
+    return _duplicates.get(group_name(directory), set())
+
+
+def get_hard_negatives(manifest_path=DEDUP_MANIFEST_PATH):
+    """{"group/name": ["group/name" of similar positives]} from the manifest (empty when none has been written)."""
+    manifest = load_manifest(manifest_path)
+    return {} if manifest is None else manifest.get("hard_negatives", {})
+
+
+def default_directories():
+    """
+    Folders sampled by create_synth.py, positives first so their copies are
+    the ones kept, then the real photos and the twitter frames.
+    """
+    from create_synth import BACKGROUND_DIR, COVER_DIRS_NEG, COVER_DIRS_POS
+
+    return COVER_DIRS_POS + COVER_DIRS_NEG + [BACKGROUND_DIR, REAL_ASSET_DIR, TWITTER_DIR]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find near-duplicate assets and write the dedup manifest')
+    parser.add_argument('--dirs', nargs='+', default=None,
+                        help='Folders to deduplicate, most preferred first (default: the create_synth.py folders)')
+    parser.add_argument('--out', default=DEDUP_MANIFEST_PATH, help='Path of the manifest to write')
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD,
+                        help='Largest pHash and dHash bit distance counted as a duplicate')
+    parser.add_argument('--hard-negative-threshold', type=int, default=HARD_NEGATIVE_THRESHOLD,
+                        help='Largest pHash bit distance between a negative and a positive cover '
+                             'for the hard-negative index')
+    parser.add_argument('--no-mirrors', action='store_true', help='Do not treat mirrored images as duplicates')
+    parser.add_argument('--workers', type=int, default=None, help='Decode processes (default: CPU count)')
+
+    args = parser.parse_args()
+    from create_synth import COVER_DIRS_NEG, COVER_DIRS_POS
+
+    directories = args.dirs or default_directories()
+    dedup_assets(directories, args.out, args.threshold, not args.no_mirrors, args.workers,
+                 positive_dirs=COVER_DIRS_POS, negative_dirs=COVER_DIRS_NEG,
+                 hard_negative_threshold=args.hard_negative_threshold)
+
+
+if __name__ == "__main__":
+    main()
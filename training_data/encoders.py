@@ -0,0 +1,58 @@
+"""
+Output encoders for generated images.
+
+Each encoder writes an RGB PIL image to an open binary file and is registered
+under a name with the file extension it produces. "pil-optimize" reproduces
+the original output; "pil" skips the extra Huffman optimisation pass, "cv2"
+encodes with OpenCV's libjpeg-turbo, and "npy" stores the raw HxWx3 uint8
+array for consumers that load arrays directly (ultralytics and labelme do not
+read .npy files).
+"""
+
+import numpy as np
+
+JPEG_QUALITY = 92
+DEFAULT_ENCODER = "pil-optimize"
+
+
+def _encode_pil(image, f, quality, optimize=False):
+    image.save(f, "JPEG", quality=quality, optimize=optimize)
+
+
+def _encode_pil_optimize(image, f, quality):
+    _encode_pil(image, f, quality, optimize=True)
+
+
+def _encode_cv2(image, f, quality):
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError("the cv2 encoder needs opencv-python (pip install opencv-python)")
+    ok, data = cv2.imencode(".jpg", np.asarray(image)[..., ::-1], [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("cv2.imencode failed")
+    f.write(data.tobytes())
+
+
+def _encode_npy(image, f, quality):
+    np.save(f, np.asarray(image))
+
+
+# name -> (file extension, encode function)
+ENCODERS = {
+    "pil-optimize": (".jpg", _encode_pil_optimize),
+    "pil": (".jpg", _encode_pil),
+    "cv2": (".jpg", _encode_cv2),
+    "npy": (".npy", _encode_npy),
+}
+
+
+def encoder_extension(name):
+    """File extension written by an encoder."""
+    return ENCODERS[name][0]
+
+
+def encode_image(image, path, encoder=DEFAULT_ENCODER, quality=JPEG_QUALITY):
+    """Write image to path with the named encoder."""
+    with open(path, "wb") as f:
+        ENCODERS[encoder][1](image, f, quality)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Persistent image metadata index for the tools in training_data/.
+
+A SQLite file remembers, for every image and label file seen, its size,
+mtime, pixel dimensions and format. Dimensions come from the PNG, JPEG or
+WebP header, so nothing is decoded. Refreshing a directory is one stat pass
+over its entries, and only files whose size or mtime changed are parsed
+again, so repeated listings, dimension lookups and image<->label pairing
+over thousands of files are served from the index.
+"""
+
+import os
+import struct
+import sqlite3
+import argparse
+
+from PIL import Image
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build", "image_index.sqlite")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+LABEL_EXTENSIONS = (".txt", ".json")
+HEADER_BYTES = 64 * 1024
+INDEX_ENV = "IMAGE_INDEX_PATH"  # overrides INDEX_PATH, for this process and the workers it starts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    stem TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    format TEXT,
+    PRIMARY KEY (dir, name)
+);
+CREATE INDEX IF NOT EXISTS files_stem ON files (dir, stem);
+"""
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(f):
+    """(width, height) from the first JPEG start-of-frame segment."""
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        while len(marker) == 2 and marker[0] == 0xFF and marker[1] == 0xFF:
+            marker = marker[1:] + f.read(1)  # fill bytes
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue  # markers without a length field
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker[1] in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_header(path):
+    """(width, height, format) parsed from the file header, or None if unrecognised."""
+    with open(path, "rb") as f:
+        head = f.read(32)
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", head[16:24])
+            return width, height, "PNG"
+        if head.startswith(b"\xff\xd8"):
+            size = _jpeg_size(f)
+            return (size[0], size[1], "JPEG") if size else None
+        if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+            chunk = head[12:16]
+            if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+                f.seek(26)
+                w, h = struct.unpack("<HH", f.read(4))
+                return w & 0x3FFF, h & 0x3FFF, "WEBP"
+            if chunk == b"VP8L" and head[20:21] == b"\x2f":
+                bits = int.from_bytes(head[21:25], "little")
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, "WEBP"
+            if chunk == b"VP8X":
+                return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1, "WEBP"
+    return None
+
+
+def image_info(path):
+    """(width, height, format) from the header, falling back to PIL's lazy open."""
+    info = read_image_header(path)
+    if info is not None:
+        return info
+    try:
+        with Image.open(path) as img:
+            return img.width, img.height, img.format
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return None, None, None
+
+
+class ImageIndex:
+    """SQLite-backed metadata for image and label files, refreshed per directory."""
+
+    def __init__(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.fresh = set()  # directories already refreshed by this process
+
+    def refresh(self, directory, force=False):
+        """Bring a directory's rows up to date; cheap when nothing changed."""
+        directory = os.path.abspath(directory)
+        if directory in self.fresh and not force:
+            return
+
+        # Every entry is stat'ed: a file rewritten in place keeps the directory's mtime
+        known = {
+            name: (size, mtime_ns)
+            for name, size, mtime_ns in self.db.execute(
+                "SELECT name, size, mtime_ns FROM files WHERE dir = ?", (directory,))
+        }
+        seen = set()
+        updates = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if ext in IMAGE_EXTENSIONS:
+                    kind = "image"
+                elif ext in LABEL_EXTENSIONS:
+                    kind = "label"
+                else:
+                    continue
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                seen.add(entry.name)
+                if not force and known.get(entry.name) == (st.st_size, st.st_mtime_ns):
+                    continue
+                width = height = fmt = None
+                if kind == "image":
+                    width, height, fmt = image_info(entry.path)
+                updates.append((directory, entry.name, stem, kind, st.st_size, st.st_mtime_ns, width, height, fmt))
+
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", updates)
+            self.db.executemany("DELETE FROM files WHERE dir = ? AND name = ?",
+                                [(directory, name) for name in known.keys() - seen])
+        self.fresh.add(directory)
+
+    def images(self, directory, extensions=IMAGE_EXTENSIONS):
+        """Sorted image file names in a directory."""
+        self.refresh(directory)
+        rows = self.db.execute("SELECT name FROM files WHERE dir = ? AND kind = 'image' ORDER BY name",
+                               (os.path.abspath(directory),))
+        return [name for (name,) in rows if name.lower().endswith(extensions)]
+
+    def dimensions(self, path):
+        """(width, height) of an image, or (None, None) if it cannot be read."""
+        directory, name = os.path.split(os.path.abspath(path))
+        self.refresh(directory)
+        row = self.db.execute("SELECT width, height FROM files WHERE dir = ? AND name = ?",
+                              (directory, name)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def pairs(self, directory, label_ext=".txt"):
+        """Sorted (image path, label path or None) for every image in a directory."""
+        directory = os.path.abspath(directory)
+        self.refresh(directory)
+        rows = self.db.execute(
+            "SELECT i.name, l.name FROM files i LEFT JOIN files l "
+            "ON l.dir = i.dir AND l.stem = i.stem AND l.kind = 'label' AND l.name LIKE ? "
+            "WHERE i.dir = ? AND i.kind = 'image' ORDER BY i.name",
+            ("%" + label_ext, directory))
+        return [(os.path.join(directory, image), os.path.join(directory, label) if label else None)
+                for image, label in rows]
+
+    def image_for_label(self, label_path):
+        """Image file sharing the label's directory and stem, or None."""
+        directory, name = os.path.split(os.path.abspath(label_path))
+        self.refresh(directory)
+        row = self.db.execute(
+            "SELECT name FROM files WHERE dir = ? AND stem = ? AND kind = 'image' ORDER BY name LIMIT 1",
+            (directory, os.path.splitext(name)[0])).fetchone()
+        return os.path.join(directory, row[0]) if row else None
+
+
+_index = None
+_index_pid = None
+
+
+def use_index(path):
+    """Keep this process and the workers it starts on the index file at path."""
+    global _index
+    os.environ[INDEX_ENV] = os.path.abspath(path)
+    _index = None
+
+
+def get_image_index():
+    """The image index, opened lazily once per process (SQLite connections do not survive fork)."""
+    global _index, _index_pid
+    if _index is None or _index_pid != os.getpid():
+        _index = ImageIndex(os.environ.get(INDEX_ENV) or INDEX_PATH)
+        _index_pid = os.getpid()
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh the image metadata index')
+    parser.add_argument('dirs', nargs='+', help='Directories to index')
+    parser.add_argument('--force', action='store_true', help='Parse every file again, even if its size and mtime are unchanged')
+
+    args = parser.parse_args()
+
+    index = get_image_index()
+    for directory in args.dirs:
+        index.refresh(directory, force=args.force)
+        print(f"{directory}: {len(index.images(directory))} images")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+In-process YOLO <-> LabelMe annotation converter.
+
+Every image is converted with its own dimensions, so folders with mixed
+resolutions are handled in one pass without grouping, temp copies or
+per-group yolotolabelme subprocesses. Files are spread over a process pool.
+"""
+
+import os
+import json
+import base64
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+import tracing
+from image_index import get_image_index
+
+LABELME_VERSION = "5.8.3"
+BASE64_CHUNK = 3 * (1 << 16)  # a multiple of 3, so chunks encode without padding
+
+
+def read_classes(classes_file):
+    """Class names, one per line, in class-id order."""
+    with open(classes_file) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def get_image_dimensions(image_path):
+    """Image (width, height) from the file header."""
+    with Image.open(image_path) as img:
+        return img.width, img.height
+
+
+def yolo_shapes(txt_path, class_names, width, height):
+    """LabelMe rectangle shapes for the boxes of a YOLO label file."""
+    shapes = []
+    with open(txt_path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            class_id = int(parts[0])
+            cx, cy, w, h = (float(v) for v in parts[1:5])
+            label = class_names[class_id] if class_id < len(class_names) else str(class_id)
+            shapes.append({
+                "label": label,
+                "points": [
+                    [(cx - w / 2) * width, (cy - h / 2) * height],
+                    [(cx + w / 2) * width, (cy + h / 2) * height],
+                ],
+                "group_id": None,
+                "description": "",
+                "shape_type": "rectangle",
+                "flags": {},
+                "mask": None,
+            })
+    return shapes
+
+
+def _write_image_data(f, image_path):
+    """Stream the image file into f as base64 without holding it all in memory."""
+    with tracing.span("embed_image_data"), open(image_path, "rb") as img:
+        for block in iter(lambda: img.read(BASE64_CHUNK), b""):
+            f.write(base64.b64encode(block).decode("ascii"))
+
+
+def yolo_to_labelme(txt_path, image_path, class_names, labelme_dir, embed_image_data=False, size=None):
+    """Write the LabelMe JSON for one YOLO label file; returns the JSON path."""
+    width, height = size or get_image_dimensions(image_path)
+    # Point at the copy next to the JSON when there is one, as labelme expects
+    image_ref = os.path.basename(image_path)
+    if not os.path.exists(os.path.join(labelme_dir, image_ref)):
+        image_ref = os.path.relpath(image_path, labelme_dir)
+    document = {
+        "version": LABELME_VERSION,
+        "flags": {},
+        "shapes": yolo_shapes(txt_path, class_names, width, height),
+        "imagePath": image_ref,
+        "imageData": None,
+        "imageHeight": height,
+        "imageWidth": width,
+    }
+
+    base_name = os.path.splitext(os.path.basename(txt_path))[0]
+    json_path = os.path.join(labelme_dir, base_name + ".json")
+    with open(json_path + ".tmp", "w") as f:
+        if embed_image_data:
+            # Serialise everything but imageData, then splice the streamed base64 in
+            head, tail = json.dumps(document, indent=2).split('"imageData": null')
+            f.write(head + '"imageData": "')
+            _write_image_data(f, image_path)
+            f.write('"' + tail)
+        else:
+            json.dump(document, f, indent=2)
+    os.replace(json_path + ".tmp", json_path)
+    return json_path
+
+
+def labelme_to_yolo(json_path, class_names, yolo_dir):
+    """Write the YOLO label file for one LabelMe JSON; returns the label path."""
+    with open(json_path) as f:
+        document = json.load(f)
+
+    width, height = document.get("imageWidth"), document.get("imageHeight")
+    if not width or not height:
+        image_path = os.path.join(os.path.dirname(json_path), document["imagePath"])
+        width, height = get_image_dimensions(image_path)
+
+    lines = []
+    for shape in document.get("shapes", []):
+        if shape["label"] not in class_names:
+            print(f"Warning: Unknown label '{shape['label']}' in {json_path}")
+            continue
+        xs = [min(max(p[0], 0), width) for p in shape["points"]]
+        ys = [min(max(p[1], 0), height) for p in shape["points"]]
+        x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+        lines.append(
+            f"{class_names.index(shape['label'])} {(x0 + x1) / 2 / width:.6f} {(y0 + y1) / 2 / height:.6f} "
+            f"{(x1 - x0) / width:.6f} {(y1 - y0) / height:.6f}"
+        )
+
+    base_name = os.path.splitext(os.path.basename(json_path))[0]
+    txt_path = os.path.join(yolo_dir, base_name + ".txt")
+    with open(txt_path + ".tmp", "w") as f:
+        f.write("\n".join(lines) + ("\n" if lines else ""))
+    os.replace(txt_path + ".tmp", txt_path)
+    return txt_path
+
+
+def _convert_one(job):
+    """Process pool entry point: run one conversion, returning (source, error)."""
+    func, source, args = job
+    try:
+        with tracing.span(func.__name__):
+            func(*args)
+        return source, None
+    except Exception as e:
+        return source, f"{type(e).__name__}: {e}"
+
+
+def _run(jobs, workers):
+    """Run conversion jobs on a process pool; returns the number converted."""
+    converted = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for source, error in executor.map(_convert_one, jobs, chunksize=32):
+            if error:
+                print(f"Error converting {source}: {error}")
+            else:
+                converted += 1
+    return converted
+
+
+def convert_yolo_dir(yolo_dir, labelme_dir, classes_file, workers=None, embed_image_data=False):
+    """Convert every YOLO label with a matching image in yolo_dir; returns the number converted."""
+    class_names = read_classes(classes_file)
+    os.makedirs(labelme_dir, exist_ok=True)
+
+    # Pairing and dimensions come from the image index, not per-file probes
+    index = get_image_index()
+    txt_files = sorted(f for f in os.listdir(yolo_dir) if f.endswith('.txt'))
+    if len(txt_files) == 0:
+        print("Warning: No txt files exist in {}".format(yolo_dir))
+
+    jobs = []
+    for txt_file in txt_files:
+        txt_path = os.path.join(yolo_dir, txt_file)
+        img_path = index.image_for_label(txt_path)
+        if img_path is None:
+            print(f"Warning: No corresponding image found for {txt_file}")
+            continue
+        size = index.dimensions(img_path)
+        if None in size:
+            print(f"Warning: Could not get dimensions for {img_path}")
+            continue
+        jobs.append((yolo_to_labelme, txt_path,
+                     (txt_path, img_path, class_names, labelme_dir, embed_image_data, size)))
+    return _run(jobs, workers)
+
+
+def convert_labelme_dir(labelme_dir, yolo_dir, classes_file, workers=None, overwrite=False):
+    """
+    Convert every LabelMe JSON in labelme_dir to a YOLO label; returns the number converted.
+
+    Raises FileExistsError, before writing anything, if a label it would
+    write already exists and overwrite is False.
+    """
+    class_names = read_classes(classes_file)
+    json_files = sorted(f for f in os.listdir(labelme_dir) if f.endswith('.json'))
+    if not overwrite and os.path.isdir(yolo_dir):
+        existing = [f for f in (os.path.splitext(j)[0] + ".txt" for j in json_files)
+                    if os.path.exists(os.path.join(yolo_dir, f))]
+        if existing:
+            raise FileExistsError(f"{len(existing)} YOLO labels already exist in {yolo_dir} "
+                                  f"(e.g. {existing[0]})")
+    os.makedirs(yolo_dir, exist_ok=True)
+
+    jobs = []
+    for json_file in json_files:
+        json_path = os.path.join(labelme_dir, json_file)
+        jobs.append((labelme_to_yolo, json_path, (json_path, class_names, yolo_dir)))
+    return _run(jobs, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert annotations between YOLO and LabelMe')
+    parser.add_argument('direction', choices=['yolo2labelme', 'labelme2yolo'], help='Conversion direction')
+    parser.add_argument('--yolo', required=True, help='Path to YOLO annotations directory')
+    parser.add_argument('--labelme', required=True, help='Path to LabelMe directory')
+    parser.add_argument('--classes', required=True, help='Path to classes file')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--embed-image-data', action='store_true',
+                        help='Stream each image into the LabelMe JSON as imageData (yolo2labelme only)')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Replace YOLO labels that already exist (labelme2yolo only)')
+    parser.add_argument('--trace', default=None,
+                        help='Record per-file spans of every worker here and print a summary (see tracing.py)')
+    parser.add_argument('--profile', action='store_true', help='With --trace, also sample stacks for a flame graph')
+
+    args = parser.parse_args()
+    if args.trace:
+        tracing.enable(args.trace, profile=args.profile)
+
+    if args.direction == 'yolo2labelme':
+        converted = convert_yolo_dir(args.yolo, args.labelme, args.classes, args.workers, args.embed_image_data)
+        print(f"Conversion complete! Total files converted: {converted}")
+        print(f"LabelMe JSON files saved to: {args.labelme}")
+    else:
+        try:
+            converted = convert_labelme_dir(args.labelme, args.yolo, args.classes, args.workers, args.overwrite)
+        except FileExistsError as e:
+            parser.error(f"{e}; pass --overwrite to replace them")
+        print(f"Conversion complete! Total files converted: {converted}")
+        print(f"YOLO label files saved to: {args.yolo}")
+    tracing.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Occupancy-grid placement engine for synthetic scenes.
+
+The background is tracked as a coarse grid holding the id of the top-most
+cover in each cell. A summed-area table over that grid gives the covered area
+of every candidate window in one vectorised query, so finding a free spot no
+longer costs a Python loop over tries x placed covers. Candidates are then
+checked against a max-IoU limit and a min-visibility limit for the covers
+already in the scene, which keeps labels meaningful in dense shelf scenes.
+"""
+
+import numpy as np
+
+GRID_CELLS = 128  # cells along the short side of the background
+CANDIDATES = 16  # lowest-overlap windows checked against the constraints
+
+
+def _overlap(rect, rects):
+    """Intersection areas, the rectangle's area and the array's areas."""
+    x1 = np.maximum(rect[0], rects[:, 0])
+    y1 = np.maximum(rect[1], rects[:, 1])
+    x2 = np.minimum(rect[2], rects[:, 2])
+    y2 = np.minimum(rect[3], rects[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (rect[2] - rect[0]) * (rect[3] - rect[1])
+    areas = (rects[:, 2] - rects[:, 0]) * (rects[:, 3] - rects[:, 1])
+    return inter, area, areas
+
+
+def box_iou(rect, rects):
+    """IoU between one (x1, y1, x2, y2) rectangle and an (N, 4) array of them."""
+    inter, area, areas = _overlap(rect, rects)
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def box_ios(rect, rects):
+    """Intersection over the smaller rectangle between one (x1, y1, x2, y2) rectangle and an (N, 4) array."""
+    inter, area, areas = _overlap(rect, rects)
+    return inter / np.maximum(np.minimum(area, areas), 1e-9)
+
+
+class PlacementGrid:
+    """Occupancy map of a background, used to place covers one at a time."""
+
+    def __init__(self, width, height, max_iou=1.0, min_visibility=0.0, cell_size=None):
+        self.width = width
+        self.height = height
+        self.max_iou = max_iou
+        self.min_visibility = min_visibility
+        self.cell = cell_size or max(1, min(width, height) // GRID_CELLS)
+        self.grid_w = -(-width // self.cell)
+        self.grid_h = -(-height // self.cell)
+        # -1 marks a free cell, otherwise the index of the top-most cover
+        self.owner = np.full((self.grid_h, self.grid_w), -1, dtype=np.int32)
+        self.rects = np.zeros((0, 4), dtype=np.float64)
+        self.visible = np.zeros(0, dtype=np.int64)
+        self.area = np.zeros(0, dtype=np.int64)
+
+    def _window_sums(self, cells_w, cells_h):
+        """Occupied-cell count for every cells_w x cells_h window, via a summed-area table."""
+        sat = np.zeros((self.grid_h + 1, self.grid_w + 1), dtype=np.int32)
+        np.cumsum(np.cumsum(self.owner >= 0, axis=0), axis=1, out=sat[1:, 1:])
+        return (sat[cells_h:, cells_w:] - sat[:-cells_h, cells_w:]
+                - sat[cells_h:, :-cells_w] + sat[:-cells_h, :-cells_w])
+
+    def _cells(self, x, y, w, h):
+        """Grid slice covered by a pixel rectangle."""
+        return (slice(y // self.cell, -(-(y + h) // self.cell)),
+                slice(x // self.cell, -(-(x + w) // self.cell)))
+
+    def _allowed(self, x, y, w, h):
+        """Check the IoU and visibility constraints for a candidate rectangle."""
+        if len(self.rects) == 0:
+            return True
+        rect = (x, y, x + w, y + h)
+        if box_iou(rect, self.rects).max() > self.max_iou:
+            return False
+        if self.min_visibility > 0:
+            window = self.owner[self._cells(x, y, w, h)]
+            hidden = np.bincount(window[window >= 0], minlength=len(self.visible))
+            remaining = (self.visible - hidden) / np.maximum(self.area, 1)
+            if remaining[hidden > 0].min(initial=1.0) < self.min_visibility:
+                return False
+        return True
+
+    def find_position(self, w, h):
+        """
+        Return a top-left (x, y) for a w x h cover, or None if no window meets
+        the constraints. Free windows are preferred; otherwise the lowest
+        overlap candidates are checked in order.
+        """
+        cells_w = min(-(-w // self.cell), self.grid_w)
+        cells_h = min(-(-h // self.cell), self.grid_h)
+        sums = self._window_sums(cells_w, cells_h)
+
+        # Slack inside the window lets positions land off the cell grid
+        slack_x = max(0, cells_w * self.cell - w)
+        slack_y = max(0, cells_h * self.cell - h)
+
+        def position(index):
+            cy, cx = divmod(int(index), sums.shape[1])
+            # A window over the image's partial last cells is pulled back inside
+            # it, which can move the rectangle onto cells the window did not cover
+            x = min(cx * self.cell + np.random.randint(slack_x + 1), max(0, self.width - w))
+            y = min(cy * self.cell + np.random.randint(slack_y + 1), max(0, self.height - h))
+            return x, y
+
+        free = np.flatnonzero(sums == 0)
+        if len(free):
+            for index in free[np.random.randint(len(free), size=min(CANDIDATES, len(free)))]:
+                x, y = position(index)
+                if not (self.owner[self._cells(x, y, w, h)] >= 0).any():
+                    return x, y
+
+        # Random tie-breaking keeps equal-overlap windows uniformly likely
+        keys = sums.ravel() + np.random.random(sums.size)
+        k = min(CANDIDATES, keys.size)
+        candidates = np.argpartition(keys, k - 1)[:k]
+        candidates = candidates[np.argsort(keys[candidates])]
+        for index in candidates:
+            x, y = position(index)
+            if self._allowed(x, y, w, h):
+                return x, y
+        return None
+
+    def place(self, x, y, w, h):
+        """Record a cover drawn on top of everything placed so far."""
+        cells = self._cells(x, y, w, h)
+        window = self.owner[cells]
+        self.visible -= np.bincount(window[window >= 0], minlength=len(self.visible))
+
+        new_id = len(self.rects)
+        self.owner[cells] = new_id
+        self.rects = np.vstack([self.rects, (x, y, x + w, y + h)])
+        self.visible = np.append(self.visible, window.size)
+        self.area = np.append(self.area, window.size)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Opt-in stage tracing and sampling profiler for the data and inference tools.
+
+Code marks its stages with
+
+    with span("composite"):
+        ...
+
+which costs one attribute check while tracing is off. Tracing is on when the
+PIPELINE_TRACE environment variable names a directory, either set by hand
+(to trace every script of convert_synth.sh) or by enable() from a --trace
+flag. Because it is an environment variable, ProcessPoolExecutor workers
+inherit it: every process appends its spans to its own events-<pid>.jsonl in
+that directory, line by line, so nothing has to be sent back to the parent
+and a worker that exits abruptly loses nothing.
+
+finish() (or "python3 tracing.py DIR") merges the files into DIR/trace.json,
+in the Chrome trace event format that chrome://tracing and ui.perfetto.dev
+open, and prints a per-stage summary table.
+
+With PIPELINE_PROFILE set as well (--profile), every process also samples its
+threads' Python stacks on a CPU-time timer (SIGPROF) and writes them as
+folded stacks; finish() merges them into DIR/profile.folded, which
+flamegraph.pl, speedscope or inferno render as a flame graph.
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import signal
+import atexit
+import argparse
+import threading
+import contextlib
+from collections import Counter, defaultdict
+
+TRACE_ENV = "PIPELINE_TRACE"
+PROFILE_ENV = "PIPELINE_PROFILE"
+PROFILE_INTERVAL = 0.005  # seconds of CPU time between samples
+
+_directory = os.environ.get(TRACE_ENV) or None
+_profile = bool(_directory and os.environ.get(PROFILE_ENV))
+_enabled_here = False  # finish() only merges in the process that called enable()
+_events_file = None
+_events_pid = None
+_samples = Counter()
+_profile_pid = None
+_null = contextlib.nullcontext()
+
+
+def enabled():
+    return _directory is not None
+
+
+def enable(directory, profile=False):
+    """Turn tracing on for this process and the workers it starts; spans go to directory."""
+    global _directory, _profile, _enabled_here
+    os.makedirs(directory, exist_ok=True)
+    os.environ[TRACE_ENV] = _directory = os.path.abspath(directory)
+    if profile:
+        os.environ[PROFILE_ENV] = "1"
+    _profile = profile
+    _enabled_here = True
+    # Drop files of an earlier run into the same directory
+    for path in glob.glob(os.path.join(_directory, "events-*.jsonl")) + \
+            glob.glob(os.path.join(_directory, "profile-*.folded")):
+        os.remove(path)
+    if profile:
+        _start_profiler()
+
+
+def _write(event):
+    """Append one event to this process' file, opening it after a fork."""
+    global _events_file, _events_pid
+    if _events_pid != os.getpid():
+        _events_file = open(os.path.join(_directory, f"events-{os.getpid()}.jsonl"), "a", buffering=1)
+        _events_pid = os.getpid()
+        name = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+        _write({"ph": "M", "name": "process_name", "pid": os.getpid(), "tid": 0,
+                "args": {"name": f"{name} ({os.getpid()})"}})
+    if _profile and _profile_pid != _events_pid:
+        _start_profiler()
+    _events_file.write(json.dumps(event) + "\n")
+
+
+@contextlib.contextmanager
+def _span(name, args):
+    start = time.monotonic_ns()
+    try:
+        yield
+    finally:
+        event = {"name": name, "ph": "X", "ts": start / 1000, "dur": (time.monotonic_ns() - start) / 1000,
+                 "pid": os.getpid(), "tid": threading.get_native_id()}
+        if args:
+            event["args"] = args
+        _write(event)
+
+
+def span(name, **args):
+    """Context manager timing one stage; a no-op unless tracing is enabled."""
+    if _directory is None:
+        return _null
+    return _span(name, args)
+
+
+def traced_iter(iterable, name):
+    """Wrap a lazy iterable so the time spent producing each item is a span."""
+    if _directory is None:
+        return iterable
+
+    def wrapper():
+        iterator = iter(iterable)
+        while True:
+            with span(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    return wrapper()
+
+
+# --- sampling profiler ---
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _fold(frame, thread_name):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join([thread_name] + stack[::-1])
+
+
+def _sample(signum, frame):
+    names = {t.ident: t.name for t in threading.enumerate()}
+    main_ident = threading.main_thread().ident
+    _samples[_fold(frame, names.get(main_ident, "MainThread"))] += 1
+    for ident, other in sys._current_frames().items():
+        if ident != main_ident and ident != threading.get_ident():
+            _samples[_fold(other, names.get(ident, str(ident)))] += 1
+
+
+def _flush_profile():
+    if _profile_pid != os.getpid() or not _samples:
+        return
+    with open(os.path.join(_directory, f"profile-{os.getpid()}.folded"), "w") as f:
+        for stack, count in _samples.items():
+            f.write(f"{stack} {count}\n")
+
+
+def _start_profiler():
+    """Start sampling in this process (timers and samples are not carried over a fork)."""
+    global _profile_pid
+    if _profile_pid == os.getpid() or not hasattr(signal, "setitimer"):
+        return
+    if threading.current_thread() is not threading.main_thread():
+        return  # signal handlers can only be installed from the main thread
+    _samples.clear()
+    _profile_pid = os.getpid()
+    signal.signal(signal.SIGPROF, _sample)
+    signal.setitimer(signal.ITIMER_PROF, PROFILE_INTERVAL, PROFILE_INTERVAL)
+    atexit.register(_flush_profile)
+    # Pool workers leave through multiprocessing, which skips atexit but runs its finalizers
+    from multiprocessing import util
+    util.Finalize(None, _flush_profile, exitpriority=100)
+
+
+# --- merging and reporting ---
+
+def merge(directory):
+    """Merge every process' events into directory/trace.json; returns the complete ("X") events."""
+    events = []
+    for path in sorted(glob.glob(os.path.join(directory, "events-*.jsonl"))):
+        with open(path) as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # cut short by a killed process
+    with open(os.path.join(directory, "trace.json"), "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    stacks = Counter()
+    for path in glob.glob(os.path.join(directory, "profile-*.folded")):
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    stacks[stack] += int(count)
+    if stacks:
+        with open(os.path.join(directory, "profile.folded"), "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+    return [e for e in events if e.get("ph") == "X"]
+
+
+def summary(events):
+    """Table of count, total, mean, p50, p95 and max per span name, slowest total first."""
+    durations = defaultdict(list)
+    for e in events:
+        durations[e["name"]].append(e["dur"] / 1000)
+    if not durations:
+        return "No spans recorded"
+    processes = len({e["pid"] for e in events})
+    lines = [f"{'stage':<28}{'count':>8}{'total s':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+    for name, ms in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        ms.sort()
+        lines.append(f"{name:<28}{len(ms):>8}{sum(ms) / 1000:>10.2f}{sum(ms) / len(ms):>10.2f}"
+                     f"{ms[len(ms) // 2]:>10.2f}{ms[min(len(ms) - 1, int(len(ms) * 0.95))]:>10.2f}{ms[-1]:>10.2f}")
+    lines.append(f"({processes} processes; totals add up time across processes and threads, "
+                 f"and nested spans are counted in their parents too)")
+    return "\n".join(lines)
+
+
+def finish():
+    """In the process that called enable(): merge the trace (and profile) and print the summary."""
+    if not _enabled_here:
+        return
+    if _profile_pid == os.getpid():
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        _flush_profile()
+    if _events_file is not None and _events_pid == os.getpid():
+        _events_file.flush()
+    events = merge(_directory)
+    print(summary(events))
+    print(f"Trace written to {os.path.join(_directory, 'trace.json')} (open in ui.perfetto.dev)")
+    if os.path.exists(os.path.join(_directory, "profile.folded")):
+        print(f"Profile written to {os.path.join(_directory, 'profile.folded')} (render with flamegraph.pl or speedscope)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge and summarize a PIPELINE_TRACE directory')
+    parser.add_argument('directory', help='Directory the traced processes wrote to')
+
+    args = parser.parse_args()
+    print(summary(merge(args.directory)))
+    print(f"Trace written to {os.path.join(args.directory, 'trace.json')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Folder watcher for incremental inference.
+
+Yields batches of image files that are new or modified since they were last
+processed. A file is only handed out once its size and mtime have stayed the
+same for the debounce period, so images that are still being copied or
+uploaded are not read half-written. What has been processed is recorded in a
+JSON checkpoint under runs/watch (one per watched folder, so the folder
+itself is never written to), and a restarted watcher picks up where it left
+off.
+
+Changes are noticed through inotify when inotify_simple is installed (it is
+in requirements.txt for Linux). Elsewhere the folder is polled every
+poll_interval seconds, and polling stays on as a safety net either way.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+CHECKPOINT_DIR = os.path.join("runs", "watch")
+
+
+def default_checkpoint_path(directory):
+    """Checkpoint of a watched folder: its name plus a hash of its absolute path."""
+    directory = os.path.abspath(directory)
+    digest = hashlib.sha256(directory.encode()).hexdigest()[:12]
+    return os.path.join(CHECKPOINT_DIR, f"{os.path.basename(directory)}_{digest}.json")
+
+
+class FolderWatcher:
+    """Watch a directory for files matching pattern and yield them once they are stable."""
+
+    def __init__(self, directory, pattern, checkpoint_path=None, debounce=1.0, poll_interval=2.0, exclude=None,
+                 clock=time.monotonic):
+        self.directory = directory
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.exclude = re.compile(exclude) if exclude else None
+        self.checkpoint_path = checkpoint_path or default_checkpoint_path(directory)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.clock = clock  # seconds, only compared against itself
+        self.processed = {}  # name -> [size, mtime_ns] when it was processed
+        self.candidates = {}  # name -> ((size, mtime_ns), first time that signature was seen)
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                self.processed = json.load(f)
+
+        self.inotify = None
+        if INotify is not None:
+            self.inotify = INotify()
+            self.inotify.add_watch(directory, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.MODIFY)
+
+    def _scan(self):
+        """Update candidates with every matching file that is not processed in its current state."""
+        now = self.clock()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not self.pattern.match(entry.name) or not entry.is_file():
+                    continue
+                if self.exclude is not None and self.exclude.search(entry.name):
+                    continue
+                st = entry.stat()
+                signature = (st.st_size, st.st_mtime_ns)
+                if self.processed.get(entry.name) == list(signature):
+                    continue
+                previous = self.candidates.get(entry.name)
+                if previous is None or previous[0] != signature:
+                    self.candidates[entry.name] = (signature, now)
+
+    def ready(self):
+        """Names of candidates whose size and mtime held still for the debounce period."""
+        self._scan()
+        now = self.clock()
+        return sorted(name for name, (_, since) in self.candidates.items() if now - since >= self.debounce)
+
+    def mark_processed(self, names):
+        """Record names as processed in their current state and persist the checkpoint."""
+        for name in names:
+            signature, _ = self.candidates.pop(name, (None, None))
+            if signature is not None:
+                self.processed[name] = list(signature)
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.processed, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def _wait(self, timeout):
+        """Sleep until the folder changes or timeout seconds pass."""
+        if self.inotify is not None:
+            self.inotify.read(timeout=int(timeout * 1000))
+        else:
+            time.sleep(timeout)
+
+    def batches(self, batch_size):
+        """Yield lists of up to batch_size ready paths, forever; call mark_processed() after each."""
+        while True:
+            names = self.ready()
+            for i in range(0, len(names), batch_size):
+                yield [os.path.join(self.directory, name) for name in names[i:i + batch_size]]
+            # Pending files need another look after the debounce, even without events
+            timeout = self.debounce if self.candidates else self.poll_interval
+            self._wait(timeout)